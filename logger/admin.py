@@ -1,14 +1,37 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import ApiKey, EventLogMessage, LlmLogMessage
+from django.db.models import Q
+from .models import ApiKey, ArchiveSegment, EventLogMessage, LlmLogMessage, LogCounter, RetentionPolicy, SamplingRule
+from .search import search_ids
+
+class FullTextSearchAdminMixin:
+    """
+    Matches the search term through the full-text index instead of running
+    icontains over the log text. API key names and usernames are still matched
+    directly, as the API key table is small.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        max_results = getattr(settings, 'LOGGER_SEARCH_MAX_RESULTS', 1000)
+        log_ids = [pk for pk, _ in search_ids(self.model, search_term, limit=max_results, using=queryset.db)]
+        api_keys = ApiKey.objects.filter(Q(name__icontains=search_term) | Q(user__username__icontains=search_term))
+        return queryset.filter(Q(id__in=log_ids) | Q(api_key__in=api_keys)), False
+
+class SamplingRuleInline(admin.TabularInline):
+    model = SamplingRule
+    extra = 0
 
 @admin.register(ApiKey)
 class ApiKeyAdmin(admin.ModelAdmin):
-    list_display = ('name', 'user', 'key', 'created_at', 'is_active')
+    list_display = ('name', 'user', 'key', 'created_at', 'is_active', 'retention_days', 'rate_limit', 'daily_quota')
     list_filter = ('is_active', 'created_at')
     search_fields = ('name', 'user__username')
+    inlines = [SamplingRuleInline]
 
 @admin.register(EventLogMessage)
-class EventLogMessageAdmin(admin.ModelAdmin):
+class EventLogMessageAdmin(FullTextSearchAdminMixin, admin.ModelAdmin):
     list_display = ('level', 'message_preview', 'api_key', 'timestamp')
     list_filter = ('level', 'timestamp', 'api_key')
     search_fields = ('message', 'api_key__name', 'api_key__user__username')
@@ -18,11 +41,30 @@ class EventLogMessageAdmin(admin.ModelAdmin):
     message_preview.short_description = 'Message'
 
 @admin.register(LlmLogMessage)
-class LlmLogMessageAdmin(admin.ModelAdmin):
+class LlmLogMessageAdmin(FullTextSearchAdminMixin, admin.ModelAdmin):
     list_display = ('source', 'query_preview', 'api_key', 'timestamp')
     list_filter = ('source', 'timestamp', 'api_key')
-    search_fields = ('query', 'api_key__name', 'api_key__user__username')
+    search_fields = ('query', 'response', 'api_key__name', 'api_key__user__username')
 
     def query_preview(self, obj):
-        return obj.query[:50] + '...' if len(obj.query) > 50 else obj.query
-    query_preview.short_description = 'Query'
\ No newline at end of file
+        preview = obj.payload_preview('query', 51) or ''
+        return preview[:50] + '...' if len(preview) > 50 else preview
+    query_preview.short_description = 'Query'
+
+@admin.register(LogCounter)
+class LogCounterAdmin(admin.ModelAdmin):
+    list_display = ('api_key', 'kind', 'level', 'count')
+    list_filter = ('kind', 'level')
+    readonly_fields = ('api_key', 'kind', 'level', 'count')
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ('user', 'retention_days')
+    search_fields = ('user__username',)
+
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ('path', 'api_key', 'kind', 'start', 'end', 'count', 'size')
+    list_filter = ('kind',)
+    readonly_fields = ('api_key', 'kind', 'path', 'start', 'end', 'first_id', 'last_id', 'count',
+                       'dimension_counts', 'blocks', 'size', 'created_at')
@@ -0,0 +1,106 @@
+import math
+
+# Usage metrics read from LLM log metadata, with the metadata keys they may be sent as
+METRICS = {
+    'prompt_tokens': ('prompt_tokens', 'input_tokens'),
+    'completion_tokens': ('completion_tokens', 'output_tokens'),
+    'latency_ms': ('latency_ms',),
+    'cost': ('cost',),
+}
+SKETCHED_METRICS = ('prompt_tokens', 'completion_tokens', 'latency_ms')
+PERCENTILES = (50, 90, 95, 99)
+
+# Log-scale histogram buckets: each one spans values within RELATIVE_ACCURACY
+# of its midpoint, so percentiles read from merged buckets are off by at most 2%
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+ZERO_BUCKET = -(2 ** 31)  # Holds values of 0
+
+
+def usage_values(metadata):
+    """
+    (metric, value) pairs of the known numeric usage fields of an LLM log's
+    metadata. Missing, non-numeric and negative values are left out.
+    """
+    if not isinstance(metadata, dict) or not metadata:
+        return []
+    values = []
+    for metric, names in METRICS.items():
+        for name in names:
+            value = metadata.get(name)
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and math.isfinite(value) and value >= 0):
+                values.append((metric, value))
+                break
+    return values
+
+
+def sketch_bucket(value):
+    if value <= 0:
+        return ZERO_BUCKET
+    return math.ceil(math.log(value) / LOG_GAMMA)
+
+
+def bucket_value(bucket):
+    """
+    The value a bucket stands for, within RELATIVE_ACCURACY of all it holds
+    """
+    if bucket == ZERO_BUCKET:
+        return 0.0
+    return 2 * GAMMA ** bucket / (GAMMA + 1)
+
+
+def percentiles(buckets, quantiles=PERCENTILES):
+    """
+    Approximate percentiles from a merged sketch, a mapping of bucket to count.
+    None when the sketch is empty.
+    """
+    total = sum(buckets.values())
+    if not total:
+        return {f'p{quantile}': None for quantile in quantiles}
+    ordered = sorted((bucket, count) for bucket, count in buckets.items() if count > 0)
+    result = {}
+    for quantile in quantiles:
+        rank = quantile / 100 * (total - 1)
+        seen = 0
+        for bucket, count in ordered:
+            seen += count
+            if seen > rank:
+                break
+        result[f'p{quantile}'] = round(bucket_value(bucket), 6)
+    return result
+
+
+class UsageSummary:
+    """
+    Totals, averages and percentiles of the usage metrics, merged from any
+    number of hourly rollups and sketches
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.counts = dict.fromkeys(METRICS, 0)
+        self.totals = dict.fromkeys(METRICS, 0.0)
+        self.sketches = {metric: {} for metric in SKETCHED_METRICS}
+
+    def add_rollup(self, metric, count, total):
+        self.counts[metric] += count
+        self.totals[metric] += total
+
+    def add_sketch(self, metric, bucket, count):
+        sketch = self.sketches[metric]
+        sketch[bucket] = sketch.get(bucket, 0) + count
+
+    def as_dict(self):
+        summary = {'requests': self.requests}
+        for metric in METRICS:
+            count, total = self.counts[metric], self.totals[metric]
+            summary[metric] = {
+                'count': count,
+                'total': round(total, 6),
+                'avg': round(total / count, 6) if count else None,
+            }
+            if metric in self.sketches:
+                summary[metric].update(percentiles(self.sketches[metric]))
+        return summary
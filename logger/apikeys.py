@@ -0,0 +1,146 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ApiKey
+
+VERSION_CACHE_KEY = 'logger:api-key-resolver-version'
+_UNCHECKED = object()
+
+
+class ApiKeyResolver:
+    """
+    Resolves API key UUIDs to active ApiKey rows through a bounded, in-process
+    LRU cache with a TTL. Unknown or inactive keys are cached as misses for a
+    shorter TTL so that invalid clients cannot hammer the database.
+
+    Entries are invalidated locally from the ApiKey save/delete signals, and a
+    version counter kept in Django's default cache, which settings.CACHES
+    shares between workers, lets other workers drop their entries once they
+    notice the bump (at most every VERSION_CHECK_INTERVAL seconds).
+    """
+
+    def __init__(self, max_size=None, ttl=None, negative_ttl=None, version_check_interval=None):
+        self.max_size = max_size if max_size is not None else getattr(settings, 'LOGGER_API_KEY_CACHE_MAX_SIZE', 10000)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'LOGGER_API_KEY_CACHE_TTL', 60)
+        self.negative_ttl = negative_ttl if negative_ttl is not None else getattr(settings, 'LOGGER_API_KEY_CACHE_NEGATIVE_TTL', 10)
+        self.version_check_interval = (
+            version_check_interval if version_check_interval is not None
+            else getattr(settings, 'LOGGER_API_KEY_CACHE_VERSION_CHECK_INTERVAL', 1)
+        )
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = _UNCHECKED
+        self._version_checked_at = 0.0
+
+    def resolve(self, key):
+        """
+        Return the active ApiKey for the given UUID, or None
+        """
+        key = str(key)
+        now = time.monotonic()
+        if self._version_check_due(now):
+            self._apply_version(cache.get(VERSION_CACHE_KEY))
+
+        hit, api_key = self._lookup(key, now)
+        if hit:
+            return api_key
+        api_key = self.queryset.filter(key=key).first()
+        self._store(key, api_key, now)
+        return api_key
+
+    async def aresolve(self, key):
+        """
+        Async resolve(). Cache hits do not leave the event loop; misses and
+        version checks go through Django's async ORM and cache APIs.
+        """
+        key = str(key)
+        now = time.monotonic()
+        if self._version_check_due(now):
+            self._apply_version(await cache.aget(VERSION_CACHE_KEY))
+
+        hit, api_key = self._lookup(key, now)
+        if hit:
+            return api_key
+        api_key = await self.queryset.filter(key=key).afirst()
+        self._store(key, api_key, now)
+        return api_key
+
+    @property
+    def queryset(self):
+        # Sampling rules are cached with their key, see logger.sampling
+        return ApiKey.objects.filter(is_active=True).prefetch_related('sampling_rules')
+
+    def _lookup(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                api_key, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return True, api_key
+                del self._entries[key]
+        return False, None
+
+    def _store(self, key, api_key, now):
+        ttl = self.ttl if api_key is not None else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (api_key, now + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """
+        Drop one key (or every key) from this process and bump the shared version
+        so other workers do the same
+        """
+        self.evict(key)
+        try:
+            cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.add(VERSION_CACHE_KEY, 1, timeout=None)
+
+    def evict(self, key=None):
+        """
+        Drop one key (or every key) from this process only
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(key), None)
+
+    def _version_check_due(self, now):
+        if now - self._version_checked_at < self.version_check_interval:
+            return False
+        self._version_checked_at = now
+        return True
+
+    def _apply_version(self, version):
+        if version != self._version:
+            if self._version is not _UNCHECKED:
+                self.evict()
+            self._version = version
+
+def record_key_uuid(record):
+    """
+    The API key UUID of a raw log record, in the forms the api_key field
+    accepts (see RecordValidator), or None
+    """
+    value = record.get('api_key') if isinstance(record, dict) else None
+    try:
+        if isinstance(value, str):
+            return uuid.UUID(hex=value)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return uuid.UUID(int=value)
+    except ValueError:
+        pass
+    return None
+
+
+resolver = ApiKeyResolver()
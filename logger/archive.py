@@ -0,0 +1,351 @@
+import gzip
+import heapq
+import json
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils.dateparse import parse_datetime
+
+from .exports import json_value
+from .models import ApiKey, ArchiveSegment, EventLogMessage, LlmLogMessage, LogRollup, record_logs
+
+LOG_MODELS = (EventLogMessage, LlmLogMessage)
+
+# Segment index block entries: [offset, size, count, first timestamp, first id, last timestamp, last id]
+OFFSET, SIZE, COUNT, FIRST_TIMESTAMP, FIRST_ID, LAST_TIMESTAMP, LAST_ID = range(7)
+
+
+def archive_dir():
+    return Path(getattr(settings, 'LOGGER_ARCHIVE_DIR', 'archive'))
+
+
+def record_fields(model):
+    """
+    The columns kept in a model's segments, by attribute name (api_key_id)
+    """
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def record_position(record):
+    return record['timestamp'], record['id']
+
+
+def since_position(since):
+    # Positions compare as (timestamp, id) and ids start at 1
+    return (since, 0) if since is not None else None
+
+
+class SegmentWriter:
+    """
+    Writes logs, oldest first, to a new segment file as a series of gzip
+    members (blocks) of at most block_records logs or block_bytes bytes, and
+    collects the segment's index on the way. The file only gets its final
+    name once close() has synced it to disk.
+    """
+
+    def __init__(self, path, model, block_records, block_bytes):
+        self.path = path
+        self.fields = record_fields(model)
+        self.dimension_field = model.rollup_dimension_field
+        self.weight_field = model.weight_field
+        self.block_records = block_records
+        self.block_bytes = block_bytes
+        self.blocks = []
+        self.dimension_counts = {}
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.min_id = None
+        self.max_id = None
+        self.size = 0
+        self._lines = []
+        self._line_bytes = 0
+        self._block_first = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._temp_path = path.with_name(path.name + '.tmp')
+        self._file = open(self._temp_path, 'wb')
+
+    def write(self, row):
+        record = {field: json_value(value) for field, value in zip(self.fields, row)}
+        position = (record['timestamp'], record['id'])
+        if self._block_first is None:
+            self._block_first = position
+        if self.first is None:
+            self.first = position
+        self.last = position
+        self.min_id = position[1] if self.min_id is None else min(self.min_id, position[1])
+        self.max_id = position[1] if self.max_id is None else max(self.max_id, position[1])
+        dimension = LogRollup.dimension_value(record[self.dimension_field])
+        weight = record[self.weight_field] if self.weight_field else 1
+        self.dimension_counts[dimension] = self.dimension_counts.get(dimension, 0) + weight
+        self.count += 1
+
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        self._lines.append(line)
+        self._line_bytes += len(line)
+        if len(self._lines) >= self.block_records or self._line_bytes >= self.block_bytes:
+            self.flush_block()
+
+    def flush_block(self):
+        if not self._lines:
+            return
+        data = gzip.compress(b''.join(self._lines), mtime=0)
+        self._file.write(data)
+        self.blocks.append([self.size, len(data), len(self._lines), *self._block_first, *self.last])
+        self.size += len(data)
+        self._lines = []
+        self._line_bytes = 0
+        self._block_first = None
+
+    def close(self):
+        self.flush_block()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        self._temp_path.unlink(missing_ok=True)
+
+
+def read_block(path, block):
+    with open(path, 'rb') as file:
+        file.seek(block[OFFSET])
+        return gzip.decompress(file.read(block[SIZE])).splitlines()
+
+
+def decode_record(line):
+    record = json.loads(line)
+    record['timestamp'] = parse_datetime(record['timestamp'])
+    return record
+
+
+def iter_segment(segment, after=None, before=None, reverse=False):
+    """
+    A segment's logs in (timestamp, id) order, or newest first with reverse,
+    strictly between the positions after and before. Blocks outside the range
+    are skipped without reading them, and one block at a time is in memory.
+    """
+    path = archive_dir() / segment.path
+    for block in (reversed(segment.blocks) if reverse else segment.blocks):
+        first = (parse_datetime(block[FIRST_TIMESTAMP]), block[FIRST_ID])
+        last = (parse_datetime(block[LAST_TIMESTAMP]), block[LAST_ID])
+        if before is not None and first >= before:
+            if reverse:
+                continue
+            return
+        if after is not None and last <= after:
+            if reverse:
+                return
+            continue
+        lines = read_block(path, block)
+        if reverse:
+            lines.reverse()
+        for line in lines:
+            record = decode_record(line)
+            position = record_position(record)
+            if (before is None or position < before) and (after is None or position > after):
+                yield record
+
+
+def overlapping_groups(segments):
+    """
+    Split segments, sorted by start, into groups whose time ranges overlap,
+    such as the segments of several API keys for the same day
+    """
+    groups = []
+    group_end = None
+    for segment in segments:
+        if group_end is None or segment.start > group_end:
+            groups.append([])
+            group_end = segment.end
+        groups[-1].append(segment)
+        group_end = max(group_end, segment.end)
+    return groups
+
+
+def archived_logs(model, api_key_ids, since=None, until=None, before=None, predicate=None, reverse=False):
+    """
+    Archived logs of the given API keys (all when None) as dicts of field values, in
+    (timestamp, id) order or newest first with reverse. Limited to timestamps
+    in [since, until), to positions older than before, and to the records
+    predicate accepts. Segment files are only opened when iteration reaches
+    them, and segments that overlap in time are merged.
+    """
+    segments = ArchiveSegment.objects.filter(kind=model.counter_kind)
+    if api_key_ids is not None:
+        segments = segments.filter(api_key__in=api_key_ids)
+    if since is not None:
+        segments = segments.filter(end__gte=since)
+    if until is not None:
+        segments = segments.filter(start__lt=until)
+    if before is not None:
+        segments = segments.filter(start__lte=before[0])
+        if until is not None:
+            before = min(before, (until, 0))
+    elif until is not None:
+        before = (until, 0)
+    groups = overlapping_groups(sorted(segments, key=lambda segment: (segment.start, segment.id)))
+    if reverse:
+        groups.reverse()
+    after = since_position(since)
+
+    def generate():
+        for group in groups:
+            iterators = [iter_segment(segment, after, before, reverse) for segment in group]
+            records = iterators[0] if len(iterators) == 1 else heapq.merge(
+                *iterators, key=record_position, reverse=reverse
+            )
+            for record in records:
+                if predicate is None or predicate(record):
+                    yield record
+
+    return generate()
+
+
+def archived_log_chunks(model, since=None, until=None, chunk_size=1000):
+    """
+    Every API key's archived logs in [since, until) as lists of at most
+    chunk_size unsaved model instances
+    """
+    logs = []
+    for record in archived_logs(model, None, since, until):
+        logs.append(model(**record))
+        if len(logs) >= chunk_size:
+            yield logs
+            logs = []
+    if logs:
+        yield logs
+
+
+def archived_counter_deltas():
+    """
+    LogCounter deltas of all archived logs, read from the segments' index
+    """
+    by_level = {model.counter_kind: model.counter_level_field == model.rollup_dimension_field for model in LOG_MODELS}
+    deltas = Counter()
+    for api_key_id, kind, dimension_counts in ArchiveSegment.objects.values_list('api_key', 'kind', 'dimension_counts'):
+        for dimension, count in dimension_counts.items():
+            deltas[(api_key_id, kind, dimension if by_level[kind] else '')] += count
+    return deltas
+
+
+def segment_path(model, api_key_id, day, first_id):
+    return f'{model.counter_kind}/{day:%Y/%m/%d}/{api_key_id}-{first_id}.ndjson.gz'
+
+
+def delete_archived_logs(logs, chunk_size=5000, pause=0.0):
+    """
+    Delete logs that are safely in a segment, in chunks of at most chunk_size
+    rows. Returns the number of rows deleted.
+    """
+    logs = logs.order_by('timestamp', 'id')
+    total = 0
+    while True:
+        ids = list(logs.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return total
+        deleted, _ = logs.model.objects.filter(id__in=ids).delete_archived()
+        if not deleted:
+            return total
+        total += deleted
+        if pause:
+            time.sleep(pause)
+
+
+def archive_day(model, api_key_id, day, next_day, chunk_size=5000, pause=0.0):
+    """
+    Write an API key's logs of one day to a new segment and delete them from
+    the database. Logs left behind by an interrupted run that already are in
+    a segment are only deleted. Returns the number of logs archived.
+    """
+    logs = model.objects.filter(api_key_id=api_key_id, timestamp__gte=day, timestamp__lt=next_day)
+    for segment in ArchiveSegment.objects.filter(
+        api_key_id=api_key_id, kind=model.counter_kind, start__lt=next_day, end__gte=day
+    ):
+        delete_archived_logs(logs.filter(id__gte=segment.first_id, id__lte=segment.last_id), chunk_size, pause)
+
+    rows = logs.order_by('timestamp', 'id').values_list(*record_fields(model)).iterator(chunk_size=chunk_size)
+    first = next(rows, None)
+    if first is None:
+        return 0
+    fields = record_fields(model)
+    path = segment_path(model, api_key_id, day, first[fields.index('id')])
+    writer = SegmentWriter(
+        archive_dir() / path, model,
+        getattr(settings, 'LOGGER_ARCHIVE_BLOCK_RECORDS', 1000),
+        getattr(settings, 'LOGGER_ARCHIVE_BLOCK_BYTES', 1024 * 1024),
+    )
+    try:
+        writer.write(first)
+        for row in rows:
+            writer.write(row)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+    ArchiveSegment.objects.create(
+        api_key_id=api_key_id, kind=model.counter_kind, path=path,
+        start=parse_datetime(writer.first[0]), end=parse_datetime(writer.last[0]),
+        first_id=writer.min_id, last_id=writer.max_id, count=writer.count,
+        dimension_counts=writer.dimension_counts, blocks=writer.blocks, size=writer.size,
+    )
+    delete_archived_logs(logs.filter(id__gte=writer.min_id, id__lte=writer.max_id), chunk_size, pause)
+    return writer.count
+
+
+def archive_logs(model, cutoff, chunk_size=5000, pause=0.0, dry_run=False):
+    """
+    Move every API key's logs older than cutoff, a UTC day boundary, to one
+    segment per day. Yields (api_key_id, day, logs) per segment written, or
+    per day with the logs that would be archived when dry_run is set.
+    """
+    for api_key_id in ApiKey.objects.order_by('id').values_list('id', flat=True):
+        old_logs = model.objects.filter(api_key_id=api_key_id, timestamp__lt=cutoff)
+        while True:
+            oldest = old_logs.aggregate(oldest=Min('timestamp'))['oldest']
+            if oldest is None:
+                break
+            day = LogRollup.truncate(oldest, LogRollup.DAY)
+            next_day = min(day + timedelta(days=1), cutoff)
+            if dry_run:
+                archived = old_logs.filter(timestamp__lt=next_day).count()
+            else:
+                archived = archive_day(model, api_key_id, day, next_day, chunk_size, pause)
+            if archived:
+                yield api_key_id, day, archived
+            old_logs = old_logs.filter(timestamp__gte=next_day)
+
+
+def purge_archived_logs(model, api_key_id, cutoff, dry_run=False):
+    """
+    Delete an API key's segments whose newest log is older than cutoff,
+    uncounting their logs from the counters and rollups. Yields the number of
+    logs per segment.
+    """
+    segments = ArchiveSegment.objects.filter(api_key_id=api_key_id, kind=model.counter_kind, end__lt=cutoff)
+    for segment in segments.order_by('start'):
+        if not dry_run:
+            with transaction.atomic():
+                logs = []
+                for record in iter_segment(segment):
+                    logs.append(model(**record))
+                    if len(logs) >= 1000:
+                        record_logs(logs, sign=-1)
+                        logs = []
+                if logs:
+                    record_logs(logs, sign=-1)
+                segment.delete()
+        yield segment.count
+
+
+def remove_segment_file(path):
+    (archive_dir() / path).unlink(missing_ok=True)
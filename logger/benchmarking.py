@@ -0,0 +1,13 @@
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latency_percentiles(latencies, fractions=(0.50, 0.95, 0.99)):
+    """
+    Report latencies given in seconds as {'p50_ms': ..., 'p95_ms': ...}.
+    """
+    latencies = sorted(latencies)
+    return {f'p{round(fraction * 100)}_ms': percentile(latencies, fraction) * 1000 for fraction in fractions}
@@ -0,0 +1,218 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from .writer import begin_immediate
+
+log = logging.getLogger(__name__)
+
+MAX_FLUSH_ATTEMPTS = 5  # Flushes a record is kept for while the database reports transient errors
+
+
+class BufferFull(Exception):
+    pass
+
+
+class IngestionBuffer:
+    """
+    Per-process write-behind buffer for validated log instances.
+
+    A background thread flushes the buffer with bulk_create whenever it holds
+    FLUSH_SIZE records or FLUSH_INTERVAL seconds have passed. When the buffer
+    is full the backpressure policy decides what happens to a new record:
+    'block' waits up to BLOCK_TIMEOUT seconds for room, 'drop_oldest' discards
+    the oldest pending record and 'reject' raises BufferFull straight away.
+    Pending records are flushed when the worker process exits.
+
+    Clients were already answered 202 for the pending records, so a failed
+    flush is retried per model and then per record, and only the records that
+    cannot be written are dropped. Records hit by an OperationalError such as
+    "database is locked" go back on the queue, for up to MAX_FLUSH_ATTEMPTS
+    flushes.
+    """
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    REJECT = 'reject'
+
+    def __init__(self, max_size=None, flush_size=None, flush_interval=None,
+                 backpressure=None, block_timeout=None, autostart=True):
+        self.max_size = max_size or getattr(settings, 'LOGGER_BUFFER_MAX_SIZE', 10000)
+        self.flush_size = flush_size or getattr(settings, 'LOGGER_BUFFER_FLUSH_SIZE', 500)
+        self.flush_interval = flush_interval or getattr(settings, 'LOGGER_BUFFER_FLUSH_INTERVAL', 1.0)
+        self.backpressure = backpressure or getattr(settings, 'LOGGER_BUFFER_BACKPRESSURE', self.BLOCK)
+        self.block_timeout = block_timeout or getattr(settings, 'LOGGER_BUFFER_BLOCK_TIMEOUT', 1.0)
+        if self.backpressure not in (self.BLOCK, self.DROP_OLDEST, self.REJECT):
+            raise ValueError(f"Unknown backpressure policy: {self.backpressure}")
+        self.autostart = autostart
+
+        self._items = deque()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+        self._stats = {
+            'enqueued': 0,
+            'flushed': 0,
+            'dropped': 0,
+            'rejected': 0,
+            'failed': 0,
+            'retried': 0,
+            'flushes': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    def put(self, instance):
+        """
+        Queue an unsaved model instance for writing. Raises BufferFull when the
+        backpressure policy refuses the record.
+        """
+        with self._condition:
+            if len(self._items) >= self.max_size:
+                if self.backpressure == self.DROP_OLDEST:
+                    self._items.popleft()
+                    self._stats['dropped'] += 1
+                elif self.backpressure == self.BLOCK:
+                    self._condition.notify_all()
+                    has_room = self._condition.wait_for(
+                        lambda: len(self._items) < self.max_size, timeout=self.block_timeout
+                    )
+                    if not has_room:
+                        self._stats['rejected'] += 1
+                        raise BufferFull()
+                else:
+                    self._stats['rejected'] += 1
+                    raise BufferFull()
+            self._items.append(instance)
+            self._stats['enqueued'] += 1
+            if len(self._items) >= self.flush_size:
+                self._condition.notify_all()
+        if self.autostart:
+            self._ensure_started()
+
+    def flush(self):
+        """
+        Write every pending record now. Returns the number of records written.
+        """
+        with self._flush_lock:
+            with self._condition:
+                items = list(self._items)
+                self._items.clear()
+                self._condition.notify_all()
+            if not items:
+                return 0
+
+            by_model = defaultdict(list)
+            for instance in items:
+                by_model[type(instance)].append(instance)
+
+            started = time.monotonic()
+            try:
+                with transaction.atomic():
+                    for model, objects in by_model.items():
+                        self._bulk_create(model, objects)
+                written, failed, retry = len(items), 0, []
+            except OperationalError:
+                log.warning("Failed to flush %d buffered log records", len(items), exc_info=True)
+                written, failed, retry = 0, 0, items
+            except Exception:
+                log.warning("Failed to flush %d buffered log records together, writing them separately",
+                            len(items), exc_info=True)
+                written, failed, retry = self._write_separately(by_model)
+            elapsed_ms = (time.monotonic() - started) * 1000
+
+            requeue = []
+            for instance in retry:
+                instance._flush_attempts = getattr(instance, '_flush_attempts', 0) + 1
+                if instance._flush_attempts < MAX_FLUSH_ATTEMPTS:
+                    requeue.append(instance)
+            if len(requeue) < len(retry):
+                log.error("Dropped %d buffered log records after %d failed flushes",
+                          len(retry) - len(requeue), MAX_FLUSH_ATTEMPTS)
+            with self._condition:
+                self._items.extendleft(reversed(requeue))
+                self._stats['retried'] += len(requeue)
+                self._stats['failed'] += failed + len(retry) - len(requeue)
+                self._stats['flushed'] += written
+                self._stats['flushes'] += 1
+                self._stats['last_flush_ms'] = elapsed_ms
+                self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+                self._stats['total_flush_ms'] += elapsed_ms
+            return written
+
+    def _bulk_create(self, model, objects):
+        # A rolled back attempt may have given the instances primary keys
+        for instance in objects:
+            instance.pk = None
+            instance._state.adding = True
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=getattr(settings, 'LOGGER_BULK_CREATE_BATCH_SIZE', 500))
+
+    def _write_separately(self, by_model):
+        """
+        Write each model's records in their own transaction, then the records
+        of a model that fails one by one. Returns the number of records
+        written, the number that failed and the records to retry.
+        """
+        written, failed, retry = 0, 0, []
+        for model, objects in by_model.items():
+            try:
+                self._bulk_create(model, objects)
+                written += len(objects)
+                continue
+            except OperationalError:
+                retry.extend(objects)
+                continue
+            except Exception:
+                pass
+            for instance in objects:
+                try:
+                    self._bulk_create(model, [instance])
+                    written += 1
+                except OperationalError:
+                    retry.append(instance)
+                except Exception:
+                    log.exception("Dropped a buffered %s that cannot be written", model._meta.verbose_name)
+                    failed += 1
+        return written, failed, retry
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._items)
+        stats['avg_flush_ms'] = stats['total_flush_ms'] / stats['flushes'] if stats['flushes'] else 0.0
+        return stats
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='log-ingestion-flusher', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.flush)
+                self._atexit_registered = True
+
+    def _run(self):
+        begin_immediate(connection)
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._items) >= self.flush_size, timeout=self.flush_interval)
+            close_old_connections()
+            self.flush()
+
+
+ingestion_buffer = IngestionBuffer()
@@ -0,0 +1,166 @@
+import base64
+import codecs
+import zlib
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# Stored values starting with MARKER carry a codec name up to the next ':'.
+# ESC never starts real prompts, and plain values that do are stored with the
+# 'raw' codec so that they cannot be mistaken for compressed ones.
+MARKER = '\x1b'
+ZLIB = 'zlib'
+RAW = 'raw'
+ZLIB_PREFIX = f'{MARKER}{ZLIB}:'
+RAW_PREFIX = f'{MARKER}{RAW}:'
+
+# Base64 characters decoded per step when building a preview, a multiple of 4
+PREVIEW_CHUNK = 512
+
+
+class CompressedText:
+    """
+    A zlib-compressed text value as read from the database. It is only
+    decompressed when the text is needed, and preview() decompresses just
+    enough of it for the first characters.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __repr__(self):
+        return f'<CompressedText: {len(self.data)} bytes>'
+
+    def __str__(self):
+        return self.decompress()
+
+    def __eq__(self, other):
+        return isinstance(other, CompressedText) and other.data == self.data
+
+    def __hash__(self):
+        return hash(self.data)
+
+    def decompress(self):
+        return zlib.decompress(base64.b64decode(self.data)).decode('utf-8')
+
+    def preview(self, length):
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        text = ''
+        for start in range(0, len(self.data), PREVIEW_CHUNK):
+            chunk = base64.b64decode(self.data[start:start + PREVIEW_CHUNK])
+            text += decoder.decode(decompressor.decompress(chunk))
+            if len(text) >= length:
+                break
+        return text[:length]
+
+
+def compression_threshold():
+    """
+    Smallest payload in bytes that is compressed, or None when compression is off
+    """
+    if not getattr(settings, 'LOGGER_LLM_PAYLOAD_COMPRESSION', False):
+        return None
+    return getattr(settings, 'LOGGER_LLM_PAYLOAD_COMPRESSION_THRESHOLD', 4096)
+
+
+def encode_text(value, threshold=None):
+    """
+    Encode a text value for storage, compressing it when it is at least
+    threshold bytes long and compression actually makes it smaller
+    """
+    if value is None:
+        return None
+    if threshold is not None and len(value) * 4 >= threshold:
+        data = value.encode('utf-8')
+        if len(data) >= threshold:
+            level = getattr(settings, 'LOGGER_LLM_PAYLOAD_COMPRESSION_LEVEL', 6)
+            encoded = ZLIB_PREFIX + base64.b64encode(zlib.compress(data, level)).decode('ascii')
+            if len(encoded) < len(value):
+                return encoded
+    if value.startswith(MARKER):
+        return RAW_PREFIX + value
+    return value
+
+
+def decode_stored(value):
+    """
+    Turn a stored value back into text, or a CompressedText when it is compressed
+    """
+    if value is None or not value.startswith(MARKER):
+        return value
+    if value.startswith(ZLIB_PREFIX):
+        return CompressedText(value[len(ZLIB_PREFIX):])
+    if value.startswith(RAW_PREFIX):
+        return value[len(RAW_PREFIX):]
+    return value
+
+
+def decode_text(value):
+    """
+    Fully decode a stored value. Registered as the logger_decode_text() SQL
+    function on SQLite, so the full-text index sees the uncompressed text.
+    """
+    value = decode_stored(value)
+    return value.decompress() if isinstance(value, CompressedText) else value
+
+
+def text_preview(value, length):
+    if isinstance(value, CompressedText):
+        return value.preview(length)
+    return value[:length] if value is not None else None
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Decompresses the field's value the first time it is read from a model
+    instance, and keeps the text so later reads are free. Defining __set__
+    makes this a data descriptor, so it is consulted even once the value is
+    in the instance __dict__.
+    """
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = instance.__dict__[self.field.attname] = value.decompress()
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField whose values of LOGGER_LLM_PAYLOAD_COMPRESSION_THRESHOLD bytes
+    or more are stored zlib-compressed (base64 encoded behind a codec marker)
+    when LOGGER_LLM_PAYLOAD_COMPRESSION is on. Model instances decompress on
+    first access; values()/values_list() return CompressedText for compressed
+    rows. Lookups compare against the stored text, so substring matches only
+    see uncompressed rows.
+
+    On SQLite the full-text triggers index marked values through the
+    logger_decode_text() function, which only exists on Django's connections.
+    Other clients, such as the sqlite3 shell, can write plain values but not
+    values starting with the marker.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def from_db_value(self, value, expression, connection):
+        return decode_stored(value)
+
+    def to_python(self, value):
+        if isinstance(value, CompressedText):
+            return value.decompress()
+        return super().to_python(value)
+
+    def get_db_prep_save(self, value, connection):
+        if isinstance(value, CompressedText):
+            return ZLIB_PREFIX + value.data
+        value = super().get_db_prep_save(value, connection)
+        if not isinstance(value, str):
+            # Expressions, e.g. the CASE statements of bulk_update()
+            return value
+        return encode_text(value, compression_threshold())
+
@@ -0,0 +1,123 @@
+import csv
+import heapq
+import json
+import zlib
+from datetime import datetime
+from itertools import chain
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .compression import CompressedText
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+CONTENT_TYPES = {
+    NDJSON: 'application/x-ndjson',
+    CSV: 'text/csv',
+}
+
+
+class _Echo:
+    """
+    File-like object whose write() hands the written value straight back,
+    so csv.writer can format one row at a time
+    """
+
+    def write(self, value):
+        return value
+
+
+def json_value(value):
+    if isinstance(value, CompressedText):
+        return value.decompress()
+    if isinstance(value, datetime):
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return json_value(value)
+
+
+def iter_log_rows(partitions, fields):
+    """
+    Stream value tuples from each queryset in (timestamp, id) order, merging
+    the partitions so the output is in time order overall. Rows are read with
+    chunked iterators, so memory use does not grow with the export size.
+    """
+    chunk_size = getattr(settings, 'LOGGER_EXPORT_CHUNK_SIZE', 2000)
+    iterators = [
+        queryset.order_by('timestamp', 'id').values_list(*fields).iterator(chunk_size=chunk_size)
+        for queryset in partitions
+    ]
+    if len(iterators) == 1:
+        return iterators[0]
+    timestamp_index = fields.index('timestamp')
+    id_index = fields.index('id')
+    return heapq.merge(*iterators, key=lambda row: (row[timestamp_index], row[id_index]))
+
+
+def ndjson_lines(rows, fields):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, map(json_value, row)))) + '\n'
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def encode_chunks(lines, compress=False, chunk_bytes=64 * 1024):
+    """
+    Encode lines into chunks of roughly chunk_bytes, gzipping them on the fly
+    when compress is set
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    pending = []
+    pending_bytes = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        pending.append(data)
+        pending_bytes += len(data)
+        if pending_bytes >= chunk_bytes:
+            chunk = b''.join(pending)
+            pending = []
+            pending_bytes = 0
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    chunk = b''.join(pending)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def export_response(partitions, fields, output, compress, filename, archived=None):
+    """
+    Streaming download of the logs of the partitions, preceded by archived
+    logs (record dicts in time order, all older than the database rows)
+    """
+    rows = iter_log_rows(partitions, fields)
+    if archived is not None:
+        rows = chain((tuple(record[field] for field in fields) for record in archived), rows)
+    lines = csv_lines(rows, fields) if output == CSV else ndjson_lines(rows, fields)
+    filename = f'{filename}.{output}'
+    if compress:
+        content_type = 'application/gzip'
+        filename += '.gz'
+    else:
+        content_type = CONTENT_TYPES[output]
+    response = StreamingHttpResponse(encode_chunks(lines, compress), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,147 @@
+import json
+import re
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+METADATA_PARAM_RE = re.compile(r'^metadata\.(\w+)$')
+
+
+def parse_time_param(params, name):
+    """
+    Read an ISO 8601 timestamp query parameter; naive values are taken as UTC
+    """
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValidationError({name: ["Expected an ISO 8601 timestamp"]})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def parse_api_key_param(params):
+    value = params.get('api_key')
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({'api_key': ["Expected an API key id"]})
+
+
+def json_equal(value, other):
+    # As JSON values compare: true is not 1, but 1 is 1.0
+    if isinstance(value, bool) or isinstance(other, bool):
+        return type(value) is type(other) and value == other
+    return value == other
+
+
+class LogFilterBackend(BaseFilterBackend):
+    """
+    Server-side filters for the log viewsets. Only filters that an index can
+    serve are accepted:
+
+    - api_key (id) and since/until combine with everything, as every log index
+      starts with api_key and ends with timestamp
+    - at most one of the view's indexed_filter_fields (e.g. level or user_id),
+      each backed by an (api_key, field, timestamp) index
+    - metadata.<key>=<value> equality is not indexable, so it is only allowed
+      within a since/until window of at most LOGGER_METADATA_FILTER_MAX_WINDOW_HOURS
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        indexed_fields = getattr(view, 'indexed_filter_fields', ())
+
+        api_key = parse_api_key_param(params)
+        if api_key is not None:
+            queryset = queryset.filter(api_key=api_key)
+
+        since = parse_time_param(params, 'since')
+        until = parse_time_param(params, 'until')
+        if since is not None:
+            queryset = queryset.filter(timestamp__gte=since)
+        if until is not None:
+            queryset = queryset.filter(timestamp__lt=until)
+        if since is not None and until is not None and since >= until:
+            raise ValidationError({'since': ["Must be before until"]})
+
+        equality_filters = {field: params[field] for field in indexed_fields if params.get(field)}
+        if len(equality_filters) > 1:
+            raise ValidationError({
+                'non_field_errors': [f"Filter by at most one of: {', '.join(indexed_fields)}"]
+            })
+        queryset = queryset.filter(**equality_filters)
+
+        metadata_filters = {}
+        for param, value in params.items():
+            match = METADATA_PARAM_RE.match(param)
+            if match:
+                metadata_filters[f'metadata__{match.group(1)}'] = self.parse_metadata_value(value)
+        if metadata_filters:
+            self.check_metadata_window(since, until)
+            queryset = queryset.filter(**metadata_filters)
+
+        if params.get('q') and (api_key is not None or since or until or equality_filters or metadata_filters):
+            raise ValidationError({'q': ["Full-text search cannot be combined with other filters"]})
+
+        return queryset
+
+    def archive_filters(self, request, view):
+        """
+        The request's filters as (since, until, predicate) for archived logs,
+        where predicate tests a record dict. Expects a request that passed
+        filter_queryset; the api_key filter is applied by the caller.
+        """
+        params = request.query_params
+        equality_filters = {
+            field: params[field] for field in getattr(view, 'indexed_filter_fields', ()) if params.get(field)
+        }
+        metadata_filters = {}
+        for param, value in params.items():
+            match = METADATA_PARAM_RE.match(param)
+            if match:
+                metadata_filters[match.group(1)] = self.parse_metadata_value(value)
+
+        def predicate(record):
+            for field, value in equality_filters.items():
+                if record[field] != value:
+                    return False
+            if metadata_filters:
+                metadata = record['metadata']
+                if not isinstance(metadata, dict):
+                    return False
+                for key, value in metadata_filters.items():
+                    if key not in metadata or not json_equal(metadata[key], value):
+                        return False
+            return True
+
+        return (
+            parse_time_param(params, 'since'),
+            parse_time_param(params, 'until'),
+            predicate if equality_filters or metadata_filters else None,
+        )
+
+    def parse_metadata_value(self, value):
+        # Numbers, booleans and null compare as JSON values, anything else as a string
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return value
+        return parsed if isinstance(parsed, (int, float, bool)) or parsed is None else value
+
+    def check_metadata_window(self, since, until):
+        max_hours = getattr(settings, 'LOGGER_METADATA_FILTER_MAX_WINDOW_HOURS', 24)
+        if since is None:
+            raise ValidationError({'since': ["Metadata filters require since"]})
+        if (until or timezone.now()) - since > timedelta(hours=max_hours):
+            raise ValidationError({
+                'since': [f"Metadata filters are limited to a window of {max_hours} hours"]
+            })
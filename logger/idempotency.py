@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+HEADER_MAX_LENGTH = 200  # Leaves room for the ":<index>" suffix of batch records
+LOOKUP_CHUNK_SIZE = 500  # Keys per IN (...) lookup, well below SQLite's variable limit
+
+
+class IdempotencyCache:
+    """
+    Bounded, in-process LRU of recently ingested (api_key_id, kind, key)
+    entries, so that a retry handled by the same worker is recognised as a
+    duplicate without a query. The IdempotencyKey table remains the source of
+    truth across workers.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size if max_size is not None else getattr(settings, 'LOGGER_IDEMPOTENCY_CACHE_MAX_SIZE', 100000)
+        self.ttl = ttl if ttl is not None else window().total_seconds()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, entry):
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._entries.get(entry)
+            if expires_at is None:
+                return False
+            if expires_at <= now:
+                del self._entries[entry]
+                return False
+            self._entries.move_to_end(entry)
+            return True
+
+    def add(self, entries, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            for entry in entries:
+                self._entries[entry] = expires_at
+                self._entries.move_to_end(entry)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def window():
+    return timedelta(hours=getattr(settings, 'LOGGER_IDEMPOTENCY_WINDOW_HOURS', 24))
+
+
+def request_key(request):
+    """
+    The request's Idempotency-Key header, or None
+    """
+    key = request.headers.get(HEADER, '').strip()
+    if len(key) > HEADER_MAX_LENGTH:
+        raise ParseError(f"{HEADER} may be at most {HEADER_MAX_LENGTH} characters")
+    return key or None
+
+
+def record_key(header_key, key, index):
+    """
+    Key of a batch record: its own idempotency_key, else the request's key
+    suffixed with the record's index in the batch
+    """
+    if key is not None or header_key is None:
+        return key
+    return f'{header_key}:{index}'
+
+
+def drop_duplicates(logs, keys):
+    """
+    Split logs into (new logs, their keys, number of duplicates), using the
+    in-memory cache only. Keys repeated within the same request are
+    duplicates too.
+    """
+    new_logs, new_keys, duplicates = [], [], 0
+    batch = set()
+    for log, key in zip(logs, keys):
+        if key is not None:
+            entry = (log.api_key_id, log.counter_kind, key)
+            if entry in batch or idempotency_cache.seen(entry):
+                duplicates += 1
+                continue
+            batch.add(entry)
+        new_logs.append(log)
+        new_keys.append(key)
+    return new_logs, new_keys, duplicates
+
+
+def claim_keys(logs, keys, using='default'):
+    """
+    Record the keys of logs about to be inserted, inside the caller's
+    transaction, and return the logs whose key was not ingested within the
+    window. Rows of keys last used before the window are replaced, so a key
+    may be reused once it expired. Raises IntegrityError when a concurrent
+    request claims one of the keys first.
+    """
+    kind = logs[0].counter_kind
+    wanted = {(log.api_key_id, key) for log, key in zip(logs, keys) if key is not None}
+    if not wanted:
+        return logs
+    now = timezone.now()
+    cutoff = now - window()
+    existing, expired = {}, []
+    wanted_keys = sorted(wanted)
+    for start in range(0, len(wanted_keys), LOOKUP_CHUNK_SIZE):
+        chunk = wanted_keys[start:start + LOOKUP_CHUNK_SIZE]
+        rows = IdempotencyKey.objects.using(using).filter(
+            kind=kind,
+            api_key_id__in={api_key_id for api_key_id, _ in chunk},
+            key__in=[key for _, key in chunk],
+        ).values_list('pk', 'api_key_id', 'key', 'created_at')
+        for pk, api_key_id, key, created_at in rows:
+            if (api_key_id, key) not in wanted:
+                continue
+            if created_at >= cutoff:
+                existing[api_key_id, key] = created_at
+            else:
+                expired.append(pk)
+    for start in range(0, len(expired), LOOKUP_CHUNK_SIZE):
+        IdempotencyKey.objects.using(using).filter(pk__in=expired[start:start + LOOKUP_CHUNK_SIZE]).delete()
+    IdempotencyKey.objects.using(using).bulk_create(
+        [IdempotencyKey(api_key_id=api_key_id, kind=kind, key=key, created_at=now) for api_key_id, key in wanted_keys
+         if (api_key_id, key) not in existing],
+        batch_size=LOOKUP_CHUNK_SIZE,
+    )
+    if existing:
+        # Remembered only until the oldest of them leaves the window
+        ttl = (min(existing.values()) - cutoff).total_seconds()
+        idempotency_cache.add(((api_key_id, kind, key) for api_key_id, key in existing), ttl=ttl)
+    return [log for log, key in zip(logs, keys) if key is None or (log.api_key_id, key) not in existing]
+
+
+def write_logs(model, logs, keys, batch_size):
+    """
+    Insert logs that are not duplicates of already ingested ones. Returns the
+    logs written and the number of duplicates skipped.
+
+    Duplicates are filtered out before bulk_create rather than with
+    ignore_conflicts, so the counters and rollups only count inserted rows.
+    """
+    logs, keys, duplicates = drop_duplicates(logs, keys)
+    if not logs:
+        return [], duplicates
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                written = claim_keys(logs, keys)
+                if written:
+                    model.objects.bulk_create(written, batch_size=batch_size)
+            break
+        except IntegrityError:
+            # Another worker claimed one of the keys meanwhile; the retry finds it
+            if attempt:
+                raise
+    kind = model.counter_kind
+    idempotency_cache.add((log.api_key_id, kind, key) for log, key in zip(logs, keys) if key is not None)
+    return written, duplicates + len(logs) - len(written)
+
+
+def expired_keys(now=None):
+    return IdempotencyKey.objects.filter(created_at__lt=(now or timezone.now()) - window())
+
+
+idempotency_cache = IdempotencyCache()
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class Subscription:
+    """
+    A live stream's interest in new logs of one kind for a set of API keys.
+    The hub only wakes it; the stream then reads the new rows from the
+    database, so rows written by other workers are picked up by polling.
+    """
+
+    def __init__(self, kind, api_key_ids, loop=None):
+        self.kind = kind
+        self.api_key_ids = frozenset(api_key_ids)
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+    def clear(self):
+        self.event.clear()
+
+    def wait(self, timeout):
+        return self.event.wait(timeout)
+
+    async def async_wait(self, timeout):
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class LogHub:
+    """
+    In-process fan-out from the ingestion path to the live streams of this
+    worker. Notifications carry no rows, just which API keys have new logs.
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._sync_streams = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, kind, api_key_ids, loop=None):
+        subscription = Subscription(kind, api_key_ids, loop)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def notify(self, kind, api_key_ids):
+        api_key_ids = set(api_key_ids)
+        with self._lock:
+            subscriptions = [
+                subscription for subscription in self._subscriptions
+                if subscription.kind == kind and not subscription.api_key_ids.isdisjoint(api_key_ids)
+            ]
+        for subscription in subscriptions:
+            subscription.wake()
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def acquire_sync_stream(self, limit):
+        """
+        Reserve one of the limit streams a WSGI worker may serve at a time,
+        each of which holds a worker thread. Returns False when none is left.
+        """
+        with self._lock:
+            if self._sync_streams >= limit:
+                return False
+            self._sync_streams += 1
+            return True
+
+    def release_sync_stream(self):
+        with self._lock:
+            self._sync_streams -= 1
+
+
+log_hub = LogHub()
+
+
+class SyncStreamEvents:
+    """
+    The events of a stream served by a WSGI worker. Holds one of the hub's
+    sync stream slots until Django closes the response, even one whose
+    events were never iterated.
+    """
+
+    def __init__(self, log_stream):
+        self.events = iter(log_stream)
+        self.released = False
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        if not self.released:
+            self.released = True
+            log_hub.release_sync_stream()
+
+
+class LogStream:
+    """
+    Server-Sent Events for the logs of a queryset with an id above last_id, in
+    id order. Each event's id is the log id, so a reconnecting client resumes
+    with Last-Event-ID. Between reads the stream sleeps until the hub wakes it
+    or LOGGER_STREAM_POLL_INTERVAL passes, and it ends after
+    LOGGER_STREAM_MAX_SECONDS so that the client reconnects.
+
+    Ids are handed out before transactions commit, so a row may appear after
+    rows with higher ids were sent. Every read therefore goes back over the
+    rows sent in the last LOGGER_STREAM_LOOKBACK_SECONDS and only sends those
+    it has not sent yet.
+    """
+
+    def __init__(self, queryset, serializer_class, kind, api_key_ids, last_id):
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.kind = kind
+        self.api_key_ids = api_key_ids
+        self.last_id = last_id  # Rows up to this id are settled: sent, or never to be sent
+        self.recent = deque()  # (time sent, id) of the rows sent within the lookback
+        self.recent_ids = set()
+        self.poll_interval = getattr(settings, 'LOGGER_STREAM_POLL_INTERVAL', 2)
+        self.heartbeat = getattr(settings, 'LOGGER_STREAM_HEARTBEAT', 15)
+        self.max_seconds = getattr(settings, 'LOGGER_STREAM_MAX_SECONDS', 300)
+        self.batch_size = getattr(settings, 'LOGGER_STREAM_BATCH_SIZE', 500)
+        self.lookback = getattr(settings, 'LOGGER_STREAM_LOOKBACK_SECONDS', 5)
+
+    def read(self):
+        """
+        Render the next rows as events. Returns (text, whether more rows may
+        be waiting).
+        """
+        now = time.monotonic()
+        while self.recent and now - self.recent[0][0] >= self.lookback:
+            _, pk = self.recent.popleft()
+            self.recent_ids.discard(pk)
+            self.last_id = max(self.last_id, pk)
+
+        ids = self.queryset.filter(id__gt=self.last_id).order_by('id').values_list('id', flat=True)
+        ids = [pk for pk in ids[:self.batch_size + len(self.recent_ids)] if pk not in self.recent_ids]
+        ids = ids[:self.batch_size]
+        if not ids:
+            return '', False
+        rows = list(self.queryset.filter(id__in=ids).order_by('id'))
+        for row in rows:
+            self.recent.append((now, row.id))
+            self.recent_ids.add(row.id)
+        events = ''.join(
+            f'id: {row["id"]}\nevent: log\ndata: {json.dumps(row, cls=DjangoJSONEncoder)}\n\n'
+            for row in self.serializer_class(rows, many=True).data
+        )
+        return events, len(ids) == self.batch_size
+
+    def __iter__(self):
+        subscription = log_hub.subscribe(self.kind, self.api_key_ids)
+        try:
+            yield f'retry: {int(self.poll_interval * 1000)}\n\n'
+            started = last_sent = time.monotonic()
+            while time.monotonic() - started < self.max_seconds:
+                subscription.clear()
+                events, more = self.read()
+                if events:
+                    last_sent = time.monotonic()
+                    yield events
+                    if more:
+                        continue
+                elif time.monotonic() - last_sent >= self.heartbeat:
+                    last_sent = time.monotonic()
+                    yield ': keepalive\n\n'
+                subscription.wait(self.poll_interval)
+        finally:
+            log_hub.unsubscribe(subscription)
+
+    async def __aiter__(self):
+        subscription = log_hub.subscribe(self.kind, self.api_key_ids, asyncio.get_running_loop())
+        read = sync_to_async(self.read)
+        try:
+            yield f'retry: {int(self.poll_interval * 1000)}\n\n'
+            started = last_sent = time.monotonic()
+            while time.monotonic() - started < self.max_seconds:
+                subscription.clear()
+                events, more = await read()
+                if events:
+                    last_sent = time.monotonic()
+                    yield events
+                    if more:
+                        continue
+                elif time.monotonic() - last_sent >= self.heartbeat:
+                    last_sent = time.monotonic()
+                    yield ': keepalive\n\n'
+                await subscription.async_wait(self.poll_interval)
+        finally:
+            log_hub.unsubscribe(subscription)
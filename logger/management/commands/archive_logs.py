@@ -0,0 +1,56 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from logger.archive import LOG_MODELS, archive_logs
+from logger.models import LogRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Move logs older than --older-than days out of the database into gzipped "
+        "NDJSON segment files under LOGGER_ARCHIVE_DIR, one per API key and UTC "
+        "day. Archived rows are deleted in small chunks with a pause between "
+        "them; an interrupted run is resumed by running it again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=getattr(settings, 'LOGGER_ARCHIVE_AFTER_DAYS', 30),
+            help="Archive logs older than this many days, rounded down to a UTC day",
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=getattr(settings, 'LOGGER_PURGE_CHUNK_SIZE', 5000),
+            help="Most rows read or deleted per query",
+        )
+        parser.add_argument(
+            '--pause', type=float, default=getattr(settings, 'LOGGER_PURGE_PAUSE', 0.1),
+            help="Seconds to sleep between deleted chunks",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many logs would be archived")
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 1:
+            raise CommandError("--older-than must be at least 1 day")
+        cutoff = LogRollup.truncate(timezone.now() - timedelta(days=options['older_than']), LogRollup.DAY)
+
+        started = time.monotonic()
+        for model in LOG_MODELS:
+            name = model._meta.verbose_name_plural
+            total = segments = 0
+            for api_key_id, day, logs in archive_logs(
+                model, cutoff, options['chunk_size'], options['pause'], options['dry_run']
+            ):
+                total += logs
+                segments += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{name} api_key={api_key_id} {day.date()}: {logs} logs")
+            if options['dry_run']:
+                self.stdout.write(f"{name}: {total} logs older than {cutoff.date()} would be archived")
+            else:
+                self.stdout.write(f"{name}: archived {total} logs into {segments} segments")
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Archived in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,107 @@
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from logger.archive import archived_log_chunks
+from logger.models import (
+    ArchiveSegment, EventLogMessage, LlmLogMessage, LlmUsageRollup, LlmUsageSketch, LogRollup, record_usage,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the time series rollups and the LLM usage analytics from the raw "
+        "log tables and archive segments, one UTC day at a time. Existing rollups in the range are replaced. Run it while "
+        "ingestion into the range is quiet, as logs written during a day's "
+        "rebuild may be counted twice or missed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="ISO 8601 timestamp to start from (default: the oldest log)")
+        parser.add_argument('--until', help="ISO 8601 timestamp to stop at (default: now)")
+
+    def handle(self, *args, **options):
+        since = self.parse_time(options['since']) if options['since'] else self.oldest_log_time()
+        until = self.parse_time(options['until']) if options['until'] else timezone.now()
+        if since is None:
+            self.stdout.write("There are no logs to roll up")
+            return
+
+        # Whole days, so that every minute, hour and day bucket is rebuilt completely
+        day = LogRollup.truncate(since, LogRollup.DAY)
+        last_day = LogRollup.truncate(until, LogRollup.DAY)
+        while day <= last_day:
+            next_day = day + timedelta(days=1)
+            with transaction.atomic():
+                LogRollup.objects.filter(bucket_start__gte=day, bucket_start__lt=next_day).delete()
+                rollups = []
+                for model in (EventLogMessage, LlmLogMessage):
+                    logs = model.objects.filter(api_key__isnull=False, timestamp__gte=day, timestamp__lt=next_day)
+                    for key, count in logs.rollup_deltas().items():
+                        api_key_id, kind, granularity, bucket_start, dimension = key
+                        rollups.append(LogRollup(
+                            api_key_id=api_key_id, kind=kind, granularity=granularity,
+                            bucket_start=bucket_start, dimension=dimension, count=count,
+                        ))
+                LogRollup.objects.bulk_create(rollups, batch_size=500)
+                usage = self.rebuild_usage(day, next_day)
+                archived = self.add_archived(day, next_day)
+            self.stdout.write(
+                f"{day.date()}: {len(rollups)} rollup rows, {usage} usage rows, {archived} archived logs"
+            )
+            day = next_day
+
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt"))
+
+    def rebuild_usage(self, day, next_day):
+        LlmUsageRollup.objects.filter(bucket_start__gte=day, bucket_start__lt=next_day).delete()
+        LlmUsageSketch.objects.filter(bucket_start__gte=day, bucket_start__lt=next_day).delete()
+        rows = LlmLogMessage.objects.filter(
+            api_key__isnull=False, timestamp__gte=day, timestamp__lt=next_day
+        ).usage_rows()
+        rollups = [
+            LlmUsageRollup(api_key_id=api_key_id, bucket_start=bucket_start, source=source, metric=metric,
+                           count=count, total=total)
+            for (api_key_id, bucket_start, source, metric), (count, total) in LlmUsageRollup.objects.deltas(rows).items()
+        ]
+        sketches = [
+            LlmUsageSketch(api_key_id=api_key_id, bucket_start=bucket_start, source=source, metric=metric,
+                           bucket=bucket, count=count)
+            for (api_key_id, bucket_start, source, metric, bucket), count in LlmUsageSketch.objects.deltas(rows).items()
+        ]
+        LlmUsageRollup.objects.bulk_create(rollups, batch_size=500)
+        LlmUsageSketch.objects.bulk_create(sketches, batch_size=500)
+        return len(rollups) + len(sketches)
+
+    def add_archived(self, day, next_day):
+        # Archived logs are no longer in the log tables but still count
+        archived = 0
+        for model in (EventLogMessage, LlmLogMessage):
+            for logs in archived_log_chunks(model, day, next_day):
+                LogRollup.objects.record(logs)
+                usage = [log.usage_row for log in logs if log.tracks_usage]
+                if usage:
+                    record_usage(usage)
+                archived += len(logs)
+        return archived
+
+    def parse_time(self, value):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f"Invalid timestamp: {value}")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+
+    def oldest_log_time(self):
+        oldest = [
+            model.objects.aggregate(oldest=Min('timestamp'))['oldest']
+            for model in (EventLogMessage, LlmLogMessage)
+        ]
+        oldest.append(ArchiveSegment.objects.aggregate(oldest=Min('start'))['oldest'])
+        oldest = [timestamp for timestamp in oldest if timestamp is not None]
+        return min(oldest) if oldest else None
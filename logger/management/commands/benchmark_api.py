@@ -0,0 +1,330 @@
+import contextlib
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from logger.benchmarking import latency_percentiles
+from logger.models import ApiKey, EventLogMessage, LlmLogMessage
+
+SCENARIOS = ('ingest', 'ingest-batch', 'llm-ingest', 'list', 'search', 'stats', 'timeseries', 'auth')
+LEVELS = ('info', 'info', 'info', 'debug', 'warning', 'error')
+WORDS = (
+    'checkout payment login signup search cart profile settings upload export '
+    'timeout retry failed succeeded clicked viewed opened closed slow fast'
+).split()
+
+
+class ClientTarget:
+    """
+    Sends requests through the Django test client in this process, so the
+    database queries of each request can be counted
+    """
+    name = 'client'
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def request(self, method, path, body, headers):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(raise_request_exception=False)
+        with contextlib.ExitStack() as stack:
+            captures = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+            response = client.generic(
+                method, path, json.dumps(body) if body is not None else '',
+                content_type='application/json', headers=headers
+            )
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        return response.status_code, sum(len(capture) for capture in captures)
+
+    def close(self):
+        connections.close_all()
+
+
+class HttpTarget:
+    """
+    Sends requests to a running server over one keep-alive connection per
+    worker thread. Queries cannot be counted from the outside.
+    """
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        if parts.scheme != 'http':
+            raise CommandError(f"Only http:// URLs are supported: {url}")
+        self.name = url
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, method, path, body, headers):
+        headers = dict(headers, **{'Content-Type': 'application/json'})
+        data = json.dumps(body).encode() if body is not None else None
+        for attempt in range(2):
+            connection = getattr(self.local, 'connection', None)
+            if connection is None:
+                connection = self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                connection.request(method, self.prefix + path, data, headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+                continue
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+                self.local.connection = None
+            return response.status, None
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the API with synthesized or replayed traffic and report "
+        "throughput, latency percentiles and database queries per request. "
+        "Runs against the configured database through the test client, or "
+        "against a running server with --url. Data is seeded for a dedicated "
+        "benchmark user, so point it at a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS + ('replay',),
+            help="Traffic to send, may be repeated (default: all synthesized scenarios)"
+        )
+        parser.add_argument('--replay', help='JSON lines file of requests to replay, one {"method", "path", "body", "auth"} object per line')
+        parser.add_argument('--url', help="Base URL of a running server, e.g. http://127.0.0.1:8000")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent workers")
+        parser.add_argument('--requests', type=int, default=1000, help="Timed requests per scenario")
+        parser.add_argument('--warmup', type=int, default=50, help="Untimed requests sent first per scenario")
+        parser.add_argument('--batch-size', type=int, default=100, help="Records per ingest-batch request")
+        parser.add_argument('--seed-rows', type=int, default=0, help="Event and LLM logs to seed for the benchmark key, e.g. 100000 to 10000000")
+        parser.add_argument('--seed-days', type=int, default=30, help="Days over which seeded logs are spread")
+        parser.add_argument('--username', default='benchmark', help="User that owns the benchmark API key")
+        parser.add_argument('--password', default='benchmark-password', help="Password set on the benchmark user")
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        scenarios = options['scenario'] or (['replay'] if options['replay'] else list(SCENARIOS))
+        if 'replay' in scenarios and not options['replay']:
+            raise CommandError("The replay scenario needs --replay")
+        replay = self.load_replay(options['replay']) if options['replay'] else None
+
+        user, api_key = self.benchmark_key(options['username'], options['password'])
+        if options['seed_rows']:
+            self.seed(api_key, options['seed_rows'], options['seed_days'], options['random_seed'])
+        # Simple JWT tokens are signed with SECRET_KEY, so a --url server must share these settings
+        token = str(RefreshToken.for_user(user).access_token)
+        context = {
+            'api_key': api_key, 'token': token, 'username': options['username'],
+            'password': options['password'], 'batch_size': options['batch_size'], 'replay': replay,
+        }
+
+        target = HttpTarget(options['url']) if options['url'] else ClientTarget()
+        results = []
+        for scenario in scenarios:
+            requests = self.scenario_requests(scenario, context, random.Random(options['random_seed']))
+            if options['warmup']:
+                self.run(target, requests, options['warmup'], options['concurrency'])
+            results.append(dict(scenario=scenario, **self.run(
+                target, requests, options['requests'], options['concurrency']
+            )))
+
+        self.stdout.write(
+            f"{'scenario':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}  statuses"
+        )
+        for result in results:
+            queries = result['queries_per_request']
+            self.stdout.write(
+                f"{result['scenario']:<14}{result['requests_per_second']:>10.0f}{result['p50_ms']:>10.1f}"
+                f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                f"{'-' if queries is None else f'{queries:.1f}':>9}  {result['statuses']}"
+            )
+        if options['output']:
+            report = {
+                'started_at': timezone.now().isoformat(),
+                'target': target.name,
+                'database': settings.DATABASES['default']['ENGINE'],
+                'concurrency': options['concurrency'],
+                'event_logs': EventLogMessage.objects.filter(api_key=api_key).count(),
+                'llm_logs': LlmLogMessage.objects.filter(api_key=api_key).count(),
+                'results': results,
+            }
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    def load_replay(self, path):
+        """
+        Each line is {"method": "POST", "path": "/api/event-log/", "body": {...},
+        "auth": true}. "$API_KEY" and "$API_KEY_ID" in the line are replaced by
+        the benchmark key; auth sends the benchmark user's JWT.
+        """
+        lines = []
+        with open(path) as replay:
+            for line_number, line in enumerate(replay, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError as exc:
+                    raise CommandError(f"{path}:{line_number}: {exc}")
+                if not isinstance(request, dict) or 'path' not in request:
+                    raise CommandError(f"{path}:{line_number}: expected an object with a path")
+                lines.append(line)
+        if not lines:
+            raise CommandError(f"{path} has no requests")
+        return lines
+
+    def benchmark_key(self, username, password):
+        user, created = User.objects.get_or_create(username=username)
+        if created or not user.check_password(password):
+            user.set_password(password)
+            user.save()
+        api_key = ApiKey.objects.filter(user=user, name='benchmark', is_active=True).first()
+        if api_key is None:
+            api_key = ApiKey.objects.create(user=user, name='benchmark')
+        return user, api_key
+
+    def seed(self, api_key, rows, days, random_seed):
+        """
+        Top the benchmark key's event and LLM logs up to rows each, spread
+        over the last days
+        """
+        rng = random.Random(random_seed)
+        now = timezone.now()
+        chunk_size = 10000
+        batch_size = getattr(settings, 'LOGGER_BULK_CREATE_BATCH_SIZE', 500)
+        for model in (EventLogMessage, LlmLogMessage):
+            existing = model.objects.filter(api_key=api_key).count()
+            for start in range(existing, rows, chunk_size):
+                logs = []
+                for i in range(start, min(rows, start + chunk_size)):
+                    words = ' '.join(rng.choice(WORDS) for _ in range(6))
+                    common = dict(
+                        api_key=api_key, user_id=f'user-{rng.randrange(1000)}',
+                        timestamp=now - timedelta(seconds=rng.randrange(days * 86400)),
+                        metadata={'request_id': i, 'page': rng.choice(WORDS)},
+                    )
+                    if model is EventLogMessage:
+                        logs.append(model(message=words, level=rng.choice(LEVELS), **common))
+                    else:
+                        logs.append(model(source=rng.choice(('gpt-4', 'claude', 'llama')), query=words,
+                                          response=words[::-1], **common))
+                model.objects.bulk_create(logs, batch_size=batch_size)
+                self.stdout.write(f"Seeded {start + len(logs)}/{rows} {model._meta.verbose_name_plural}")
+
+    def scenario_requests(self, scenario, context, rng):
+        """
+        An endless iterator of (method, path, body, headers)
+        """
+        api_key = context['api_key']
+        auth = {'Authorization': f"Bearer {context['token']}"}
+
+        def event():
+            return {
+                'api_key': str(api_key.key), 'user_id': f'user-{rng.randrange(1000)}',
+                'level': rng.choice(LEVELS), 'message': ' '.join(rng.choice(WORDS) for _ in range(6)),
+                'metadata': {'page': rng.choice(WORDS)},
+            }
+
+        while True:
+            if scenario == 'ingest':
+                yield 'POST', '/api/event-log/', event(), {}
+            elif scenario == 'ingest-batch':
+                yield 'POST', '/api/event-log/batch/', [event() for _ in range(context['batch_size'])], {}
+            elif scenario == 'llm-ingest':
+                yield 'POST', '/api/llm-log/', {
+                    'api_key': str(api_key.key), 'user_id': f'user-{rng.randrange(1000)}', 'source': 'gpt-4',
+                    'query': ' '.join(rng.choice(WORDS) for _ in range(20)), 'response': 'ok',
+                    'metadata': {'tokens': rng.randrange(2000)},
+                }, {}
+            elif scenario == 'list':
+                yield 'GET', f'/api/event-logs/?api_key={api_key.id}&page_size=50', None, auth
+            elif scenario == 'search':
+                yield 'GET', f'/api/event-logs/?q={rng.choice(WORDS)}', None, auth
+            elif scenario == 'stats':
+                yield 'GET', '/api/user/stats/', None, auth
+            elif scenario == 'timeseries':
+                yield 'GET', f'/api/stats/timeseries/?api_key={api_key.id}&bucket=hour', None, auth
+            elif scenario == 'auth':
+                yield 'POST', '/api/auth/token/', {
+                    'username': context['username'], 'password': context['password'],
+                }, {}
+            else:
+                for line in context['replay']:
+                    request = json.loads(
+                        line.replace('$API_KEY_ID', str(api_key.id)).replace('$API_KEY', str(api_key.key))
+                    )
+                    yield (
+                        request.get('method', 'GET').upper(), request['path'], request.get('body'),
+                        auth if request.get('auth') else {},
+                    )
+
+    def run(self, target, requests, total, concurrency):
+        lock = threading.Lock()
+        remaining = iter(range(total))
+        latencies = []
+        queries = []
+        statuses = Counter()
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                        method, path, body, headers = next(requests)
+                    started = time.perf_counter()
+                    try:
+                        status, query_count = target.request(method, path, body, headers)
+                    except (OSError, http.client.HTTPException):
+                        with lock:
+                            statuses['connection error'] += 1
+                        continue
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[status] += 1
+                        if query_count is not None:
+                            queries.append(query_count)
+            finally:
+                target.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            for future in [executor.submit(worker) for _ in range(concurrency)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+        return {
+            'requests': total,
+            'seconds': elapsed,
+            'requests_per_second': total / elapsed if elapsed else 0.0,
+            **latency_percentiles(latencies),
+            'queries_per_request': sum(queries) / len(queries) if queries else None,
+            'statuses': dict(statuses),
+        }
@@ -0,0 +1,87 @@
+import random
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, Length
+from django.test.utils import override_settings
+
+from logger.models import ApiKey, LlmLogMessage
+
+WORDS = (
+    'the model returned a summary of the customer ticket with three action items '
+    'please retry the request using the updated context window and system prompt '
+    'error handling latency tokens embedding vector search answer question user '
+    'assistant function call arguments json schema validation output result'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the storage and read throughput of LLM payloads with and without "
+        "compression, on synthetic logs written in a transaction that is rolled back"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="LLM logs written per run")
+        parser.add_argument('--payload-bytes', type=int, default=16000, help="Approximate size of each query and response")
+        parser.add_argument('--preview', type=int, default=200, help="Characters read by the preview run")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        payloads = self.payloads(options['rows'] * 2, options['payload_bytes'], options['seed'])
+        self.stdout.write(f"{'mode':<12}{'stored MB':>12}{'write rows/s':>15}{'read rows/s':>15}{'preview rows/s':>17}")
+        for label, enabled in (('plain', False), ('compressed', True)):
+            with override_settings(LOGGER_LLM_PAYLOAD_COMPRESSION=enabled):
+                stored, write_rate, read_rate, preview_rate = self.run(payloads, options['preview'])
+            self.stdout.write(
+                f"{label:<12}{stored / 1e6:>12.2f}{write_rate:>15.0f}{read_rate:>15.0f}{preview_rate:>17.0f}"
+            )
+
+    def payloads(self, count, size, seed):
+        rng = random.Random(seed)
+        payloads = []
+        for _ in range(count):
+            words = []
+            length = 0
+            while length < size:
+                word = rng.choice(WORDS)
+                words.append(word)
+                length += len(word) + 1
+            payloads.append(' '.join(words))
+        return payloads
+
+    def run(self, payloads, preview):
+        with transaction.atomic():
+            user = User.objects.create(username=f'benchmark-{uuid.uuid4()}')
+            api_key = ApiKey.objects.create(user=user, name='benchmark')
+            logs = [
+                LlmLogMessage(api_key=api_key, user_id='benchmark', source='benchmark',
+                              query=payloads[i], response=payloads[i + 1])
+                for i in range(0, len(payloads), 2)
+            ]
+
+            started = time.perf_counter()
+            LlmLogMessage.objects.bulk_create(logs, batch_size=500)
+            write_rate = len(logs) / (time.perf_counter() - started)
+
+            queryset = LlmLogMessage.objects.filter(api_key=api_key)
+            stored = queryset.aggregate(
+                stored=Sum(Coalesce(Length('query'), 0) + Coalesce(Length('response'), 0))
+            )['stored']
+
+            started = time.perf_counter()
+            for log in queryset.iterator():
+                log.query, log.response
+            read_rate = len(logs) / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            for log in queryset.iterator():
+                log.payload_preview('query', preview), log.payload_preview('response', preview)
+            preview_rate = len(logs) / (time.perf_counter() - started)
+
+            transaction.set_rollback(True)
+        return stored, write_rate, read_rate, preview_rate
@@ -0,0 +1,175 @@
+import json
+import multiprocessing
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from logger.benchmarking import latency_percentiles
+from logger.models import ApiKey, EventLogMessage
+
+# Journal mode, per-connection pragmas and ingestion mode of each configuration
+MODES = {
+    # Django's defaults: rollback journal, deferred transactions, each thread writing
+    'default': ('delete', {}, 'sync'),
+    'wal': ('wal', {'synchronous': 'normal', 'busy_timeout': 5000, 'mmap_size': 256 * 1024 * 1024}, 'sync'),
+    'writer': ('wal', {'synchronous': 'normal', 'busy_timeout': 5000, 'mmap_size': 256 * 1024 * 1024}, 'writer'),
+}
+
+
+def use_database(path):
+    connections.close_all()
+    connections['default'].settings_dict['NAME'] = str(path)
+
+
+def worker(mode, path, api_key_id, threads, requests, batch, results):
+    """
+    One worker process: threads each send requests batches of event logs
+    through the ingestion write path, as gunicorn threads would
+    """
+    from logger.views import _write_logs
+
+    _, pragmas, ingestion_mode = MODES[mode]
+    settings.LOGGER_SQLITE_PRAGMAS = pragmas
+    settings.LOGGER_INGESTION_MODE = ingestion_mode
+    use_database(path)
+    latencies = []
+    errors = Counter()
+    written = 0
+    lock = threading.Lock()
+
+    def send():
+        nonlocal written
+        for _ in range(requests):
+            logs = [
+                EventLogMessage(api_key_id=api_key_id, user_id='benchmark', message='benchmark event', level='info')
+                for _ in range(batch)
+            ]
+            started = time.perf_counter()
+            try:
+                created, _ = _write_logs(EventLogMessage, logs)
+            except OperationalError as error:
+                with lock:
+                    errors[str(error)] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                written += len(created)
+        connections.close_all()
+
+    pool = [threading.Thread(target=send) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((latencies, dict(errors), written))
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent log writes to a scratch SQLite database from several "
+        "worker processes with several threads each, and count 'database is locked' "
+        "errors. Compares Django's default SQLite setup, WAL with the "
+        "LOGGER_SQLITE_PRAGMAS tuning, and WAL with the 'writer' ingestion mode."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="Worker processes")
+        parser.add_argument('--threads', type=int, default=4, help="Request threads per worker")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per thread")
+        parser.add_argument('--batch', type=int, default=10, help="Logs written per request")
+        parser.add_argument(
+            '--mode', action='append', choices=list(MODES),
+            help="Configuration to run, may be repeated (default: all)",
+        )
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("The default database is not SQLite")
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError("Worker processes are forked, which this platform does not support")
+
+        original_name = connections['default'].settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as directory:
+            template = Path(directory) / 'template.sqlite3'
+            try:
+                use_database(template)
+                call_command('migrate', verbosity=0, interactive=False)
+                user = User.objects.create_user(username='benchmark')
+                api_key_id = ApiKey.objects.create(user=user, name='Benchmark').pk
+                connections.close_all()
+                results = [
+                    self.run(mode, template, Path(directory) / f'{mode}.sqlite3', api_key_id, options)
+                    for mode in options['mode'] or MODES
+                ]
+            finally:
+                use_database(original_name)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{'mode':<10}{'logs/s':>10}{'req p50 ms':>12}{'req p99 ms':>12}{'locked':>8}{'errors':>8}  rows ok"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<10}{result['logs_per_second']:>10.0f}{result['p50_ms']:>12.1f}"
+                f"{result['p99_ms']:>12.1f}{result['locked']:>8}{result['errors']:>8}  {result['rows_ok']}"
+            )
+
+    def run(self, mode, template, path, api_key_id, options):
+        shutil.copyfile(template, path)
+        journal_mode = MODES[mode][0]
+        with sqlite3.connect(path) as database:
+            database.execute(f'PRAGMA journal_mode = {journal_mode}')
+        database.close()
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(
+                mode, path, api_key_id, options['threads'], options['requests'], options['batch'], results
+            ))
+            for _ in range(options['workers'])
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+
+        latencies = [latency for report, _, _ in reports for latency in report]
+        errors = Counter()
+        for _, report_errors, _ in reports:
+            errors.update(report_errors)
+        written = sum(report_written for _, _, report_written in reports)
+        with sqlite3.connect(path) as database:
+            rows = database.execute('SELECT COUNT(*) FROM logger_eventlogmessage').fetchone()[0]
+        database.close()
+        locked = sum(count for message, count in errors.items() if 'locked' in message)
+        return {
+            'mode': mode,
+            'workers': options['workers'],
+            'threads': options['threads'],
+            'logs': written,
+            'seconds': elapsed,
+            'logs_per_second': written / elapsed if elapsed else 0.0,
+            **latency_percentiles(latencies, (0.50, 0.99)),
+            'locked': locked,
+            'errors': sum(errors.values()) - locked,
+            'error_messages': dict(errors),
+            'rows_ok': rows == written,
+        }
@@ -0,0 +1,75 @@
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from logger.models import ApiKey
+from logger.serializers import EventLogMessageCreateSerializer, LlmLogMessageCreateSerializer
+from logger.validation import RecordValidator, validate_record
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the per-record cost of validating ingestion payloads with the "
+        "create serializers and with the compiled RecordValidator, API key "
+        "lookup included, against an API key created in a rolled back transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=20000, help="Records validated per run")
+        parser.add_argument('--invalid', type=float, default=0.1, help="Fraction of invalid records")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create(username=f'benchmark-{uuid.uuid4()}')
+            api_key = ApiKey.objects.create(user=user, name='benchmark')
+            self.stdout.write(f"{'kind':<8}{'serializer us':>16}{'validator us':>15}{'speedup':>10}")
+            for kind, serializer_class in (
+                ('event', EventLogMessageCreateSerializer),
+                ('llm', LlmLogMessageCreateSerializer),
+            ):
+                records = self.records(kind, str(api_key.key), options['records'], options['invalid'])
+                serializer_time = self.time_serializer(serializer_class, records)
+                validator_time = self.time_validator(RecordValidator(serializer_class), records)
+                self.stdout.write(
+                    f"{kind:<8}{serializer_time / len(records) * 1e6:>16.1f}"
+                    f"{validator_time / len(records) * 1e6:>15.1f}{serializer_time / validator_time:>9.1f}x"
+                )
+            transaction.set_rollback(True)
+
+    def records(self, kind, api_key, count, invalid):
+        every = round(1 / invalid) if invalid else 0
+        records = []
+        for i in range(count):
+            if kind == 'event':
+                record = {
+                    'api_key': api_key, 'user_id': f'user-{i % 100}', 'level': 'info',
+                    'message': f'benchmark event {i}', 'metadata': {'request_id': i, 'path': '/checkout'},
+                }
+            else:
+                record = {
+                    'api_key': api_key, 'user_id': f'user-{i % 100}', 'source': 'benchmark',
+                    'query': f'question {i}', 'response': f'answer {i}', 'metadata': {'tokens': i % 500},
+                }
+            if every and i % every == 0:
+                record['user_id'] = 'x' * 300
+            records.append(record)
+        return records
+
+    def time_serializer(self, serializer_class, records):
+        started = time.perf_counter()
+        for record in records:
+            serializer = serializer_class(data=record)
+            if serializer.is_valid():
+                serializer.validated_data
+            else:
+                serializer.errors
+        return time.perf_counter() - started
+
+    def time_validator(self, validator, records):
+        started = time.perf_counter()
+        for record in records:
+            validate_record(validator, record)
+        return time.perf_counter() - started
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from logger.compression import ZLIB_PREFIX, CompressedText, compression_threshold, encode_text
+from logger.models import LlmLogMessage
+
+PAYLOAD_FIELDS = ('query', 'response')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compress the stored queries and responses of existing LLM logs that "
+        "are above LOGGER_LLM_PAYLOAD_COMPRESSION_THRESHOLD. Rows are rewritten "
+        "in small batches by primary key, so it can run alongside ingestion."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows read and updated per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how much would be saved")
+
+    def handle(self, *args, **options):
+        threshold = compression_threshold()
+        if threshold is None:
+            raise CommandError("Set LOGGER_LLM_PAYLOAD_COMPRESSION = True before compressing existing logs")
+
+        last_id = 0
+        rows = 0
+        bytes_before = 0
+        bytes_after = 0
+        while True:
+            batch = list(
+                LlmLogMessage.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', *PAYLOAD_FIELDS)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            updates = {field: [] for field in PAYLOAD_FIELDS}
+            for pk, *values in batch:
+                for field, value in zip(PAYLOAD_FIELDS, values):
+                    # Compressed values are read back as CompressedText, plain ones as str
+                    if not isinstance(value, str):
+                        continue
+                    encoded = encode_text(value, threshold)
+                    if encoded.startswith(ZLIB_PREFIX):
+                        updates[field].append(
+                            LlmLogMessage(id=pk, **{field: CompressedText(encoded[len(ZLIB_PREFIX):])})
+                        )
+                        bytes_before += len(value.encode('utf-8'))
+                        bytes_after += len(encoded)
+
+            rows += len({log.id for logs in updates.values() for log in logs})
+            if not options['dry_run']:
+                with transaction.atomic():
+                    for field, logs in updates.items():
+                        if logs:
+                            LlmLogMessage.objects.bulk_update(logs, [field])
+
+        saved = bytes_before - bytes_after
+        message = f"{rows} logs, {bytes_before} bytes of payloads to {bytes_after} bytes ({saved} saved)"
+        if options['dry_run']:
+            self.stdout.write(f"Would compress {message}")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Compressed {message}"))
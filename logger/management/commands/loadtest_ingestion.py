@@ -0,0 +1,127 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from logger.benchmarking import latency_percentiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a running ingestion endpoint over keep-alive HTTP/1.1 "
+        "connections and report requests per second and latency percentiles. "
+        "Pass --url several times to compare deployments, e.g. gunicorn serving "
+        "/api/event-log/ against an ASGI server serving /api/event-log/async/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', required=True, help="Endpoint to load, may be repeated")
+        parser.add_argument('--api-key', required=True, help="Active API key UUID to send")
+        parser.add_argument('--kind', choices=['event', 'llm'], default='event', help="Kind of log record to send")
+        parser.add_argument('--concurrency', type=int, default=1000, help="Open connections")
+        parser.add_argument('--requests', type=int, default=20000, help="Requests per URL")
+        parser.add_argument('--warmup', type=int, default=500, help="Untimed requests sent first")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        if options['kind'] == 'event':
+            record = {'api_key': options['api_key'], 'user_id': 'loadtest', 'message': 'load test event', 'level': 'info'}
+        else:
+            record = {
+                'api_key': options['api_key'], 'user_id': 'loadtest', 'source': 'loadtest',
+                'query': 'What is the capital of France?', 'response': 'Paris.',
+            }
+        body = json.dumps(record).encode()
+
+        results = []
+        for url in options['url']:
+            parts = urlsplit(url)
+            if parts.scheme != 'http':
+                raise CommandError(f"Only http:// URLs are supported: {url}")
+            target = (parts.hostname, parts.port or 80, parts.path or '/')
+            if options['warmup']:
+                asyncio.run(self.run(target, body, options['warmup'], min(options['concurrency'], options['warmup'])))
+            results.append(dict(url=url, **asyncio.run(
+                self.run(target, body, options['requests'], options['concurrency'])
+            )))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'url':<50}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}  statuses")
+        for result in results:
+            self.stdout.write(
+                f"{result['url']:<50}{result['requests_per_second']:>10.0f}"
+                f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}  {result['statuses']}"
+            )
+
+    async def run(self, target, body, total, concurrency):
+        host, port, path = target
+        request = (
+            f'POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n'
+        ).encode() + body
+        remaining = iter(range(total))
+        latencies = []
+        statuses = Counter()
+
+        async def connection():
+            reader = writer = None
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(host, port)
+                    writer.write(request)
+                    status, keep_alive = await self.read_response(reader)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    statuses['connection error'] += 1
+                    writer = self.close(writer)
+                    continue
+                latencies.append(time.perf_counter() - started)
+                statuses[status] += 1
+                if not keep_alive:
+                    writer = self.close(writer)
+            self.close(writer)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return {
+            'requests': total,
+            'seconds': elapsed,
+            'requests_per_second': total / elapsed if elapsed else 0.0,
+            **latency_percentiles(latencies),
+            'statuses': dict(statuses),
+        }
+
+    async def read_response(self, reader):
+        status_line = (await reader.readline()).split()
+        if len(status_line) < 2:
+            # The server closed an idle keep-alive connection
+            raise asyncio.IncompleteReadError(b'', None)
+        status = int(status_line[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+        if headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await reader.readexactly(int(headers.get('content-length', 0)))
+        return status, headers.get('connection') != 'close'
+
+    def close(self, writer):
+        if writer is not None:
+            writer.close()
+        return None
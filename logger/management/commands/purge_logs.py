@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from logger.retention import purge_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete logs older than their API key's retention period, in small "
+        "chunks with a pause between them so ingestion is never blocked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=getattr(settings, 'LOGGER_PURGE_CHUNK_SIZE', 5000),
+            help="Most rows deleted per transaction",
+        )
+        parser.add_argument(
+            '--pause', type=float, default=getattr(settings, 'LOGGER_PURGE_PAUSE', 0.1),
+            help="Seconds to sleep between chunks",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows have expired")
+        parser.add_argument('--loop', action='store_true', help="Keep purging until interrupted")
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'LOGGER_PURGE_INTERVAL', 300),
+            help="Seconds between purge runs with --loop",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.purge(options)
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+            close_old_connections()
+
+    def purge(self, options):
+        started = time.monotonic()
+        totals = {}
+        for model, api_key_id, rows in purge_all(options['chunk_size'], options['pause'], options['dry_run']):
+            name = model._meta.verbose_name_plural
+            totals[name] = totals.get(name, 0) + rows
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{name} api_key={api_key_id}: {rows} rows")
+        elapsed = time.monotonic() - started
+
+        if options['dry_run']:
+            for name, rows in totals.items():
+                self.stdout.write(f"{name}: {rows} rows have expired")
+            return
+        total = sum(totals.values())
+        for name, rows in totals.items():
+            self.stdout.write(f"{name}: deleted {rows} rows")
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} rows in {elapsed:.1f}s ({rate:.0f} rows/s)"))
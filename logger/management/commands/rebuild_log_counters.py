@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from logger.archive import archived_counter_deltas
+from logger.models import EventLogMessage, LlmLogMessage, LogCounter
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount logs per API key and level from the raw log tables and the "
+        "archive segments, and fix any "
+        "LogCounter that has drifted. Run it while ingestion is quiet, as logs "
+        "written during the recount may be missed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only report counters that differ from the raw tables",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = EventLogMessage.objects.filter(api_key__isnull=False).counter_deltas()
+            expected.update(LlmLogMessage.objects.filter(api_key__isnull=False).counter_deltas())
+            expected.update(archived_counter_deltas())
+            current = {
+                (counter.api_key_id, counter.kind, counter.level): counter
+                for counter in LogCounter.objects.all()
+            }
+
+            mismatched = 0
+            for key in set(expected) | set(current):
+                expected_count = expected.get(key, 0)
+                counter = current.get(key)
+                current_count = counter.count if counter is not None else 0
+                if expected_count == current_count:
+                    continue
+                mismatched += 1
+                api_key_id, kind, level = key
+                self.stdout.write(
+                    f"api_key={api_key_id} kind={kind} level={level or '-'}: "
+                    f"counter={current_count} actual={expected_count}"
+                )
+                if options['dry_run']:
+                    continue
+                if counter is None:
+                    LogCounter.objects.create(api_key_id=api_key_id, kind=kind, level=level, count=expected_count)
+                elif expected_count == 0:
+                    counter.delete()
+                else:
+                    counter.count = expected_count
+                    counter.save(update_fields=['count'])
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("All log counters are correct"))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{mismatched} log counters differ from the raw tables"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {mismatched} log counters"))
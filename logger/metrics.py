@@ -0,0 +1,164 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+MAX_STATEMENTS = 100  # SQL statements kept per request for the slow request log
+
+current_request = contextvars.ContextVar('logger_request_stats', default=None)
+
+
+class RequestStats:
+    """
+    Time and database work of the request being handled in this context.
+    statements is None unless the request's SQL is captured for the slow
+    request log.
+    """
+    __slots__ = ('started', 'queries', 'db_seconds', 'serialize_seconds', 'render_started', 'statements')
+
+    def __init__(self, capture_sql=False):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_started = None
+        self.statements = [] if capture_sql else None
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute_wrapper timing queries into the current request's stats.
+    Database connections belong to a thread while the request stats follow
+    the context, so queries run through sync_to_async are counted as well.
+    """
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None and len(stats.statements) < MAX_STATEMENTS:
+            stats.statements.append((sql, elapsed))
+
+
+@contextmanager
+def serialization_timer():
+    """
+    Count the time spent in the block as serialization of the current request
+    """
+    stats = current_request.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialize_seconds += time.perf_counter() - started
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus style. Not thread-safe on
+    its own; RequestMetrics serializes the updates.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """
+        (le, cumulative count) pairs, ending with +Inf
+        """
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.statuses = Counter()
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.db_seconds = Histogram(DURATION_BUCKETS)
+        self.db_queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.serialize_seconds = Histogram(DURATION_BUCKETS)
+
+
+class RequestMetrics:
+    """
+    In-process aggregate of request timings per view and method, rendered in
+    the Prometheus text format. Each worker process keeps its own numbers.
+    """
+    HISTOGRAMS = (
+        ('duration', 'logger_http_request_duration_seconds', "Time spent handling the request"),
+        ('db_seconds', 'logger_http_request_db_seconds', "Time spent in database queries per request"),
+        ('db_queries', 'logger_http_request_db_queries', "Database queries per request"),
+        ('serialize_seconds', 'logger_http_request_serialization_seconds',
+         "Time spent serializing and rendering the response"),
+    )
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def record(self, view, method, status_code, duration, stats):
+        with self._lock:
+            metrics = self._views.get((view, method))
+            if metrics is None:
+                metrics = self._views[(view, method)] = ViewMetrics()
+            metrics.statuses[status_code] += 1
+            metrics.duration.observe(duration)
+            metrics.db_seconds.observe(stats.db_seconds)
+            metrics.db_queries.observe(stats.queries)
+            metrics.serialize_seconds.observe(stats.serialize_seconds)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = [
+                "# HELP logger_http_requests_total Requests handled, by view, method and status",
+                "# TYPE logger_http_requests_total counter",
+            ]
+            for (view, method), metrics in views:
+                labels = f'view="{escape_label(view)}",method="{method}"'
+                for status_code, count in sorted(metrics.statuses.items()):
+                    lines.append(f'logger_http_requests_total{{{labels},status="{status_code}"}} {count}')
+            for attribute, name, description in self.HISTOGRAMS:
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for (view, method), metrics in views:
+                    labels = f'view="{escape_label(view)}",method="{method}"'
+                    histogram = getattr(metrics, attribute)
+                    for bound, count in histogram.samples():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0005_alter_eventlogmessage_api_key_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventlogmessage',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='llmlogmessage',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0006_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventlogmessage',
+            index=models.Index(fields=['timestamp', 'id'], name='eventlog_timestamp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='llmlogmessage',
+            index=models.Index(fields=['timestamp', 'id'], name='llmlog_timestamp_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventlogmessage',
+            index=models.Index(fields=['api_key', '-timestamp', '-id'], name='eventlog_key_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventlogmessage',
+            index=models.Index(fields=['api_key', 'level', '-timestamp', '-id'], name='eventlog_key_level_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='llmlogmessage',
+            index=models.Index(fields=['api_key', '-timestamp', '-id'], name='llmlog_key_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='llmlogmessage',
+            index=models.Index(fields=['api_key', 'source', '-timestamp', '-id'], name='llmlog_key_source_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.10 on 2026-10-17 04:10
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def build_counters(apps, schema_editor):
+    LogCounter = apps.get_model('logger', 'LogCounter')
+    EventLogMessage = apps.get_model('logger', 'EventLogMessage')
+    LlmLogMessage = apps.get_model('logger', 'LlmLogMessage')
+
+    counters = [
+        LogCounter(api_key_id=row['api_key'], kind='event', level=row['level'], count=row['count'])
+        for row in EventLogMessage.objects.filter(api_key__isnull=False).order_by()
+        .values('api_key', 'level').annotate(count=Count('id'))
+    ] + [
+        LogCounter(api_key_id=row['api_key'], kind='llm', level='', count=row['count'])
+        for row in LlmLogMessage.objects.filter(api_key__isnull=False).order_by()
+        .values('api_key').annotate(count=Count('id'))
+    ]
+    LogCounter.objects.bulk_create(counters, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0008_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('event', 'Event'), ('llm', 'LLM')], max_length=10)),
+                ('level', models.CharField(blank=True, default='', max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='log_counters', to='logger.apikey')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='logcounter',
+            constraint=models.UniqueConstraint(fields=('api_key', 'kind', 'level'), name='unique_log_counter'),
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.10 on 2026-10-17 04:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0009_logcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('event', 'Event'), ('llm', 'LLM')], max_length=10)),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('dimension', models.CharField(blank=True, default='', help_text='Level for event logs, source for LLM logs', max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='log_rollups', to='logger.apikey')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='logrollup',
+            constraint=models.UniqueConstraint(fields=('api_key', 'kind', 'granularity', 'bucket_start', 'dimension'), name='unique_log_rollup'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.10 on 2026-10-17 05:20
+
+from django.db import migrations
+
+# Log tables and the columns indexed for full-text search
+SEARCHED_TABLES = {
+    'logger_eventlogmessage': ('message',),
+    'logger_llmlogmessage': ('query', 'response'),
+}
+
+
+def sqlite_statements(table, fields):
+    """
+    Contentless FTS5 table with an extra 'k<api_key_id>' token column used to
+    filter by tenant, kept in sync with the log table by triggers
+    """
+    fts_table = f'{table}_fts'
+    columns = ', '.join(fields)
+    new_values = ', '.join(f'new.{field}' for field in fields)
+    old_values = ', '.join(f'old.{field}' for field in fields)
+    update_of = ', '.join(fields + ('api_key_id',))
+    insert = (
+        f"INSERT INTO {fts_table}(rowid, {columns}, api_key) "
+        f"VALUES (new.id, {new_values}, 'k' || new.api_key_id);"
+    )
+    delete = (
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {columns}, api_key) "
+        f"VALUES ('delete', old.id, {old_values}, 'k' || old.api_key_id);"
+    )
+    return [
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5({columns}, api_key, content='')",
+        f"INSERT INTO {fts_table}(rowid, {columns}, api_key) SELECT id, {columns}, 'k' || api_key_id FROM {table}",
+        f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER {table}_fts_update AFTER UPDATE OF {update_of} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+
+def postgres_statements(table, fields):
+    document = " || ' ' || ".join(f"coalesce({field}, '')" for field in fields)
+    return [
+        f"CREATE INDEX {table}_search_idx ON {table} USING GIN (to_tsvector('english', {document}))",
+    ]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, fields in SEARCHED_TABLES.items():
+        if vendor == 'sqlite':
+            statements = sqlite_statements(table, fields)
+        elif vendor == 'postgresql':
+            statements = postgres_statements(table, fields)
+        else:
+            statements = []
+        for statement in statements:
+            schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in SEARCHED_TABLES:
+        if vendor == 'sqlite':
+            for action in ('insert', 'delete', 'update'):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{action}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+        elif vendor == 'postgresql':
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0010_logrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
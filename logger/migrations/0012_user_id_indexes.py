@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-17 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0011_full_text_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventlogmessage',
+            index=models.Index(fields=['api_key', 'user_id', '-timestamp', '-id'], name='eventlog_key_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='llmlogmessage',
+            index=models.Index(fields=['api_key', 'user_id', '-timestamp', '-id'], name='llmlog_key_user_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-17 06:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('logger', '0012_user_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, help_text="Days to keep this key's logs. Empty falls back to the user's retention policy.", null=True),
+        ),
+        migrations.CreateModel(
+            name='RetentionPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('retention_days', models.PositiveIntegerField(help_text='Days to keep logs')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='log_retention_policy', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
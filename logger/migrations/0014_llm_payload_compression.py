@@ -0,0 +1,69 @@
+# Generated by Django 4.2.10 on 2026-10-17 06:40
+
+from django.db import migrations
+import logger.compression
+
+TABLE = 'logger_llmlogmessage'
+FIELDS = ('query', 'response')
+
+
+def trigger_statements(decode):
+    """
+    The SQLite full-text triggers of migration 0011 for the LLM table, with
+    every indexed value passed through decode
+    """
+    fts_table = f'{TABLE}_fts'
+    columns = ', '.join(FIELDS)
+    new_values = ', '.join(decode % f'new.{field}' for field in FIELDS)
+    old_values = ', '.join(decode % f'old.{field}' for field in FIELDS)
+    update_of = ', '.join(FIELDS + ('api_key_id',))
+    insert = (
+        f"INSERT INTO {fts_table}(rowid, {columns}, api_key) "
+        f"VALUES (new.id, {new_values}, 'k' || new.api_key_id);"
+    )
+    delete = (
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {columns}, api_key) "
+        f"VALUES ('delete', old.id, {old_values}, 'k' || old.api_key_id);"
+    )
+    return [
+        f"DROP TRIGGER IF EXISTS {TABLE}_fts_insert",
+        f"DROP TRIGGER IF EXISTS {TABLE}_fts_delete",
+        f"DROP TRIGGER IF EXISTS {TABLE}_fts_update",
+        f"CREATE TRIGGER {TABLE}_fts_insert AFTER INSERT ON {TABLE} BEGIN {insert} END",
+        f"CREATE TRIGGER {TABLE}_fts_delete AFTER DELETE ON {TABLE} BEGIN {delete} END",
+        f"CREATE TRIGGER {TABLE}_fts_update AFTER UPDATE OF {update_of} ON {TABLE} BEGIN {delete} {insert} END",
+    ]
+
+
+def index_decoded_payloads(apps, schema_editor):
+    # Postgres indexes the stored text, so compressed payloads are not searchable there
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in trigger_statements('logger_decode_text(%s)'):
+            schema_editor.execute(statement)
+
+
+def index_stored_payloads(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in trigger_statements('%s'):
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0013_retention'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='llmlogmessage',
+            name='query',
+            field=logger.compression.CompressedTextField(blank=True, help_text='The query that was sent', null=True),
+        ),
+        migrations.AlterField(
+            model_name='llmlogmessage',
+            name='response',
+            field=logger.compression.CompressedTextField(blank=True, help_text='The response that was received', null=True),
+        ),
+        migrations.RunPython(index_decoded_payloads, index_stored_payloads),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-17 07:20
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0014_llm_payload_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='rate_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='Records per second this key may ingest. Empty falls back to LOGGER_RATE_LIMIT.', null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='rate_limit_burst',
+            field=models.PositiveIntegerField(blank=True, help_text='Records this key may send at once above its rate. Empty falls back to LOGGER_RATE_LIMIT_BURST.', null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='daily_quota',
+            field=models.PositiveIntegerField(blank=True, help_text='Records this key may ingest per UTC day. Empty falls back to LOGGER_DAILY_QUOTA.', null=True),
+        ),
+    ]
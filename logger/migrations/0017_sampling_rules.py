@@ -0,0 +1,54 @@
+# Generated by Django 4.2.10 on 2026-10-17 09:05
+
+from importlib import import_module
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+TABLE = 'logger_eventlogmessage'
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite adds the column by rebuilding the table, which drops the
+    # full-text triggers of migration 0011
+    if schema_editor.connection.vendor == 'sqlite':
+        sqlite_statements = import_module('logger.migrations.0011_full_text_search').sqlite_statements
+        for statement in sqlite_statements(TABLE, ('message',))[2:]:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0016_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='keep_errors',
+            field=models.BooleanField(default=True, help_text='Store every error event log, whatever the sampling rules say.'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='eventlogmessage',
+            name='sample_weight',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Logs this one stands for in the counters, after sampling'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='SamplingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(blank=True, default='', help_text='Level matched, empty for any level', max_length=20)),
+                ('user_id', models.CharField(blank=True, default='', help_text='User id matched, empty for any user', max_length=100)),
+                ('sample_rate', models.FloatField(help_text='Fraction of matching logs stored, from 0 (none) to 1 (all)', validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)])),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sampling_rules', to='logger.apikey')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='samplingrule',
+            constraint=models.UniqueConstraint(fields=('api_key', 'level', 'user_id'), name='unique_sampling_rule'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-17 09:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0017_sampling_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LlmUsageSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('source', models.CharField(blank=True, default='', max_length=255)),
+                ('metric', models.CharField(choices=[('prompt_tokens', 'prompt_tokens'), ('completion_tokens', 'completion_tokens'), ('latency_ms', 'latency_ms'), ('cost', 'cost')], max_length=20)),
+                ('bucket', models.IntegerField(help_text='Index of the value range, see logger.analytics.sketch_bucket')),
+                ('count', models.BigIntegerField(default=0)),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='llm_usage_sketches', to='logger.apikey')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LlmUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('source', models.CharField(blank=True, default='', max_length=255)),
+                ('metric', models.CharField(choices=[('prompt_tokens', 'prompt_tokens'), ('completion_tokens', 'completion_tokens'), ('latency_ms', 'latency_ms'), ('cost', 'cost')], max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='llm_usage_rollups', to='logger.apikey')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='llmusagesketch',
+            constraint=models.UniqueConstraint(fields=('api_key', 'bucket_start', 'source', 'metric', 'bucket'), name='unique_llm_usage_sketch'),
+        ),
+        migrations.AddConstraint(
+            model_name='llmusagerollup',
+            constraint=models.UniqueConstraint(fields=('api_key', 'bucket_start', 'source', 'metric'), name='unique_llm_usage_rollup'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.10 on 2026-10-17 10:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0018_llm_usage_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('event', 'Event'), ('llm', 'LLM')], max_length=10)),
+                ('path', models.CharField(help_text='Relative to LOGGER_ARCHIVE_DIR', max_length=255, unique=True)),
+                ('start', models.DateTimeField(help_text='Timestamp of the oldest log')),
+                ('end', models.DateTimeField(help_text='Timestamp of the newest log')),
+                ('first_id', models.BigIntegerField(help_text='Lowest log id')),
+                ('last_id', models.BigIntegerField(help_text='Highest log id')),
+                ('count', models.BigIntegerField()),
+                ('dimension_counts', models.JSONField(default=dict, help_text='Logs counted per level for event logs, per source for LLM logs')),
+                ('blocks', models.JSONField(default=list, help_text='[offset, size, count, first timestamp, first id, last timestamp, last id] per block')),
+                ('size', models.BigIntegerField(help_text='Bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='logger.apikey')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['api_key', 'kind', 'end'], name='archivesegment_key_end_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.10 on 2026-10-17 12:30
+
+from django.db import migrations
+
+TABLE = 'logger_llmlogmessage'
+FIELDS = ('query', 'response')
+
+# Only values starting with the codec marker (ESC) go through logger_decode_text(),
+# so plain payloads can still be written by clients without the function
+DECODE_MARKED = "CASE WHEN substr(%(value)s, 1, 1) = char(27) THEN logger_decode_text(%(value)s) ELSE %(value)s END"
+DECODE_ALL = 'logger_decode_text(%(value)s)'
+
+
+def trigger_statements(decode):
+    """
+    The SQLite full-text triggers of migration 0014 for the LLM table, with
+    every indexed value passed through decode
+    """
+    fts_table = f'{TABLE}_fts'
+    columns = ', '.join(FIELDS)
+    new_values = ', '.join(decode % {'value': f'new.{field}'} for field in FIELDS)
+    old_values = ', '.join(decode % {'value': f'old.{field}'} for field in FIELDS)
+    update_of = ', '.join(FIELDS + ('api_key_id',))
+    insert = (
+        f"INSERT INTO {fts_table}(rowid, {columns}, api_key) "
+        f"VALUES (new.id, {new_values}, 'k' || new.api_key_id);"
+    )
+    delete = (
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {columns}, api_key) "
+        f"VALUES ('delete', old.id, {old_values}, 'k' || old.api_key_id);"
+    )
+    return [
+        f"DROP TRIGGER IF EXISTS {TABLE}_fts_insert",
+        f"DROP TRIGGER IF EXISTS {TABLE}_fts_delete",
+        f"DROP TRIGGER IF EXISTS {TABLE}_fts_update",
+        f"CREATE TRIGGER {TABLE}_fts_insert AFTER INSERT ON {TABLE} BEGIN {insert} END",
+        f"CREATE TRIGGER {TABLE}_fts_delete AFTER DELETE ON {TABLE} BEGIN {delete} END",
+        f"CREATE TRIGGER {TABLE}_fts_update AFTER UPDATE OF {update_of} ON {TABLE} BEGIN {delete} {insert} END",
+    ]
+
+
+def decode_marked_payloads(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in trigger_statements(DECODE_MARKED):
+            schema_editor.execute(statement)
+
+
+def decode_all_payloads(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in trigger_statements(DECODE_ALL):
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0019_archive_segments'),
+    ]
+
+    operations = [
+        migrations.RunPython(decode_marked_payloads, decode_all_payloads),
+    ]
@@ -1,7 +1,17 @@
-from django.db import models
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
 from django.contrib.auth.models import User
 import uuid
 
+from .analytics import METRICS, SKETCHED_METRICS, sketch_bucket, usage_values
+from .compression import CompressedTextField, text_preview
+from .live import log_hub
+
 # Create your models here.
 
 class ApiKey(models.Model):
@@ -10,39 +20,559 @@ class ApiKey(models.Model):
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    retention_days = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Days to keep this key's logs. Empty falls back to the user's retention policy."
+    )
+    rate_limit = models.PositiveIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1)],
+        help_text="Records per second this key may ingest. Empty falls back to LOGGER_RATE_LIMIT."
+    )
+    rate_limit_burst = models.PositiveIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1)],
+        help_text="Records this key may send at once above its rate. Empty falls back to LOGGER_RATE_LIMIT_BURST."
+    )
+    daily_quota = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Records this key may ingest per UTC day. Empty falls back to LOGGER_DAILY_QUOTA."
+    )
+    keep_errors = models.BooleanField(
+        default=True, help_text="Store every error event log, whatever the sampling rules say."
+    )
 
     def __str__(self):
         return f"{self.name} ({self.user.username})"
 
-class EventLogMessage(models.Model):
+class RetentionPolicy(models.Model):
+    """
+    Default log retention for all of a user's API keys
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='log_retention_policy')
+    retention_days = models.PositiveIntegerField(help_text="Days to keep logs")
+
+    def __str__(self):
+        return f"{self.user.username}: {self.retention_days} days"
+
+class SamplingRule(models.Model):
+    """
+    Fraction of an API key's event logs to store, for one level, one user_id
+    or both. The most specific rule matching a log applies: level and user_id,
+    then user_id, then level, then the rule with neither.
+    """
+    api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='sampling_rules')
+    level = models.CharField(max_length=20, blank=True, default='', help_text="Level matched, empty for any level")
+    user_id = models.CharField(max_length=100, blank=True, default='', help_text="User id matched, empty for any user")
+    sample_rate = models.FloatField(
+        validators=[MinValueValidator(0.0), MaxValueValidator(1.0)],
+        help_text="Fraction of matching logs stored, from 0 (none) to 1 (all)"
+    )
+
+    def __str__(self):
+        return f"{self.api_key_id} level={self.level or '*'} user_id={self.user_id or '*'}: {self.sample_rate}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['api_key', 'level', 'user_id'], name='unique_sampling_rule'),
+        ]
+
+class IncrementingManager(models.Manager):
+    """
+    Manager for tables of running counts. Deltas are keyed by tuples of the
+    values of key_fields, and counter rows are created as needed. With more
+    than one of value_fields, each delta is a tuple of their increments.
+
+    Where the database supports INSERT ... ON CONFLICT, all the deltas of a
+    call are applied with one upsert statement per chunk of rows rather than
+    an UPDATE, and maybe an INSERT, per counter row.
+    """
+    key_fields = ()
+    value_fields = ('count',)
+
+    def apply(self, deltas):
+        rows = []
+        for key, delta in deltas.items():
+            values = delta if isinstance(delta, tuple) else (delta,)
+            if any(values) and key[self.key_fields.index('api_key_id')] is not None:
+                rows.append(tuple(key) + values)
+        if not rows:
+            return
+        db = self._db or router.db_for_write(self.model)
+        if connections[db].features.supports_update_conflicts_with_target:
+            self._upsert(connections[db], rows)
+        else:
+            self._update_or_create(rows)
+
+    def _upsert(self, connection, rows):
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        table = quote(opts.db_table)
+        fields = [opts.get_field(name) for name in self.key_fields + self.value_fields]
+        columns = [quote(field.column) for field in fields]
+        keys, values = columns[:len(self.key_fields)], columns[len(self.key_fields):]
+        increments = ', '.join(f'{column} = {table}.{column} + EXCLUDED.{column}' for column in values)
+        placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+        batch_size = connection.ops.bulk_batch_size(fields, rows) or len(rows)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                chunk = rows[start:start + batch_size]
+                sql = (
+                    f'INSERT INTO {table} ({", ".join(columns)}) VALUES {", ".join([placeholders] * len(chunk))} '
+                    f'ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {increments}'
+                )
+                params = [
+                    field.get_db_prep_save(value, connection) for row in chunk for field, value in zip(fields, row)
+                ]
+                cursor.execute(sql, params)
+
+    def _update_or_create(self, rows):
+        for row in rows:
+            lookup = dict(zip(self.key_fields, row))
+            values = row[len(self.key_fields):]
+            counter = self.filter(**lookup)
+            increments = {field: F(field) + value for field, value in zip(self.value_fields, values)}
+            if counter.update(**increments):
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(**dict(zip(self.value_fields, values)), **lookup)
+            except IntegrityError:
+                # Another request created the counter first
+                counter.update(**increments)
+
+class LogCounterManager(IncrementingManager):
+    key_fields = ('api_key_id', 'kind', 'level')
+
+    def record(self, logs, sign=1):
+        """
+        Count (sign=1) or uncount (sign=-1) the given log instances
+        """
+        deltas = Counter()
+        for log in logs:
+            deltas[(log.api_key_id, log.counter_kind, log.counter_level)] += sign * log.counter_weight
+        self.apply(deltas)
+
+class LogCounter(models.Model):
+    """
+    Running number of logs per API key, log kind and level, maintained as logs
+    are written and deleted so that statistics never have to scan the log tables
+    """
+    EVENT = 'event'
+    LLM = 'llm'
+
+    api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='log_counters')
+    kind = models.CharField(max_length=10, choices=[(EVENT, 'Event'), (LLM, 'LLM')])
+    level = models.CharField(max_length=20, blank=True, default='')
+    count = models.BigIntegerField(default=0)
+
+    objects = LogCounterManager()
+
+    def __str__(self):
+        return f"{self.api_key_id} {self.kind} {self.level}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['api_key', 'kind', 'level'], name='unique_log_counter'),
+        ]
+
+class LogRollupManager(IncrementingManager):
+    key_fields = ('api_key_id', 'kind', 'granularity', 'bucket_start', 'dimension')
+
+    def record(self, logs, sign=1):
+        """
+        Add (sign=1) or remove (sign=-1) the given log instances from their buckets
+        """
+        deltas = Counter()
+        for log in logs:
+            dimension = LogRollup.dimension_value(getattr(log, log.rollup_dimension_field))
+            for granularity in LogRollup.GRANULARITIES:
+                bucket_start = LogRollup.truncate(log.timestamp, granularity)
+                deltas[(log.api_key_id, log.counter_kind, granularity, bucket_start, dimension)] += sign * log.counter_weight
+        self.apply(deltas)
+
+class LogRollup(models.Model):
+    """
+    Number of logs per API key in minute, hour and day buckets, split by level
+    for event logs and by source for LLM logs. Maintained as logs are written
+    and deleted so that time series never have to scan the log tables.
+    """
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITIES = (MINUTE, HOUR, DAY)
+    BUCKET_SIZES = {
+        MINUTE: timedelta(minutes=1),
+        HOUR: timedelta(hours=1),
+        DAY: timedelta(days=1),
+    }
+
+    api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='log_rollups')
+    kind = models.CharField(max_length=10, choices=[(LogCounter.EVENT, 'Event'), (LogCounter.LLM, 'LLM')])
+    granularity = models.CharField(max_length=10, choices=[(MINUTE, 'Minute'), (HOUR, 'Hour'), (DAY, 'Day')])
+    bucket_start = models.DateTimeField()
+    dimension = models.CharField(max_length=255, blank=True, default='', help_text="Level for event logs, source for LLM logs")
+    count = models.BigIntegerField(default=0)
+
+    objects = LogRollupManager()
+
+    def __str__(self):
+        return f"{self.api_key_id} {self.kind} {self.granularity} {self.bucket_start} {self.dimension}: {self.count}"
+
+    @classmethod
+    def truncate(cls, timestamp, granularity):
+        timestamp = timestamp.astimezone(dt_timezone.utc).replace(second=0, microsecond=0)
+        if granularity in (cls.HOUR, cls.DAY):
+            timestamp = timestamp.replace(minute=0)
+        if granularity == cls.DAY:
+            timestamp = timestamp.replace(hour=0)
+        return timestamp
+
+    @staticmethod
+    def dimension_value(value):
+        return (value or '')[:255]
+
+    class Meta:
+        constraints = [
+            # Also serves time range reads, which filter on everything but dimension
+            models.UniqueConstraint(
+                fields=['api_key', 'kind', 'granularity', 'bucket_start', 'dimension'],
+                name='unique_log_rollup'
+            ),
+        ]
+
+class LlmUsageManager(IncrementingManager):
+    key_fields = ('api_key_id', 'bucket_start', 'source', 'metric')
+    value_fields = ('count', 'total')
+
+    def record(self, rows, sign=1):
+        self.apply(self.deltas(rows, sign))
+
+    def deltas(self, rows, sign=1):
+        """
+        (count, total) per rollup of the usage metadata of LLM logs, given as
+        (api_key_id, source, timestamp, metadata) rows, to add (sign=1) or
+        remove (sign=-1)
+        """
+        deltas = {}
+        for api_key_id, source, timestamp, metadata in rows:
+            for metric, value in usage_values(metadata):
+                key = (api_key_id, LogRollup.truncate(timestamp, LogRollup.HOUR), LogRollup.dimension_value(source), metric)
+                count, total = deltas.get(key, (0, 0))
+                deltas[key] = (count + sign, total + sign * value)
+        return deltas
+
+class LlmUsageRollup(models.Model):
+    """
+    Number and sum of the values of a usage metric (tokens, latency, cost)
+    found in the metadata of LLM logs, per API key, hour and source
+    """
+    METRIC_CHOICES = [(metric, metric) for metric in METRICS]
+
+    api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='llm_usage_rollups')
+    bucket_start = models.DateTimeField()
+    source = models.CharField(max_length=255, blank=True, default='')
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    count = models.BigIntegerField(default=0)
+    total = models.FloatField(default=0)
+
+    objects = LlmUsageManager()
+
+    def __str__(self):
+        return f"{self.api_key_id} {self.bucket_start} {self.source} {self.metric}: {self.total}/{self.count}"
+
+    class Meta:
+        constraints = [
+            # Also serves time range reads
+            models.UniqueConstraint(
+                fields=['api_key', 'bucket_start', 'source', 'metric'], name='unique_llm_usage_rollup'
+            ),
+        ]
+
+class LlmUsageSketchManager(IncrementingManager):
+    key_fields = ('api_key_id', 'bucket_start', 'source', 'metric', 'bucket')
+
+    def record(self, rows, sign=1):
+        self.apply(self.deltas(rows, sign))
+
+    def deltas(self, rows, sign=1):
+        """
+        Bucket counts of the sketched usage metrics of LLM logs, given as
+        (api_key_id, source, timestamp, metadata) rows, to add (sign=1) or
+        remove (sign=-1)
+        """
+        deltas = Counter()
+        for api_key_id, source, timestamp, metadata in rows:
+            for metric, value in usage_values(metadata):
+                if metric in SKETCHED_METRICS:
+                    hour = LogRollup.truncate(timestamp, LogRollup.HOUR)
+                    deltas[(api_key_id, hour, LogRollup.dimension_value(source), metric, sketch_bucket(value))] += sign
+        return deltas
+
+class LlmUsageSketch(models.Model):
+    """
+    Log-scale histogram of a usage metric per API key, hour and source, one
+    row per non-empty bucket. Sketches merge by adding up bucket counts, so
+    percentiles over any range of hours, keys and sources need no raw rows.
+    """
+    api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='llm_usage_sketches')
+    bucket_start = models.DateTimeField()
+    source = models.CharField(max_length=255, blank=True, default='')
+    metric = models.CharField(max_length=20, choices=LlmUsageRollup.METRIC_CHOICES)
+    bucket = models.IntegerField(help_text="Index of the value range, see logger.analytics.sketch_bucket")
+    count = models.BigIntegerField(default=0)
+
+    objects = LlmUsageSketchManager()
+
+    def __str__(self):
+        return f"{self.api_key_id} {self.bucket_start} {self.source} {self.metric} [{self.bucket}]: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['api_key', 'bucket_start', 'source', 'metric', 'bucket'], name='unique_llm_usage_sketch'
+            ),
+        ]
+
+class IdempotencyKey(models.Model):
+    """
+    An idempotency key that was ingested, per API key and log kind. Kept for
+    LOGGER_IDEMPOTENCY_WINDOW hours, during which a log sent again with the
+    same key is recognised as a duplicate and not stored.
+    """
+    api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='idempotency_keys')
+    kind = models.CharField(max_length=10, choices=[(LogCounter.EVENT, 'Event'), (LogCounter.LLM, 'LLM')])
+    key = models.CharField(max_length=255)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.api_key_id} {self.kind} {self.key}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['api_key', 'kind', 'key'], name='unique_idempotency_key'),
+        ]
+
+class ArchiveSegment(models.Model):
+    """
+    An immutable file of one API key's logs of one kind and UTC day, moved out
+    of the database by the archive_logs command. The row is the segment's
+    index: its time and id range, the logs per level (event logs) or source
+    (LLM logs), and the offset, size and first and last (timestamp, id) of
+    each gzip block, so readers can seek to the logs they need.
+    """
+    api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='archive_segments')
+    kind = models.CharField(max_length=10, choices=[(LogCounter.EVENT, 'Event'), (LogCounter.LLM, 'LLM')])
+    path = models.CharField(max_length=255, unique=True, help_text="Relative to LOGGER_ARCHIVE_DIR")
+    start = models.DateTimeField(help_text="Timestamp of the oldest log")
+    end = models.DateTimeField(help_text="Timestamp of the newest log")
+    first_id = models.BigIntegerField(help_text="Lowest log id")
+    last_id = models.BigIntegerField(help_text="Highest log id")
+    count = models.BigIntegerField()
+    dimension_counts = models.JSONField(default=dict, help_text="Logs counted per level for event logs, per source for LLM logs")
+    blocks = models.JSONField(default=list, help_text="[offset, size, count, first timestamp, first id, last timestamp, last id] per block")
+    size = models.BigIntegerField(help_text="Bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.path}: {self.count} logs"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['api_key', 'kind', 'end'], name='archivesegment_key_end_idx'),
+        ]
+
+def record_logs(logs, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) logs from the counters and rollups
+    """
+    LogCounter.objects.record(logs, sign)
+    LogRollup.objects.record(logs, sign)
+    usage = [log.usage_row for log in logs if log.tracks_usage]
+    if usage:
+        record_usage(usage, sign)
+
+def record_usage(rows, sign=1):
+    LlmUsageRollup.objects.record(rows, sign)
+    LlmUsageSketch.objects.record(rows, sign)
+
+def publish_logs(logs, using='default'):
+    """
+    Wake this worker's live streams for the API keys of newly created logs,
+    once they are committed
+    """
+    kinds = {}
+    for log in logs:
+        kinds.setdefault(log.counter_kind, set()).add(log.api_key_id)
+    for kind, api_key_ids in kinds.items():
+        transaction.on_commit(lambda kind=kind, api_key_ids=api_key_ids: log_hub.notify(kind, api_key_ids), using=using)
+
+class LogMessageQuerySet(models.QuerySet):
+    """
+    Keeps LogCounter and LogRollup in step with bulk inserts and queryset deletes
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            record_logs(objs)
+        publish_logs(objs, self.db)
+        return objs
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            counter_deltas = self.counter_deltas(sign=-1)
+            rollup_deltas = self.rollup_deltas(sign=-1)
+            usage = self.usage_rows() if self.model.tracks_usage else []
+            result = super().delete()
+            LogCounter.objects.apply(counter_deltas)
+            LogRollup.objects.apply(rollup_deltas)
+            if usage:
+                record_usage(usage, sign=-1)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def counter_deltas(self, sign=1):
+        level_field = self.model.counter_level_field
+        group_by = ['api_key', level_field] if level_field else ['api_key']
+        deltas = Counter()
+        for row in self.order_by().values(*group_by).annotate(count=self.weight()):
+            level = row[level_field] if level_field else ''
+            deltas[(row['api_key'], self.model.counter_kind, level)] += sign * row['count']
+        return deltas
+
+    def delete_archived(self):
+        """
+        Delete logs that were moved to archive segments. They still exist, so
+        they stay in the counters, rollups and usage analytics.
+        """
+        return super().delete()
+
+    delete_archived.alters_data = True
+    delete_archived.queryset_only = True
+
+    def usage_rows(self):
+        # Only logs whose metadata has a usage metric in it
+        rows = self.order_by().exclude(metadata={}).values_list('api_key', 'source', 'timestamp', 'metadata')
+        return [row for row in rows if usage_values(row[3])]
+
+    def weight(self):
+        # Logs kept by sampling count for the ones dropped with them
+        weight_field = self.model.weight_field
+        return Sum(weight_field) if weight_field else Count('id')
+
+    def rollup_deltas(self, sign=1):
+        field = self.model.rollup_dimension_field
+        rows = (
+            self.order_by()
+            .values('api_key', field, minute=TruncMinute('timestamp', tzinfo=dt_timezone.utc))
+            .annotate(count=self.weight())
+        )
+        deltas = Counter()
+        for row in rows:
+            dimension = LogRollup.dimension_value(row[field])
+            for granularity in LogRollup.GRANULARITIES:
+                bucket_start = LogRollup.truncate(row['minute'], granularity)
+                deltas[(row['api_key'], self.model.counter_kind, granularity, bucket_start, dimension)] += sign * row['count']
+        return deltas
+
+class CountedLogMixin:
+    """
+    Uncounts a single log when it is deleted; creations are counted by the
+    post_save signal and bulk operations by LogMessageQuerySet
+    """
+    counter_kind = None
+    counter_level_field = None
+    rollup_dimension_field = None
+    weight_field = None
+    tracks_usage = False
+
+    @property
+    def counter_level(self):
+        return getattr(self, self.counter_level_field) if self.counter_level_field else ''
+
+    @property
+    def counter_weight(self):
+        return getattr(self, self.weight_field) if self.weight_field else 1
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            record_logs([self], sign=-1)
+        return result
+
+class EventLogMessage(CountedLogMixin, models.Model):
     api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='event_log_messages')
     user_id = models.CharField(max_length=100, help_text="The user id of the user who made the request")
     message = models.TextField(help_text="The log message")
     level = models.CharField(max_length=20, default='info', 
                             choices=[('info', 'Info'), ('warning', 'Warning'), 
                                     ('error', 'Error'), ('debug', 'Debug')])
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     metadata = models.JSONField(default=dict, blank=True)
+    sample_weight = models.PositiveIntegerField(
+        default=1, editable=False, help_text="Logs this one stands for in the counters, after sampling"
+    )
+
+    objects = LogMessageQuerySet.as_manager()
+
+    counter_kind = LogCounter.EVENT
+    counter_level_field = 'level'
+    rollup_dimension_field = 'level'
+    weight_field = 'sample_weight'
+    full_text_fields = ('message',)
 
     def __str__(self):
         return f"{self.level}: {self.message[:50]}..."
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='eventlog_timestamp_id_idx'),
+            models.Index(fields=['api_key', '-timestamp', '-id'], name='eventlog_key_ts_idx'),
+            models.Index(fields=['api_key', 'level', '-timestamp', '-id'], name='eventlog_key_level_ts_idx'),
+            models.Index(fields=['api_key', 'user_id', '-timestamp', '-id'], name='eventlog_key_user_ts_idx'),
+        ]
 
 
-class LlmLogMessage(models.Model):
+class LlmLogMessage(CountedLogMixin, models.Model):
     api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='llm_log_messages')
     user_id = models.CharField(max_length=100, help_text="The user id of the user who made the request")
     source = models.TextField(help_text="The which model or service the log message is from")
-    query = models.TextField(blank=True, null=True, help_text="The query that was sent")
-    response = models.TextField(blank=True, null=True, help_text="The response that was received")
-    timestamp = models.DateTimeField(auto_now_add=True)
+    query = CompressedTextField(blank=True, null=True, help_text="The query that was sent")
+    response = CompressedTextField(blank=True, null=True, help_text="The response that was received")
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     metadata = models.JSONField(default=dict, blank=True)
 
+    objects = LogMessageQuerySet.as_manager()
+
+    counter_kind = LogCounter.LLM
+    rollup_dimension_field = 'source'
+    tracks_usage = True
+    full_text_fields = ('query', 'response')
+
     def __str__(self):
-        return f"{self.source}: {self.query[:50]}..."
+        return f"{self.source}: {self.payload_preview('query', 50)}..."
+
+    @property
+    def usage_row(self):
+        return (self.api_key_id, self.source, self.timestamp, self.metadata)
+
+    def payload_preview(self, field_name, length):
+        """
+        First length characters of query or response, decompressing no more
+        of a compressed payload than needed
+        """
+        if field_name in self.__dict__:
+            return text_preview(self.__dict__[field_name], length)
+        return text_preview(getattr(self, field_name), length)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='llmlog_timestamp_id_idx'),
+            models.Index(fields=['api_key', '-timestamp', '-id'], name='llmlog_key_ts_idx'),
+            models.Index(fields=['api_key', 'source', '-timestamp', '-id'], name='llmlog_key_source_ts_idx'),
+            models.Index(fields=['api_key', 'user_id', '-timestamp', '-id'], name='llmlog_key_user_ts_idx'),
+        ]
 
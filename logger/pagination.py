@@ -0,0 +1,186 @@
+import base64
+import heapq
+from collections import OrderedDict
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .search import search_ids
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over (timestamp, id), newest first. The cursor is an
+    opaque token holding the position of the last row of the previous page, so
+    every page is an index seek no matter how deep the client has paged.
+
+    Views may set keyset_partition_field and implement
+    get_keyset_partition_values() (e.g. the user's API key ids). Each partition
+    is then seeked separately on its (partition, timestamp, id) index and the
+    pages are merged, which avoids sorting rows from several partitions.
+
+    Views implementing get_archived_logs(before) continue the listing into
+    the archive once the database has no older rows left.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('-timestamp', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        pages = []
+        for partition in self.get_partitions(queryset, view):
+            partition = partition.order_by(*self.ordering)
+            if position is not None:
+                timestamp, pk = position
+                partition = partition.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+            pages.append(list(partition[:self.page_size + 1]))
+
+        if len(pages) == 1:
+            results = pages[0]
+        else:
+            merged = heapq.merge(*pages, key=lambda obj: (obj.timestamp, obj.pk), reverse=True)
+            results = [obj for _, obj in zip(range(self.page_size + 1), merged)]
+
+        get_archived_logs = getattr(view, 'get_archived_logs', None)
+        if len(results) <= self.page_size and get_archived_logs is not None:
+            # The database ran out; archived logs are older than all of it
+            before = (results[-1].timestamp, results[-1].pk) if results else position
+            results += islice(get_archived_logs(before), self.page_size + 1 - len(results))
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_partitions(self, queryset, view):
+        field = getattr(view, 'keyset_partition_field', None)
+        if field is None:
+            return [queryset]
+        values = view.get_keyset_partition_values()
+        if len(values) > getattr(settings, 'LOGGER_KEYSET_MAX_PARTITIONS', 50):
+            return [queryset]
+        return [queryset.filter(**{field: value}) for value in values]
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        default_page_size = getattr(settings, 'LOGGER_PAGE_SIZE', 100)
+        max_page_size = getattr(settings, 'LOGGER_MAX_PAGE_SIZE', 1000)
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return default_page_size
+        if page_size <= 0:
+            return default_page_size
+        return min(page_size, max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last.timestamp, last.pk))
+
+    def encode_cursor(self, timestamp, pk):
+        position = f'{timestamp.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            position = base64.urlsafe_b64decode((encoded + padding).encode('ascii')).decode('ascii')
+            timestamp, pk = position.split('|')
+            timestamp = parse_datetime(timestamp)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk
+
+
+class SearchPagination(KeysetPagination):
+    """
+    Pages full-text search results in relevance order. Ranks are only
+    comparable within one query, so the cursor holds an offset into the ranking
+    and paging stops after LOGGER_SEARCH_MAX_RESULTS ranked logs.
+
+    The index only knows the API keys, so the view's other filters are applied
+    to each ranked batch; batches are fetched, growing each time, until the
+    page is full, and the next page starts after the last log returned.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.offset = self.decode_offset(request)
+        max_results = getattr(settings, 'LOGGER_SEARCH_MAX_RESULTS', 1000)
+        api_key_ids = view.get_keyset_partition_values()
+
+        found = []  # (position in the ranking, log)
+        position = self.offset
+        batch_size = self.page_size + 1
+        while len(found) <= self.page_size and position < max_results:
+            limit = min(batch_size, max_results - position)
+            ranked = search_ids(queryset.model, view.search_query, api_key_ids,
+                                limit=limit, offset=position, using=queryset.db)
+            objects = queryset.in_bulk([pk for pk, _ in ranked])
+            found += [(position + index, objects[pk]) for index, (pk, _) in enumerate(ranked) if pk in objects]
+            position += len(ranked)
+            if len(ranked) < limit:
+                break
+            batch_size *= 2
+
+        self.has_next = len(found) > self.page_size
+        found = found[:self.page_size]
+        self.next_offset = found[-1][0] + 1 if found else position
+        self.page = [obj for _, obj in found]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_offset(self.next_offset))
+
+    def encode_offset(self, offset):
+        return base64.urlsafe_b64encode(f'o|{offset}'.encode('ascii')).decode('ascii').rstrip('=')
+
+    def decode_offset(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return 0
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            marker, offset = base64.urlsafe_b64decode((encoded + padding).encode('ascii')).decode('ascii').split('|')
+            offset = int(offset)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if marker != 'o' or offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
@@ -0,0 +1,309 @@
+import codecs
+import io
+import json
+import re
+import zlib
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError, UnsupportedMediaType
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.json import strict_constant
+
+READ_CHUNK_SIZE = 64 * 1024
+WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+STRING_BODY_RE = re.compile(r'(?:[^"\\]+|\\.)*', re.DOTALL)
+BRACKET_RE = re.compile(r'[\[\]{}]')
+SCALAR_END_RE = re.compile(r'[ \t\n\r,\]}]')
+
+
+class RequestEntityTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body is too large.'
+    default_code = 'request_entity_too_large'
+
+
+class GzipRequestStream(io.RawIOBase):
+    """
+    Reads a gzip-compressed request body as its decompressed bytes, a chunk at
+    a time. Stops with 413 once more than max_size bytes have come out, so a
+    small body cannot expand into an unbounded amount of memory.
+    """
+
+    def __init__(self, stream, max_size):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+        self.decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if not self.pending:
+                if self.decompressor.eof and self.decompressor.unused_data:
+                    # Concatenated gzip members
+                    self.pending = self.decompressor.unused_data
+                    self.decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+                elif self.decompressor.eof:
+                    return 0
+                else:
+                    self.pending = self.stream.read(READ_CHUNK_SIZE)
+                    if not self.pending:
+                        raise ParseError('Gzip parse error - the body ends before the compressed data')
+            try:
+                data = self.decompressor.decompress(self.pending, len(buffer))
+            except zlib.error as exc:
+                raise ParseError(f'Gzip parse error - {exc}')
+            self.pending = self.decompressor.unconsumed_tail
+            if data:
+                self.size += len(data)
+                if self.size > self.max_size:
+                    raise RequestEntityTooLarge(
+                        f'Request body is larger than {self.max_size} bytes once decompressed'
+                    )
+                buffer[:len(data)] = data
+                return len(data)
+
+
+class LimitedRequestStream(io.RawIOBase):
+    """
+    Reads a plain request body, stopping with 413 once more than max_size
+    bytes have been read
+    """
+
+    def __init__(self, stream, max_size):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise RequestEntityTooLarge(f'Request body is larger than {self.max_size} bytes')
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def decode_content_encoding(stream, parser_context):
+    """
+    Undo the request's Content-Encoding (gzip or identity) while it is read.
+    Either way the body may not exceed LOGGER_MAX_DECOMPRESSED_BODY_SIZE.
+    """
+    request = parser_context.get('request')
+    content_encoding = request.META.get('HTTP_CONTENT_ENCODING', '') if request is not None else ''
+    content_encoding = content_encoding.strip().lower()
+    max_size = getattr(settings, 'LOGGER_MAX_DECOMPRESSED_BODY_SIZE', 50 * 1024 * 1024)
+    if content_encoding in ('', 'identity'):
+        if stream is None:
+            return None
+        return io.BufferedReader(LimitedRequestStream(stream, max_size), READ_CHUNK_SIZE)
+    if content_encoding in ('gzip', 'x-gzip'):
+        return io.BufferedReader(GzipRequestStream(stream, max_size), READ_CHUNK_SIZE)
+    raise UnsupportedMediaType(
+        content_encoding, detail=f'Unsupported Content-Encoding "{content_encoding}" in request.'
+    )
+
+
+def max_record_size():
+    return getattr(settings, 'LOGGER_MAX_RECORD_SIZE', 10 * 1024 * 1024)
+
+
+class JSONArrayReader:
+    """
+    Incremental reader over a JSON document that decodes the elements of a
+    top-level array one at a time, holding at most a read chunk and the
+    element being decoded in memory.
+
+    The end of each element is found first by tracking bracket and string
+    depth over the chunks as they arrive, then the element is decoded once,
+    so a large element costs linear time. Elements longer than
+    max_record_size characters are rejected with 413.
+    """
+
+    def __init__(self, stream, encoding, strict=True, max_record_size=None):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.json_decoder = json.JSONDecoder(parse_constant=strict_constant if strict else None)
+        self.max_record_size = max_record_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+        # Progress of find_end() through the element at self.position
+        self.scan = None
+        self.depth = 0
+        self.in_string = False
+
+    def fill(self):
+        # Reads grow with the pending element, so a large one is copied a
+        # logarithmic rather than linear number of times
+        size = max(READ_CHUNK_SIZE, len(self.buffer) - self.position)
+        data = self.stream.read(size) if self.stream is not None else b''
+        if not data:
+            self.eof = True
+        self.buffer = self.buffer[self.position:] + self.decoder.decode(data, final=self.eof)
+        if self.scan is not None:
+            self.scan -= self.position
+        self.position = 0
+
+    def peek(self):
+        """
+        Skip whitespace and return the next character, or '' at the end
+        """
+        while True:
+            self.position = WHITESPACE_RE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or self.eof:
+                return self.buffer[self.position:self.position + 1]
+            self.fill()
+
+    def find_end(self):
+        """
+        Index just past the element starting at self.position, or None if the
+        buffer ends before it does. Resumes where the previous call stopped.
+        """
+        buffer = self.buffer
+        if self.scan is None:
+            first = buffer[self.position:self.position + 1]
+            if first == '"':
+                self.scan, self.depth, self.in_string = self.position + 1, 0, True
+            elif first in ('[', '{'):
+                self.scan, self.depth, self.in_string = self.position + 1, 1, False
+            else:
+                self.scan, self.depth, self.in_string = self.position, None, False
+        index = self.scan
+        if self.depth is None:
+            # A number or a literal ends at a delimiter
+            match = SCALAR_END_RE.search(buffer, index)
+            if match is not None:
+                self.scan = None
+                return match.start()
+            self.scan = len(buffer)
+            return len(buffer) if self.eof else None
+        while True:
+            if self.in_string:
+                index = STRING_BODY_RE.match(buffer, index).end()
+                if index == len(buffer) or buffer[index] == '\\':
+                    # The string, or an escape in it, continues in the next chunk
+                    break
+                index += 1
+                self.in_string = False
+                if self.depth == 0:
+                    self.scan = None
+                    return index
+                continue
+            # Brackets up to the next string are counted in bulk, unless one of
+            # them may close the element
+            quote = buffer.find('"', index)
+            stop = len(buffer) if quote < 0 else quote
+            closes = buffer.count(']', index, stop) + buffer.count('}', index, stop)
+            if self.depth > closes:
+                self.depth += buffer.count('[', index, stop) + buffer.count('{', index, stop) - closes
+            else:
+                for match in BRACKET_RE.finditer(buffer, index, stop):
+                    self.depth += 1 if match.group() in '[{' else -1
+                    if self.depth == 0:
+                        self.scan = None
+                        return match.end()
+            if quote < 0:
+                index = stop
+                break
+            index = quote + 1
+            self.in_string = True
+        self.scan = index
+        return len(buffer) if self.eof else None
+
+    def decode_value(self):
+        self.peek()
+        while True:
+            end = self.find_end()
+            if end is not None:
+                break
+            if self.max_record_size is not None and len(self.buffer) - self.position > self.max_record_size:
+                raise RequestEntityTooLarge(f'A record is larger than {self.max_record_size} characters')
+            self.fill()
+        if self.max_record_size is not None and end - self.position > self.max_record_size:
+            raise RequestEntityTooLarge(f'A record is larger than {self.max_record_size} characters')
+        self.scan = None
+        try:
+            value, end = self.json_decoder.raw_decode(self.buffer, self.position)
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+        self.position = end
+        return value
+
+    def read_document(self):
+        value = self.decode_value()
+        if self.peek():
+            raise ParseError('JSON parse error - Extra data after the document')
+        return value
+
+    def iter_array(self):
+        self.position += 1  # The opening bracket
+        if self.peek() == ']':
+            self.position += 1
+        else:
+            while True:
+                yield self.decode_value()
+                char = self.peek()
+                self.position += 1
+                if char == ']':
+                    break
+                if char != ',':
+                    raise ParseError("JSON parse error - Expecting ',' or ']' between array elements")
+        if self.peek():
+            raise ParseError('JSON parse error - Extra data after the array')
+
+
+class StreamingJSONParser(JSONParser):
+    """
+    JSON parser for the ingestion endpoints. A top-level array is returned as
+    an iterator decoding one record at a time as the view consumes it, rather
+    than a list of the whole body; any other document is parsed as usual.
+    Gzip-encoded bodies are decompressed on the fly.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        reader = JSONArrayReader(
+            decode_content_encoding(stream, parser_context), encoding, self.strict, max_record_size()
+        )
+        if reader.peek() == '[':
+            return reader.iter_array()
+        return reader.read_document()
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON (one record per line) into an iterator of
+    records, decoded line by line as the view consumes it. Blank lines are
+    ignored and gzip-encoded bodies are decompressed on the fly; lines longer
+    than LOGGER_MAX_RECORD_SIZE bytes are rejected with 413.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if stream is None:
+            return iter(())
+        return self.iter_records(decode_content_encoding(stream, parser_context), encoding)
+
+    def iter_records(self, stream, encoding):
+        limit = max_record_size()
+        for line_number, line in enumerate(iter(lambda: stream.readline(limit + 1), b''), start=1):
+            if len(line) > limit and not line.endswith(b'\n'):
+                raise RequestEntityTooLarge(f'NDJSON line {line_number} is larger than {limit} bytes')
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {line_number} - {exc}')
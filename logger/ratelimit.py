@@ -0,0 +1,240 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import Throttled
+
+from .apikeys import record_key_uuid, resolver
+
+RATE = 'rate'
+QUOTA = 'quota'
+
+# What one request costs an API key: count records against its limits
+Charge = namedtuple('Charge', ['api_key_id', 'count', 'rate', 'burst', 'quota'])
+
+
+def utc_day(now):
+    return int(now // 86400)
+
+
+def evaluate(charge, state, now):
+    """
+    Apply a charge to an API key's (tokens, updated, day, used) state, None for
+    a key not seen yet. Returns (new state, wait, reason); the new state is
+    None when the charge is refused, wait being the seconds until it could pass.
+
+    A batch larger than the burst passes once the bucket is full and leaves it
+    in debt, so big batches are slowed down rather than refused forever.
+    """
+    tokens, updated, day, used = state or (None, now, utc_day(now), 0)
+    today = utc_day(now)
+    if day != today:
+        day, used = today, 0
+    if charge.quota is not None and used + charge.count > charge.quota:
+        return None, 86400 - now % 86400, QUOTA
+    if charge.rate is not None:
+        burst = charge.burst or charge.rate
+        tokens = burst if tokens is None else min(burst, tokens + (now - updated) * charge.rate)
+        needed = min(charge.count, burst)
+        if tokens < needed:
+            return None, (needed - tokens) / charge.rate, RATE
+        tokens -= charge.count
+    return (tokens, now, day, used + charge.count), 0, None
+
+
+class MemoryBackend:
+    """
+    Limits kept in this process, so each worker enforces them separately
+    """
+    blocking = False
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, charges, now):
+        """
+        Apply all charges or none of them. Returns (wait, reason), reason being
+        None when the charges were applied.
+        """
+        with self._lock:
+            updates = {}
+            for charge in charges:
+                state, wait, reason = evaluate(charge, self._state.get(charge.api_key_id), now)
+                if state is None:
+                    return wait, reason
+                updates[charge.api_key_id] = state
+            self._state.update(updates)
+        return 0, None
+
+    def usage(self, api_key_ids, now):
+        """
+        Records charged today per API key id
+        """
+        today = utc_day(now)
+        with self._lock:
+            states = {api_key_id: self._state.get(api_key_id) for api_key_id in api_key_ids}
+        return {
+            api_key_id: state[3] if state is not None and state[2] == today else 0
+            for api_key_id, state in states.items()
+        }
+
+
+class SQLiteBackend:
+    """
+    Limits kept in a SQLite file (LOGGER_RATE_LIMIT_SQLITE_PATH), shared by
+    all the worker processes of a host. Each charge is one short write
+    transaction; the file holds counters only, so it is not synced to disk.
+    """
+    blocking = True
+
+    def __init__(self, path=None):
+        self.path = str(path or getattr(settings, 'LOGGER_RATE_LIMIT_SQLITE_PATH', 'ratelimit.sqlite3'))
+        self._local = threading.local()
+
+    def connect(self):
+        # One connection per thread, reopened in forked worker processes
+        pid, connection = getattr(self._local, 'connection', (None, None))
+        if pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit ('
+                'api_key_id INTEGER PRIMARY KEY, tokens REAL, updated REAL NOT NULL, '
+                'day INTEGER NOT NULL, used INTEGER NOT NULL)'
+            )
+            self._local.connection = (os.getpid(), connection)
+        return connection
+
+    def acquire(self, charges, now):
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            states = self.read(connection, [charge.api_key_id for charge in charges])
+            updates = []
+            for charge in charges:
+                state, wait, reason = evaluate(charge, states.get(charge.api_key_id), now)
+                if state is None:
+                    connection.execute('ROLLBACK')
+                    return wait, reason
+                updates.append((charge.api_key_id,) + state)
+            connection.executemany('INSERT OR REPLACE INTO rate_limit VALUES (?, ?, ?, ?, ?)', updates)
+            connection.execute('COMMIT')
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+        return 0, None
+
+    def usage(self, api_key_ids, now):
+        states = self.read(self.connect(), api_key_ids)
+        today = utc_day(now)
+        return {
+            api_key_id: states[api_key_id][3] if api_key_id in states and states[api_key_id][2] == today else 0
+            for api_key_id in api_key_ids
+        }
+
+    def read(self, connection, api_key_ids):
+        if not api_key_ids:
+            return {}
+        placeholders = ', '.join('?' * len(api_key_ids))
+        rows = connection.execute(
+            f'SELECT api_key_id, tokens, updated, day, used FROM rate_limit WHERE api_key_id IN ({placeholders})',
+            list(api_key_ids)
+        )
+        return {row[0]: row[1:] for row in rows}
+
+
+class RateLimiter:
+    """
+    Per API key token bucket and daily quota on ingested records. The limits
+    of an ApiKey fall back to the LOGGER_RATE_LIMIT, LOGGER_RATE_LIMIT_BURST and
+    LOGGER_DAILY_QUOTA settings; keys without any limit are not tracked.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = import_string(
+                getattr(settings, 'LOGGER_RATE_LIMIT_BACKEND', 'logger.ratelimit.MemoryBackend')
+            )()
+        return self._backend
+
+    def limits(self, api_key):
+        """
+        (rate, burst, quota) of an API key, None meaning unlimited
+        """
+        rate = api_key.rate_limit if api_key.rate_limit is not None else getattr(settings, 'LOGGER_RATE_LIMIT', None)
+        burst = (
+            api_key.rate_limit_burst if api_key.rate_limit_burst is not None
+            else getattr(settings, 'LOGGER_RATE_LIMIT_BURST', None)
+        )
+        quota = api_key.daily_quota if api_key.daily_quota is not None else getattr(settings, 'LOGGER_DAILY_QUOTA', None)
+        return rate, burst, quota
+
+    def check(self, counts):
+        """
+        Charge records to API keys ({ApiKey: records}), all or nothing, or
+        raise Throttled (429 with Retry-After)
+        """
+        charges = []
+        for api_key, count in counts.items():
+            rate, burst, quota = self.limits(api_key)
+            if rate is not None or quota is not None:
+                charges.append(Charge(api_key.id, count, rate, burst, quota))
+        if not charges:
+            return
+        wait, reason = self.backend.acquire(charges, time.time())
+        if reason == QUOTA:
+            raise Throttled(math.ceil(wait), detail="Daily quota exceeded for this API key.")
+        if reason == RATE:
+            raise Throttled(math.ceil(wait), detail="Rate limit exceeded for this API key.")
+
+    async def acheck(self, counts):
+        if self.backend.blocking:
+            await sync_to_async(self.check, thread_sensitive=False)(counts)
+        else:
+            self.check(counts)
+
+    def usage(self, api_keys):
+        """
+        Records charged today per API key id
+        """
+        return self.backend.usage([api_key.id for api_key in api_keys], time.time())
+
+
+def count_records(records):
+    """
+    Records per active API key, looked up through the resolver cache. Records
+    without a valid key are left to validation.
+    """
+    counts = Counter()
+    for record in records:
+        key = record_key_uuid(record)
+        api_key = resolver.resolve(key) if key is not None else None
+        if api_key is not None:
+            counts[api_key] += 1
+    return counts
+
+
+async def acount_records(records):
+    counts = Counter()
+    for record in records:
+        key = record_key_uuid(record)
+        api_key = await resolver.aresolve(key) if key is not None else None
+        if api_key is not None:
+            counts[api_key] += 1
+    return counts
+
+
+rate_limiter = RateLimiter()
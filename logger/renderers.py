@@ -0,0 +1,14 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets views answer clients asking for text/event-stream. The event stream
+    itself is a StreamingHttpResponse; this only renders errors, as JSON.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,239 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+
+from .models import EventLogMessage, LlmLogMessage
+
+log = logging.getLogger(__name__)
+
+PIN_KEY = 'logger:read-your-writes:{}'
+
+# The alias that reads of the running view go to, None for the router's default
+_read_alias = ContextVar('logger_read_alias', default=None)
+
+
+def replica_alias():
+    return getattr(settings, 'LOGGER_READ_REPLICA', None)
+
+
+class ReadReplicaRouter:
+    """
+    Sends the reads made inside replica_reads() to the read replica. Every
+    other read, and every write, goes to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'django_cache':
+            # The DatabaseCache table holds read-your-writes pins, which the replica may not have yet
+            return None
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReadPins:
+    """
+    Users who wrote within the last LOGGER_READ_YOUR_WRITES_SECONDS, whose
+    reads stay on the primary so they see their own writes. Pins live in the
+    default cache so that every worker knows them; each worker also remembers
+    the pins it set, which spares a cache write per ingestion request.
+    """
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def window(self):
+        return getattr(settings, 'LOGGER_READ_YOUR_WRITES_SECONDS', 5)
+
+    def pin(self, user_ids):
+        window = self.window()
+        if not window or not user_ids:
+            return
+        now = time.monotonic()
+        with self._lock:
+            # Refreshed once half the window has passed, so a pin never lapses early
+            stale = [user_id for user_id in user_ids if self._local.get(user_id, 0) - now < window / 2]
+            for user_id in stale:
+                self._local[user_id] = now + window
+            if len(self._local) > 10000:
+                self._local = {user_id: expires for user_id, expires in self._local.items() if expires > now}
+        if stale:
+            cache.set_many({PIN_KEY.format(user_id): True for user_id in stale}, timeout=window)
+
+    def is_pinned(self, user_id):
+        if self._local.get(user_id, 0) > time.monotonic():
+            return True
+        return cache.get(PIN_KEY.format(user_id)) is not None
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+
+class ReplicaHealth:
+    """
+    Whether the replica may serve reads: it answers, and its newest log is at
+    most LOGGER_REPLICA_MAX_LAG_SECONDS older than the primary's. Checked at
+    most every LOGGER_REPLICA_CHECK_INTERVAL seconds per worker.
+    """
+
+    def __init__(self):
+        self._checks = {}
+        self._lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, 'LOGGER_REPLICA_CHECK_INTERVAL', 5)
+        checked = self._checks.get(alias)
+        if checked is not None and time.monotonic() - checked[0] < interval:
+            return checked[1]
+        with self._lock:
+            checked = self._checks.get(alias)
+            if checked is not None and time.monotonic() - checked[0] < interval:
+                return checked[1]
+            healthy = self.check(alias)
+            self._checks[alias] = (time.monotonic(), healthy)
+        return healthy
+
+    def check(self, alias):
+        max_lag = getattr(settings, 'LOGGER_REPLICA_MAX_LAG_SECONDS', 10)
+        try:
+            lag = self.lag(alias)
+        except DatabaseError:
+            log.warning("Read replica %r is unreachable, reading from the primary", alias, exc_info=True)
+            return False
+        if lag > max_lag:
+            log.warning("Read replica %r is %.1fs behind, reading from the primary", alias, lag)
+            return False
+        return True
+
+    def lag(self, alias):
+        """
+        Seconds the replica's newest log trails the primary's, by primary key
+        so each side costs an index seek per log table
+        """
+        newest = []
+        for database in (DEFAULT_DB_ALIAS, alias):
+            timestamps = [
+                model.objects.using(database).order_by('-id').values_list('timestamp', flat=True).first()
+                for model in (EventLogMessage, LlmLogMessage)
+            ]
+            timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+            newest.append(max(timestamps) if timestamps else None)
+        primary, replica = newest
+        if primary is None:
+            return 0.0
+        if replica is None:
+            return float('inf')
+        return max((primary - replica).total_seconds(), 0.0)
+
+    def clear(self):
+        with self._lock:
+            self._checks.clear()
+
+
+def read_alias_for(user):
+    """
+    The replica alias when it may serve the user's reads, else None
+    """
+    alias = replica_alias()
+    if alias is None:
+        return None
+    if user is not None and user.is_authenticated and read_pins.is_pinned(user.pk):
+        return None
+    return alias if replica_health.is_healthy(alias) else None
+
+
+@contextmanager
+def replica_reads(user=None):
+    """
+    Route the reads made inside the block to the replica, unless the user
+    has just written or the replica is unhealthy
+    """
+    token = _read_alias.set(read_alias_for(user))
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_view(view):
+    """
+    Function view decorator for replica_reads(); goes below @api_view so that
+    request.user is the authenticated user
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with replica_reads(request.user):
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+class ReplicaReadsMixin:
+    """
+    Serves a viewset's GET actions from the replica through replica_reads(),
+    except for replica_exempt_actions
+    """
+    replica_exempt_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method == 'GET' and self.action not in self.replica_exempt_actions:
+            self._replica_reads = replica_reads(request.user)
+            self._replica_reads.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica = self.__dict__.pop('_replica_reads', None)
+        if replica is not None:
+            replica.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class PinWritesMixin:
+    """
+    Pins the user to the primary after a successful change through the
+    viewset, so that their next reads see it
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400
+                and replica_alias() is not None and request.user.is_authenticated):
+            read_pins.pin([request.user.pk])
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def pin_log_writers(logs):
+    """
+    Pin the owners of the API keys of just written logs to the primary. Only
+    API keys already loaded with the logs are looked at, so this costs no query.
+    """
+    if replica_alias() is None:
+        return
+    user_ids = set()
+    for log_message in logs:
+        descriptor = type(log_message).api_key
+        if descriptor.is_cached(log_message) and log_message.api_key is not None:
+            user_ids.add(log_message.api_key.user_id)
+    read_pins.pin(user_ids)
+
+
+read_pins = ReadPins()
+replica_health = ReplicaHealth()
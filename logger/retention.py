@@ -0,0 +1,103 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import purge_archived_logs
+from .idempotency import expired_keys
+from .models import ApiKey, EventLogMessage, IdempotencyKey, LlmLogMessage, RetentionPolicy
+
+LOG_MODELS = (EventLogMessage, LlmLogMessage)
+
+
+def retention_by_api_key():
+    """
+    Map each API key id to its retention in days: the key's own setting, else
+    its user's RetentionPolicy, else LOGGER_RETENTION_DAYS. Keys that keep
+    their logs forever are left out.
+    """
+    user_policies = dict(RetentionPolicy.objects.values_list('user_id', 'retention_days'))
+    default_days = getattr(settings, 'LOGGER_RETENTION_DAYS', None)
+    retention = {}
+    for api_key_id, user_id, days in ApiKey.objects.values_list('id', 'user_id', 'retention_days'):
+        if days is None:
+            days = user_policies.get(user_id, default_days)
+        if days is not None:
+            retention[api_key_id] = days
+    return retention
+
+
+def purge_expired_logs(model, api_key_id, cutoff, chunk_size=5000, pause=0.0):
+    """
+    Delete an API key's logs older than cutoff in chunks of at most chunk_size
+    rows, oldest first. Each chunk's primary keys are read from the
+    (api_key, timestamp, id) index and deleted in their own short transaction,
+    through the log queryset so counters and rollups are decremented with
+    them. Yields the number of rows deleted per chunk.
+    """
+    expired = model.objects.filter(api_key_id=api_key_id, timestamp__lt=cutoff).order_by('timestamp', 'id')
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        deleted, _ = model.objects.filter(id__in=ids).delete()
+        if not deleted:
+            return
+        yield deleted
+        if pause:
+            time.sleep(pause)
+
+
+def count_expired_logs(model, api_key_id, cutoff):
+    return model.objects.filter(api_key_id=api_key_id, timestamp__lt=cutoff).count()
+
+
+def purge_expired_keys(now, chunk_size=5000, pause=0.0):
+    """
+    Delete idempotency keys older than the deduplication window, in chunks.
+    Yields the number of rows deleted per chunk.
+    """
+    expired = expired_keys(now).order_by('created_at', 'id')
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        deleted, _ = IdempotencyKey.objects.filter(id__in=ids).delete()
+        if not deleted:
+            return
+        yield deleted
+        if pause:
+            time.sleep(pause)
+
+
+def purge_all(chunk_size=5000, pause=0.0, dry_run=False, now=None):
+    """
+    Apply every API key's retention to its logs and archive segments, then
+    drop the idempotency keys that left the deduplication window. Yields
+    (model, api_key_id, rows) after each deleted chunk or segment, or once per
+    key and model with the expired row count when dry_run is set; api_key_id
+    is None for idempotency keys. Segments expire once their newest log has.
+    """
+    now = now or timezone.now()
+    for api_key_id, days in retention_by_api_key().items():
+        cutoff = now - timedelta(days=days)
+        for model in LOG_MODELS:
+            if dry_run:
+                expired = count_expired_logs(model, api_key_id, cutoff)
+                expired += sum(purge_archived_logs(model, api_key_id, cutoff, dry_run=True))
+                if expired:
+                    yield model, api_key_id, expired
+                continue
+            for deleted in purge_expired_logs(model, api_key_id, cutoff, chunk_size, pause):
+                yield model, api_key_id, deleted
+            for deleted in purge_archived_logs(model, api_key_id, cutoff):
+                yield model, api_key_id, deleted
+
+    if dry_run:
+        expired = expired_keys(now).count()
+        if expired:
+            yield IdempotencyKey, None, expired
+        return
+    for deleted in purge_expired_keys(now, chunk_size, pause):
+        yield IdempotencyKey, None, deleted
@@ -0,0 +1,104 @@
+import random
+
+from .apikeys import record_key_uuid, resolver
+
+ERROR_LEVEL = 'error'
+DEFAULT_LEVEL = 'info'  # EventLogMessage.level's default
+_NOT_COMPILED = object()
+
+
+class Sampler:
+    """
+    An API key's SamplingRules compiled into dictionary lookups, so that the
+    decision to keep a raw record needs neither a query nor validation
+    """
+    __slots__ = ('keep_errors', 'by_level_and_user', 'by_user', 'by_level', 'default')
+
+    def __init__(self, rules, keep_errors=True):
+        self.keep_errors = keep_errors
+        self.by_level_and_user = {}
+        self.by_user = {}
+        self.by_level = {}
+        self.default = 1.0
+        for rule in rules:
+            if rule.level and rule.user_id:
+                self.by_level_and_user[(rule.level, rule.user_id)] = rule.sample_rate
+            elif rule.user_id:
+                self.by_user[rule.user_id] = rule.sample_rate
+            elif rule.level:
+                self.by_level[rule.level] = rule.sample_rate
+            else:
+                self.default = rule.sample_rate
+
+    def rate(self, level, user_id):
+        """
+        Fraction of the records with this level and user_id that are kept
+        """
+        if level == ERROR_LEVEL and self.keep_errors:
+            return 1.0
+        rate = self.by_level_and_user.get((level, user_id))
+        if rate is None:
+            rate = self.by_user.get(user_id)
+        if rate is None:
+            rate = self.by_level.get(level, self.default)
+        return rate
+
+    def weight(self, level, user_id):
+        """
+        0 when the record is dropped, otherwise the number of records it
+        stands for: 1 / rate, randomly rounded to an integer so that the
+        counters stay exact on average
+        """
+        rate = self.rate(level, user_id)
+        if rate >= 1:
+            return 1
+        if rate <= 0 or random.random() >= rate:
+            return 0
+        return int(1 / rate + random.random())
+
+
+def sampler_for(api_key):
+    """
+    The compiled Sampler of an API key resolved by the resolver, which loads
+    its rules along with it, or None when it keeps every record. Compiled once
+    per cached ApiKey instance.
+    """
+    sampler = api_key.__dict__.get('_sampler', _NOT_COMPILED)
+    if sampler is _NOT_COMPILED:
+        rules = list(api_key.sampling_rules.all())
+        sampler = Sampler(rules, api_key.keep_errors) if rules else None
+        api_key.__dict__['_sampler'] = sampler
+    return sampler
+
+
+def _weight(api_key, record):
+    if api_key is None:
+        return 1
+    sampler = sampler_for(api_key)
+    if sampler is None:
+        return 1
+    level = record.get('level', DEFAULT_LEVEL)
+    user_id = record.get('user_id')
+    if not isinstance(level, str) or not isinstance(user_id, str):
+        # Invalid, kept so that validation reports it
+        return 1
+    return sampler.weight(level, user_id)
+
+
+def sample_weight(model, record):
+    """
+    Sample a raw record before it is validated: 0 when it is dropped,
+    otherwise the number of records it stands for in the counters. Records
+    of models without a weight field, or without a valid API key, are kept.
+    """
+    if model.weight_field is None or not isinstance(record, dict):
+        return 1
+    key = record_key_uuid(record)
+    return _weight(resolver.resolve(key) if key is not None else None, record)
+
+
+async def asample_weight(model, record):
+    if model.weight_field is None or not isinstance(record, dict):
+        return 1
+    key = record_key_uuid(record)
+    return _weight(await resolver.aresolve(key) if key is not None else None, record)
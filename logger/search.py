@@ -0,0 +1,75 @@
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    return TERM_RE.findall(query)
+
+
+def search_ids(model, query, api_key_ids=None, limit=100, offset=0, using='default'):
+    """
+    Return (id, rank) pairs of the logs matching every term of the query, best
+    match first. Only logs of the given API keys are searched unless
+    api_key_ids is None.
+
+    SQLite reads the FTS5 table kept in sync by triggers and Postgres the GIN
+    index on the logs' tsvector; both are created by migration 0011. API keys
+    are stored in the SQLite index as 'k<id>' tokens so that tenant filtering
+    happens inside the index rather than after it.
+    """
+    terms = search_terms(query)
+    if not terms or (api_key_ids is not None and not api_key_ids):
+        return []
+
+    connection = connections[using]
+    table = model._meta.db_table
+    fields = model.full_text_fields
+
+    if connection.vendor == 'sqlite':
+        fts_table = f'{table}_fts'
+        match = '{%s} : (%s)' % (' '.join(fields), ' '.join('"%s"' % term.replace('"', '""') for term in terms))
+        if api_key_ids is not None:
+            match = 'api_key : (%s) AND %s' % (' OR '.join(f'k{int(pk)}' for pk in api_key_ids), match)
+        # The api_key column only filters, so it does not contribute to the rank
+        weights = ', '.join(['1.0'] * len(fields) + ['0.0'])
+        sql = (
+            f'SELECT rowid, -bm25({fts_table}, {weights}) AS rank FROM {fts_table} '
+            f'WHERE {fts_table} MATCH %s ORDER BY rank DESC, rowid DESC LIMIT %s OFFSET %s'
+        )
+        params = [match, limit, offset]
+    elif connection.vendor == 'postgresql':
+        vector = postgres_search_vector(fields)
+        tenant_filter = 'AND api_key_id = ANY(%s)' if api_key_ids is not None else ''
+        sql = (
+            f"SELECT id, ts_rank({vector}, query) AS rank "
+            f"FROM {table}, plainto_tsquery('english', %s) query "
+            f"WHERE {vector} @@ query {tenant_filter} "
+            f"ORDER BY rank DESC, id DESC LIMIT %s OFFSET %s"
+        )
+        params = [' '.join(terms)] + ([list(api_key_ids)] if api_key_ids is not None else []) + [limit, offset]
+    else:
+        # No full-text index on other databases, fall back to substring matching
+        queryset = model.objects.all()
+        if api_key_ids is not None:
+            queryset = queryset.filter(api_key__in=api_key_ids)
+        for term in terms:
+            term_filter = Q()
+            for field in fields:
+                term_filter |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(term_filter)
+        ids = queryset.order_by('-timestamp', '-id').values_list('id', flat=True)[offset:offset + limit]
+        return [(pk, 0.0) for pk in ids]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(pk, rank) for pk, rank in cursor.fetchall()]
+
+
+def postgres_search_vector(fields):
+    # Must match the expression of the GIN indexes created by migration 0011
+    document = " || ' ' || ".join(f"coalesce({field}, '')" for field in fields)
+    return f"to_tsvector('english', {document})"
@@ -1,61 +1,136 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import ApiKey, EventLogMessage, LlmLogMessage
+from django.db import transaction
+from .apikeys import resolver
+from .metrics import serialization_timer
+from .models import ApiKey, EventLogMessage, LlmLogMessage, SamplingRule
+from .validation import INVALID_API_KEY
+
+def get_active_api_key(value):
+    """
+    Resolve an API key UUID to an active ApiKey through the shared resolver cache
+    """
+    api_key = resolver.resolve(value)
+    if api_key is None:
+        raise serializers.ValidationError(INVALID_API_KEY)
+    return api_key
+
+class TimedListSerializer(serializers.ListSerializer):
+    """
+    Counts the serialization of a list towards the request's serialize timing
+    """
+
+    def to_representation(self, data):
+        with serialization_timer():
+            return super().to_representation(data)
+
+class SamplingRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SamplingRule
+        fields = ['level', 'user_id', 'sample_rate']
 
 class ApiKeySerializer(serializers.ModelSerializer):
+    sampling_rules = SamplingRuleSerializer(many=True, required=False)
+
     class Meta:
         model = ApiKey
-        fields = ['id', 'key', 'name', 'created_at', 'is_active']
+        list_serializer_class = TimedListSerializer
+        fields = [
+            'id', 'key', 'name', 'created_at', 'is_active', 'retention_days', 'rate_limit', 'rate_limit_burst',
+            'daily_quota', 'keep_errors', 'sampling_rules',
+        ]
         read_only_fields = ['id', 'key', 'created_at']
 
+    def validate_sampling_rules(self, value):
+        matches = [(rule.get('level', ''), rule.get('user_id', '')) for rule in value]
+        if len(set(matches)) != len(matches):
+            raise serializers.ValidationError("Only one rule may match a given level and user_id")
+        return value
+
+    def create(self, validated_data):
+        rules = validated_data.pop('sampling_rules', [])
+        with transaction.atomic():
+            api_key = super().create(validated_data)
+            SamplingRule.objects.bulk_create([SamplingRule(api_key=api_key, **rule) for rule in rules])
+        return api_key
+
+    def update(self, instance, validated_data):
+        """
+        Sent sampling rules replace all of the key's rules. The key is saved
+        last so that its cached copies, rules included, are invalidated.
+        """
+        rules = validated_data.pop('sampling_rules', None)
+        with transaction.atomic():
+            if rules is not None:
+                instance.sampling_rules.all().delete()
+                SamplingRule.objects.bulk_create([SamplingRule(api_key=instance, **rule) for rule in rules])
+            return super().update(instance, validated_data)
+
 # Event Log Serializers
 class EventLogMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = EventLogMessage
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'user_id', 'message', 'level', 'timestamp', 'metadata']
         read_only_fields = ['id', 'timestamp']
 
 class EventLogMessageCreateSerializer(serializers.ModelSerializer):
     api_key = serializers.UUIDField(write_only=True)
+    metadata = serializers.DictField(required=False)
+    idempotency_key = serializers.CharField(max_length=255, required=False, write_only=True)
     
     class Meta:
         model = EventLogMessage
-        fields = ['api_key', 'user_id', 'message', 'level', 'metadata']
+        fields = ['api_key', 'user_id', 'message', 'level', 'metadata', 'idempotency_key']
     
     def validate_api_key(self, value):
-        try:
-            api_key = ApiKey.objects.get(key=value, is_active=True)
-            return api_key
-        except ApiKey.DoesNotExist:
-            raise serializers.ValidationError("Invalid or inactive API key")
+        return get_active_api_key(value)
     
     def create(self, validated_data):
         api_key = validated_data.pop('api_key')
-        log_message = EventLogMessage.objects.create(api_key=api_key, **validated_data)
+        validated_data.pop('idempotency_key', None)
+        with transaction.atomic():
+            log_message = EventLogMessage.objects.create(api_key=api_key, **validated_data)
         return log_message
 
 # LLM Log Serializers
+class LlmPayloadField(serializers.CharField):
+    """
+    Query or response text, cut to the view's preview length when it asks for
+    one. Previews of compressed payloads only decompress their beginning.
+    """
+
+    def get_attribute(self, instance):
+        length = self.context.get('preview')
+        if length is None:
+            return super().get_attribute(instance)
+        return instance.payload_preview(self.source, length)
+
 class LlmLogMessageSerializer(serializers.ModelSerializer):
+    query = LlmPayloadField(allow_null=True, required=False, allow_blank=True)
+    response = LlmPayloadField(allow_null=True, required=False, allow_blank=True)
+
     class Meta:
         model = LlmLogMessage
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'user_id', 'source', 'query', 'response', 'timestamp', 'metadata']
         read_only_fields = ['id', 'timestamp']
 
 class LlmLogMessageCreateSerializer(serializers.ModelSerializer):
     api_key = serializers.UUIDField(write_only=True)
+    metadata = serializers.DictField(required=False)
+    idempotency_key = serializers.CharField(max_length=255, required=False, write_only=True)
     
     class Meta:
         model = LlmLogMessage
-        fields = ['api_key', 'user_id', 'source', 'query', 'response', 'metadata']
+        fields = ['api_key', 'user_id', 'source', 'query', 'response', 'metadata', 'idempotency_key']
     
     def validate_api_key(self, value):
-        try:
-            api_key = ApiKey.objects.get(key=value, is_active=True)
-            return api_key
-        except ApiKey.DoesNotExist:
-            raise serializers.ValidationError("Invalid or inactive API key")
+        return get_active_api_key(value)
     
     def create(self, validated_data):
         api_key = validated_data.pop('api_key')
-        log_message = LlmLogMessage.objects.create(api_key=api_key, **validated_data)
+        validated_data.pop('idempotency_key', None)
+        with transaction.atomic():
+            log_message = LlmLogMessage.objects.create(api_key=api_key, **validated_data)
         return log_message 
\ No newline at end of file
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .apikeys import resolver
+from .archive import remove_segment_file
+from .compression import decode_text
+from .metrics import record_query
+from .models import ApiKey, ArchiveSegment, EventLogMessage, LlmLogMessage, SamplingRule, publish_logs, record_logs
+
+
+@receiver(post_save, sender=ApiKey)
+@receiver(post_delete, sender=ApiKey)
+def invalidate_api_key_cache(sender, instance, **kwargs):
+    resolver.invalidate(instance.key)
+
+
+@receiver(post_save, sender=SamplingRule)
+@receiver(post_delete, sender=SamplingRule)
+def invalidate_sampling_rules(sender, instance, **kwargs):
+    # Compiled rules are cached along with their API key
+    key = ApiKey.objects.filter(pk=instance.api_key_id).values_list('key', flat=True).first()
+    if key is not None:
+        resolver.invalidate(key)
+
+
+@receiver(post_save, sender=EventLogMessage)
+@receiver(post_save, sender=LlmLogMessage)
+def record_created_log(sender, instance, created, using, **kwargs):
+    if created:
+        record_logs([instance])
+        publish_logs([instance], using)
+
+
+@receiver(post_delete, sender=ArchiveSegment)
+def remove_archived_file(sender, instance, using, **kwargs):
+    # Only once the row is gone for good, so a rollback leaves the file in place
+    transaction.on_commit(lambda: remove_segment_file(instance.path), using=using)
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    # The full-text triggers index LLM payloads through logger_decode_text()
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('logger_decode_text', 1, decode_text, deterministic=True)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    # Straight on the driver connection, so the pragmas stay out of query logs and metrics
+    if connection.vendor == 'sqlite':
+        for name, value in getattr(settings, 'LOGGER_SQLITE_PRAGMAS', {}).items():
+            connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    # Connection objects are reused across reconnects, so only install once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
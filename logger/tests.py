@@ -1,3 +1,1871 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import re
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, models as db_models
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import archive
+from .analytics import percentiles, sketch_bucket
+from .archive import archive_logs, iter_segment
+from .apikeys import ApiKeyResolver, resolver
+from .buffer import BufferFull, IngestionBuffer
+from .idempotency import idempotency_cache
+from .live import LogHub, LogStream
+from .metrics import RequestStats, request_metrics
+from .parsers import StreamingJSONParser
+from .models import (
+    ApiKey, ArchiveSegment, EventLogMessage, IdempotencyKey, LlmLogMessage, LlmUsageRollup, LlmUsageSketch, LogCounter, LogRollup,
+    RetentionPolicy, SamplingRule,
+)
+from .replicas import ReplicaHealth, read_pins, replica_health
+from .ratelimit import MemoryBackend, RateLimiter, SQLiteBackend
+from .retention import purge_all, retention_by_api_key
+from .sampling import Sampler
+from .signals import register_sqlite_functions
+from .serializers import EventLogMessageCreateSerializer, EventLogMessageSerializer, LlmLogMessageCreateSerializer
+from .validation import RecordValidator, validate_record
+from .views import _insert_logs
+from .writer import LogWriter, begin_immediate
+
+
+class LoggerTestCase(APITestCase):
+    def setUp(self):
+        resolver.evict()
+        self.user = User.objects.create_user(username='alice', password='password123')
+        self.api_key = ApiKey.objects.create(user=self.user, name='Default')
+
+    def event_payload(self, **overrides):
+        payload = {
+            'api_key': str(self.api_key.key),
+            'user_id': 'user123',
+            'message': 'Button clicked',
+            'level': 'info',
+            'metadata': {'page': 'checkout'},
+        }
+        payload.update(overrides)
+        return payload
+
+    def llm_payload(self, **overrides):
+        payload = {
+            'api_key': str(self.api_key.key),
+            'user_id': 'user123',
+            'source': 'gpt-4',
+            'query': 'What is the capital of France?',
+            'response': 'Paris.',
+            'metadata': {'tokens': 15},
+        }
+        payload.update(overrides)
+        return payload
+
+
+class BatchIngestionTests(LoggerTestCase):
+    def test_event_batch_json_array(self):
+        records = [self.event_payload(message=f'event {i}') for i in range(5)]
+        response = self.client.post(reverse('create_event_log_batch'), records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(EventLogMessage.objects.count(), 5)
+
+    def test_event_batch_checks_api_key_once(self):
+        records = [self.event_payload(message=f'event {i}') for i in range(20)]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('create_event_log_batch'), records, format='json')
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(len([sql for sql in statements if 'FROM "logger_apikey"' in sql]), 1)
+        self.assertEqual(len([sql for sql in statements if sql.startswith('INSERT INTO "logger_eventlogmessage"')]), 1)
+
+    def test_llm_batch_ndjson(self):
+        body = '\n'.join(json.dumps(self.llm_payload(query=f'q{i}')) for i in range(3)) + '\n'
+        response = self.client.post(
+            reverse('create_llm_log_batch'), body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(LlmLogMessage.objects.count(), 3)
+
+    def test_batch_reports_per_record_errors(self):
+        records = [self.event_payload(), self.event_payload(level='fatal'), 'not a record']
+        response = self.client.post(reverse('create_event_log_batch'), records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('level', response.data['errors'][0]['errors'])
+
+    def test_batch_rejects_non_list_body(self):
+        response = self.client.post(reverse('create_event_log_batch'), self.event_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ApiKeyResolverTests(LoggerTestCase):
+    def api_key_selects(self, queries):
+        return [query for query in queries.captured_queries if 'FROM "logger_apikey"' in query['sql']]
+
+    def test_repeat_ingestion_makes_no_key_queries(self):
+        self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.api_key_selects(queries), [])
+
+    def test_invalid_key_is_negatively_cached(self):
+        payload = self.event_payload(api_key='00000000-0000-0000-0000-000000000000')
+        self.client.post(reverse('create_event_log'), payload, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('create_event_log'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.api_key_selects(queries), [])
+
+    def test_deactivated_key_is_rejected(self):
+        self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.client.force_authenticate(self.user)
+        self.client.patch(reverse('api-key-detail', args=[self.api_key.pk]), {'is_active': False}, format='json')
+        self.client.force_authenticate(None)
+        response = self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('api_key', response.data)
+
+    def test_deleted_key_is_rejected(self):
+        self.client.post(reverse('create_llm_log'), self.llm_payload(), format='json')
+        self.client.force_authenticate(self.user)
+        self.client.delete(reverse('api-key-detail', args=[self.api_key.pk]))
+        self.client.force_authenticate(None)
+        response = self.client.post(reverse('create_llm_log'), self.llm_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_version_bump_from_another_worker_evicts_entries(self):
+        local_resolver = ApiKeyResolver(version_check_interval=0)
+        self.assertEqual(local_resolver.resolve(self.api_key.key), self.api_key)
+        ApiKey.objects.filter(pk=self.api_key.pk).update(is_active=False)
+        # Another worker saving the key bumps the shared version counter
+        resolver.invalidate(self.api_key.key)
+        self.assertIsNone(local_resolver.resolve(self.api_key.key))
+
+    def test_deactivation_reaches_a_resolver_sharing_only_the_cache_backend(self):
+        # Two workers' resolvers, each with its own connection to the cache
+        # backend, which is therefore one every process can see
+        self.assertNotIsInstance(caches['default'], LocMemCache)
+        this_worker = ApiKeyResolver(version_check_interval=0)
+        other_worker = ApiKeyResolver(version_check_interval=0)
+        other_cache = caches.create_connection('default')
+        with mock.patch('logger.apikeys.cache', other_cache):
+            self.assertEqual(other_worker.resolve(self.api_key.key), self.api_key)
+        ApiKey.objects.filter(pk=self.api_key.pk).update(is_active=False)
+        this_worker.invalidate(self.api_key.key)
+        with mock.patch('logger.apikeys.cache', other_cache):
+            self.assertIsNone(other_worker.resolve(self.api_key.key))
+
+
+@override_settings(LOGGER_INGESTION_MODE='buffered')
+class BufferedIngestionTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buffer = IngestionBuffer(max_size=2, flush_size=10, backpressure=IngestionBuffer.REJECT, autostart=False)
+        patcher = mock.patch('logger.views.ingestion_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_accepts_then_flushes(self):
+        response = self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        response = self.client.post(reverse('create_llm_log'), self.llm_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(EventLogMessage.objects.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(EventLogMessage.objects.count(), 1)
+        self.assertEqual(LlmLogMessage.objects.count(), 1)
+        self.assertEqual(self.buffer.get_stats()['flushed'], 2)
+
+    def test_full_buffer_rejects_with_503(self):
+        for _ in range(2):
+            self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        response = self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.buffer.get_stats()['rejected'], 1)
+
+    def test_invalid_record_is_not_buffered(self):
+        response = self.client.post(reverse('create_event_log'), self.event_payload(level='fatal'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.buffer.get_stats()['pending'], 0)
+
+
+class IngestionBufferTests(LoggerTestCase):
+    def make_log(self, message):
+        return EventLogMessage(api_key=self.api_key, user_id='user123', message=message)
+
+    def test_drop_oldest_policy(self):
+        buffer = IngestionBuffer(max_size=2, backpressure=IngestionBuffer.DROP_OLDEST, autostart=False)
+        for message in ('first', 'second', 'third'):
+            buffer.put(self.make_log(message))
+        buffer.flush()
+        self.assertEqual(
+            sorted(EventLogMessage.objects.values_list('message', flat=True)), ['second', 'third']
+        )
+        self.assertEqual(buffer.get_stats()['dropped'], 1)
+
+    def test_block_policy_times_out(self):
+        buffer = IngestionBuffer(max_size=1, backpressure=IngestionBuffer.BLOCK, block_timeout=0.01, autostart=False)
+        buffer.put(self.make_log('first'))
+        with self.assertRaises(BufferFull):
+            buffer.put(self.make_log('second'))
+
+    def test_failed_flush_only_drops_the_bad_record(self):
+        buffer = IngestionBuffer(autostart=False)
+        buffer.put(self.make_log('first'))
+        buffer.put(EventLogMessage(api_key=self.api_key, user_id=None, message='bad'))
+        buffer.put(LlmLogMessage(api_key=self.api_key, user_id='user123', source='gpt-4', query='q', response='r'))
+        buffer.put(self.make_log('second'))
+        with self.assertLogs('logger.buffer', 'WARNING'):
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(sorted(EventLogMessage.objects.values_list('message', flat=True)), ['first', 'second'])
+        self.assertEqual(LlmLogMessage.objects.count(), 1)
+        stats = buffer.get_stats()
+        self.assertEqual((stats['flushed'], stats['failed'], stats['pending']), (3, 1, 0))
+        self.assertEqual(LogCounter.objects.get(api_key=self.api_key, kind='event', level='info').count, 2)
+
+    def test_transient_flush_error_requeues_records(self):
+        buffer = IngestionBuffer(autostart=False)
+        for message in ('first', 'second'):
+            buffer.put(self.make_log(message))
+        locked = OperationalError('database is locked')
+        with mock.patch.object(EventLogMessage.objects, 'bulk_create', side_effect=locked), \
+                self.assertLogs('logger.buffer', 'WARNING'):
+            self.assertEqual(buffer.flush(), 0)
+        stats = buffer.get_stats()
+        self.assertEqual((stats['retried'], stats['failed'], stats['pending']), (2, 0, 2))
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(list(EventLogMessage.objects.order_by('id').values_list('message', flat=True)), ['first', 'second'])
+
+    def test_buffered_timestamp_is_receive_time(self):
+        buffer = IngestionBuffer(autostart=False)
+        log = self.make_log('first')
+        received_at = log.timestamp
+        buffer.put(log)
+        buffer.flush()
+        self.assertEqual(EventLogMessage.objects.get().timestamp, received_at)
+
+
+class KeysetPaginationTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        # Several rows share a timestamp to exercise the id tie-breaker
+        EventLogMessage.objects.bulk_create([
+            EventLogMessage(api_key=self.api_key, user_id='user123', message=f'event {i}', timestamp=now)
+            for i in range(5)
+        ] + [
+            EventLogMessage(api_key=self.api_key, user_id='user123', message=f'older {i}',
+                            timestamp=now - timezone.timedelta(minutes=i + 1))
+            for i in range(5)
+        ])
+        self.client.force_authenticate(self.user)
+
+    def test_walks_every_row_once(self):
+        seen = []
+        url = reverse('event-log-list') + '?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        expected = list(EventLogMessage.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    @override_settings(LOGGER_MAX_PAGE_SIZE=4)
+    def test_page_size_is_capped(self):
+        response = self.client.get(reverse('event-log-list') + '?page_size=500')
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('event-log-list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deep_page_costs_the_same_queries(self):
+        first = self.client.get(reverse('event-log-list') + '?page_size=2')
+        with CaptureQueriesContext(connection) as first_queries:
+            self.client.get(reverse('event-log-list') + '?page_size=2')
+        with CaptureQueriesContext(connection) as next_queries:
+            self.client.get(first.data['next'])
+        self.assertEqual(len(first_queries), len(next_queries))
+        self.assertNotIn('OFFSET', next_queries.captured_queries[-1]['sql'])
+
+
+class QueryPlanTests(LoggerTestCase):
+    """
+    Runs EXPLAIN on every query the log views issue and fails when one of them
+    falls back to scanning a whole table or sorting rows in a temporary structure.
+    """
+
+    def setUp(self):
+        super().setUp()
+        other_key = ApiKey.objects.create(user=self.user, name='Second')
+        other_user = User.objects.create_user(username='bob', password='password123')
+        for api_key in (self.api_key, other_key, ApiKey.objects.create(user=other_user, name='Bob')):
+            for level in ('info', 'error'):
+                EventLogMessage.objects.create(api_key=api_key, user_id='user123', message='event', level=level)
+            LlmLogMessage.objects.create(api_key=api_key, user_id='user123', source='gpt-4', query='q')
+        self.client.force_authenticate(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                return [row[-1] for row in cursor.fetchall()]
+            # Make the planner prefer any index over a scan or sort, so that a
+            # remaining Seq Scan or Sort node means no suitable index exists
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('EXPLAIN ' + sql)
+            return [row[0] for row in cursor.fetchall()]
+
+    def assertPlansUseIndexes(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for query in queries.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            for line in self.explain(query['sql']):
+                if connection.vendor == 'sqlite':
+                    self.assertIsNone(re.match(r'SCAN (?!CONSTANT ROW)', line), f"{line}\n{query['sql']}")
+                    self.assertNotIn('TEMP B-TREE', line, query['sql'])
+                else:
+                    self.assertNotIn('Seq Scan on logger_', line, query['sql'])
+                    self.assertIsNone(re.search(r'\bSort\s+\(cost', line), query['sql'])
+        return response
+
+    def test_event_log_list(self):
+        response = self.assertPlansUseIndexes(reverse('event-log-list') + '?page_size=1')
+        self.assertPlansUseIndexes(response.data['next'])
+
+    def test_llm_log_list(self):
+        response = self.assertPlansUseIndexes(reverse('llm-log-list') + '?page_size=1')
+        self.assertPlansUseIndexes(response.data['next'])
+
+    def test_log_detail(self):
+        log = EventLogMessage.objects.filter(api_key=self.api_key).first()
+        self.assertPlansUseIndexes(reverse('event-log-detail', args=[log.pk]))
+
+    def test_user_stats(self):
+        response = self.assertPlansUseIndexes(reverse('user-stats'))
+        self.assertEqual(response.data['total_event_logs'], 4)
+        self.assertEqual(response.data['logs_by_level'], {'info': 2, 'warning': 0, 'error': 2, 'debug': 0})
+
+    def test_timeseries(self):
+        self.assertPlansUseIndexes(reverse('stats-timeseries') + '?bucket=minute&level=info')
+
+    def test_filtered_lists(self):
+        since = (timezone.now() - timezone.timedelta(hours=1)).isoformat().replace('+00:00', 'Z')
+        for query in (
+            'level=error', 'user_id=user123', f'since={since}', f'level=info&since={since}',
+            f'api_key={self.api_key.pk}', f'user_id=user123&metadata.page=checkout&since={since}',
+        ):
+            self.assertPlansUseIndexes(reverse('event-log-list') + '?page_size=1&' + query)
+        self.assertPlansUseIndexes(reverse('llm-log-list') + '?page_size=1&source=gpt-4')
+
+
+class LogCounterTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def stats(self):
+        return self.client.get(reverse('user-stats')).data
+
+    def test_counts_every_ingestion_path(self):
+        self.client.post(reverse('create_event_log'), self.event_payload(level='error'), format='json')
+        self.client.post(reverse('create_llm_log'), self.llm_payload(), format='json')
+        self.client.post(
+            reverse('create_event_log_batch'),
+            [self.event_payload(), self.event_payload(level='debug')], format='json'
+        )
+        buffer = IngestionBuffer(autostart=False)
+        buffer.put(EventLogMessage(api_key=self.api_key, user_id='user123', message='buffered'))
+        buffer.flush()
+
+        stats = self.stats()
+        self.assertEqual(stats['total_event_logs'], 4)
+        self.assertEqual(stats['total_llm_logs'], 1)
+        self.assertEqual(stats['logs_by_level'], {'info': 2, 'warning': 0, 'error': 1, 'debug': 1})
+
+    def test_failed_counter_update_leaves_no_log(self):
+        for name, payload, model in (('create_event_log', self.event_payload(), EventLogMessage),
+                                     ('create_llm_log', self.llm_payload(), LlmLogMessage)):
+            with mock.patch('logger.signals.record_logs', side_effect=OperationalError('database is locked')):
+                with self.assertRaises(OperationalError):
+                    self.client.post(reverse(name), payload, format='json')
+            self.assertFalse(model.objects.exists())
+
+    def test_stats_do_not_touch_log_tables(self):
+        self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        with CaptureQueriesContext(connection) as queries:
+            self.stats()
+        self.assertFalse(any('logger_eventlogmessage' in query['sql'] for query in queries.captured_queries))
+
+    def test_deletes_are_uncounted(self):
+        for level in ('info', 'info', 'error'):
+            EventLogMessage.objects.create(api_key=self.api_key, user_id='user123', message='event', level=level)
+        EventLogMessage.objects.filter(level='info').first().delete()
+        EventLogMessage.objects.filter(level='error').delete()
+        stats = self.stats()
+        self.assertEqual(stats['total_event_logs'], 1)
+        self.assertEqual(stats['logs_by_level']['info'], 1)
+        self.assertEqual(stats['logs_by_level']['error'], 0)
+
+    def test_rebuild_command_fixes_drift(self):
+        for _ in range(3):
+            LlmLogMessage.objects.create(api_key=self.api_key, user_id='user123', source='gpt-4')
+        LogCounter.objects.all().delete()
+        call_command('rebuild_log_counters', stdout=io.StringIO())
+        self.assertEqual(self.stats()['total_llm_logs'], 3)
+
+
+class TimeseriesTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+        for hours_ago, level in ((0, 'info'), (0, 'error'), (1, 'info'), (3, 'info')):
+            EventLogMessage.objects.create(
+                api_key=self.api_key, user_id='user123', message='event', level=level,
+                timestamp=self.now - timezone.timedelta(hours=hours_ago)
+            )
+        LlmLogMessage.objects.bulk_create([
+            LlmLogMessage(api_key=self.api_key, user_id='user123', source='gpt-4', timestamp=self.now),
+            LlmLogMessage(api_key=self.api_key, user_id='user123', source='claude', timestamp=self.now),
+        ])
+        self.client.force_authenticate(self.user)
+
+    def get_series(self, **params):
+        params.setdefault('start', (self.now - timezone.timedelta(hours=4)).isoformat())
+        params.setdefault('end', (self.now + timezone.timedelta(minutes=1)).isoformat())
+        response = self.client.get(reverse('stats-timeseries'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data['series']
+
+    def test_hourly_event_counts(self):
+        series = self.get_series(bucket='hour')
+        self.assertEqual([point['total'] for point in series], [0, 1, 0, 1, 2])
+        self.assertEqual(series[-1]['counts'], {'info': 1, 'error': 1})
+
+    def test_level_and_source_filters(self):
+        self.assertEqual(sum(point['total'] for point in self.get_series(level='info')), 3)
+        series = self.get_series(kind='llm', source='claude', bucket='day')
+        self.assertEqual(sum(point['total'] for point in series), 1)
+
+    def test_reads_rollups_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_series(bucket='minute')
+        self.assertFalse(any('logmessage' in query['sql'] for query in queries.captured_queries))
+
+    def test_too_many_buckets_is_rejected(self):
+        response = self.client.get(reverse('stats-timeseries'), {
+            'bucket': 'minute', 'start': (self.now - timezone.timedelta(days=30)).isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deletes_update_rollups(self):
+        EventLogMessage.objects.filter(level='error').delete()
+        self.assertEqual(self.get_series(bucket='hour')[-1]['counts'], {'info': 1})
+
+    def test_backfill_matches_incremental_rollups(self):
+        expected = sorted(LogRollup.objects.values_list('kind', 'granularity', 'bucket_start', 'dimension', 'count'))
+        LogRollup.objects.all().delete()
+        call_command('backfill_log_rollups', stdout=io.StringIO())
+        rebuilt = sorted(LogRollup.objects.values_list('kind', 'granularity', 'bucket_start', 'dimension', 'count'))
+        self.assertEqual(rebuilt, expected)
+
+
+class ExportTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        second_key = ApiKey.objects.create(user=self.user, name='Second')
+        now = timezone.now()
+        for i in range(6):
+            EventLogMessage.objects.create(
+                api_key=self.api_key if i % 2 else second_key, user_id='user123', message=f'event {i}',
+                level='error' if i == 5 else 'info', timestamp=now - timezone.timedelta(minutes=10 - i)
+            )
+        LlmLogMessage.objects.create(api_key=self.api_key, user_id='user123', source='gpt-4', query='q')
+        other_user = User.objects.create_user(username='bob', password='password123')
+        EventLogMessage.objects.create(api_key=ApiKey.objects.create(user=other_user, name='Bob'), message='secret')
+        self.client.force_authenticate(self.user)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_in_time_order(self):
+        rows = [json.loads(line) for line in self.export('event-log-export').decode().splitlines()]
+        self.assertEqual([row['message'] for row in rows], [f'event {i}' for i in range(6)])
+        self.assertEqual(set(rows[0]), {'id', 'user_id', 'message', 'level', 'timestamp', 'metadata'})
+
+    def test_csv_with_filters(self):
+        body = self.export('event-log-export', output='csv', level='error')
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual([row['message'] for row in rows], ['event 5'])
+
+    def test_gzip(self):
+        body = self.export('llm-log-export', compress='gzip')
+        rows = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual([row['source'] for row in rows], ['gpt-4'])
+
+    def test_rejects_unknown_output(self):
+        response = self.client.get(reverse('event-log-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FullTextSearchTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        for message in (
+            'payment failed for order',
+            'payment failed payment declined payment',
+            'user logged in',
+        ):
+            EventLogMessage.objects.create(api_key=self.api_key, user_id='user123', message=message)
+        LlmLogMessage.objects.create(
+            api_key=self.api_key, user_id='user123', source='gpt-4',
+            query='What is the capital of France?', response='Paris is the capital.'
+        )
+        other_user = User.objects.create_user(username='bob', password='password123')
+        EventLogMessage.objects.create(
+            api_key=ApiKey.objects.create(user=other_user, name='Bob'), user_id='bob', message='payment failed'
+        )
+        self.client.force_authenticate(self.user)
+
+    def search(self, name, query, **params):
+        response = self.client.get(reverse(name), {'q': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_ranked_and_scoped_to_user(self):
+        results = self.search('event-log-list', 'payment failed').data['results']
+        self.assertEqual(
+            [row['message'] for row in results],
+            ['payment failed payment declined payment', 'payment failed for order']
+        )
+
+    def test_searches_llm_query_and_response(self):
+        self.assertEqual(len(self.search('llm-log-list', 'france').data['results']), 1)
+        self.assertEqual(len(self.search('llm-log-list', 'paris capital').data['results']), 1)
+        self.assertEqual(len(self.search('llm-log-list', 'berlin').data['results']), 0)
+
+    def test_index_follows_updates_and_deletes(self):
+        log = EventLogMessage.objects.get(message='user logged in')
+        log.message = 'user logged out'
+        log.save()
+        self.assertEqual(len(self.search('event-log-list', 'out').data['results']), 1)
+        log.delete()
+        self.assertEqual(len(self.search('event-log-list', 'logged').data['results']), 0)
+
+    def test_pages_through_results(self):
+        first = self.search('event-log-list', 'payment', page_size=1)
+        self.assertEqual(len(first.data['results']), 1)
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 1)
+        self.assertIsNone(second.data['next'])
+        self.assertNotEqual(first.data['results'][0]['id'], second.data['results'][0]['id'])
+
+    def test_filtered_pages_are_full(self):
+        for i in range(6):
+            EventLogMessage.objects.create(
+                api_key=self.api_key, user_id='user123', message=f'timeout {i}', level='error' if i % 3 == 0 else 'info'
+            )
+        # Ranked logs the queryset leaves out, as rows deleted after the index was read would be
+        errors_only = mock.patch(
+            'logger.views.EventLogMessageViewSet.get_queryset',
+            lambda view: EventLogMessage.objects.filter(api_key__user=view.request.user, level='error'),
+        )
+        with errors_only:
+            first = self.search('event-log-list', 'timeout', page_size=1)
+            self.assertEqual(len(first.data['results']), 1)
+            second = self.client.get(first.data['next'])
+            self.assertEqual(len(second.data['results']), 1)
+            self.assertIsNone(second.data['next'])
+        messages = {first.data['results'][0]['message'], second.data['results'][0]['message']}
+        self.assertEqual(messages, {'timeout 0', 'timeout 3'})
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('event-log-list', 'payment" (*').data['results'][0]['message'][:7], 'payment')
+
+    def test_admin_search_uses_index(self):
+        admin_user = User.objects.create_superuser(username='admin', password='password123')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:logger_eventlogmessage_changelist'), {'q': 'declined'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class LogFilterTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.second_key = ApiKey.objects.create(user=self.user, name='Second')
+        self.now = timezone.now()
+        EventLogMessage.objects.bulk_create([
+            EventLogMessage(api_key=self.api_key, user_id='alice', message='a', level='info',
+                            metadata={'page': 'checkout', 'attempt': 2}, timestamp=self.now - timezone.timedelta(hours=1)),
+            EventLogMessage(api_key=self.api_key, user_id='bob', message='b', level='error',
+                            metadata={'page': 'home'}, timestamp=self.now - timezone.timedelta(hours=2)),
+            EventLogMessage(api_key=self.second_key, user_id='alice', message='c', level='error',
+                            timestamp=self.now - timezone.timedelta(days=3)),
+        ])
+        LlmLogMessage.objects.create(api_key=self.api_key, user_id='alice', source='gpt-4')
+        LlmLogMessage.objects.create(api_key=self.api_key, user_id='alice', source='claude')
+        self.client.force_authenticate(self.user)
+
+    def messages(self, **params):
+        response = self.client.get(reverse('event-log-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [row['message'] for row in response.data['results']]
+
+    def test_indexed_filters(self):
+        self.assertEqual(self.messages(level='error'), ['b', 'c'])
+        self.assertEqual(self.messages(user_id='alice'), ['a', 'c'])
+        self.assertEqual(self.messages(api_key=self.second_key.pk), ['c'])
+        since = (self.now - timezone.timedelta(days=1)).isoformat()
+        self.assertEqual(self.messages(since=since, level='error'), ['b'])
+        until = (self.now - timezone.timedelta(minutes=90)).isoformat()
+        self.assertEqual(self.messages(until=until), ['b', 'c'])
+
+    def test_llm_source_filter(self):
+        response = self.client.get(reverse('llm-log-list'), {'source': 'claude'})
+        self.assertEqual([row['source'] for row in response.data['results']], ['claude'])
+
+    def test_metadata_filter_within_window(self):
+        since = (self.now - timezone.timedelta(hours=12)).isoformat()
+        self.assertEqual(self.messages(**{'metadata.page': 'checkout', 'since': since}), ['a'])
+        self.assertEqual(self.messages(**{'metadata.attempt': '2', 'since': since}), ['a'])
+
+    def test_unsupported_combinations_are_rejected(self):
+        since = (self.now - timezone.timedelta(days=30)).isoformat()
+        for params in (
+            {'level': 'error', 'user_id': 'alice'},
+            {'metadata.page': 'checkout'},
+            {'metadata.page': 'checkout', 'since': since},
+            {'q': 'payment', 'level': 'error'},
+            {'since': 'yesterday'},
+        ):
+            response = self.client.get(reverse('event-log-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_export_uses_the_same_filters(self):
+        response = self.client.get(reverse('event-log-export'), {'user_id': 'bob'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['message'] for row in rows], ['b'])
+
+
+class RetentionTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.client.force_authenticate(self.user)
+
+    def add_logs(self, api_key, days_old, count=1):
+        EventLogMessage.objects.bulk_create([
+            EventLogMessage(api_key=api_key, user_id='user123', message='event',
+                            timestamp=self.now - timezone.timedelta(days=days_old))
+            for _ in range(count)
+        ])
+
+    def test_retention_precedence(self):
+        bob = User.objects.create_user(username='bob', password='password')
+        bob_key = ApiKey.objects.create(user=bob, name='Bob')
+        own_key = ApiKey.objects.create(user=self.user, name='Own', retention_days=7)
+        self.assertEqual(retention_by_api_key(), {own_key.pk: 7})
+        RetentionPolicy.objects.create(user=self.user, retention_days=30)
+        with override_settings(LOGGER_RETENTION_DAYS=90):
+            self.assertEqual(retention_by_api_key(), {self.api_key.pk: 30, own_key.pk: 7, bob_key.pk: 90})
+
+    def test_purges_in_chunks_and_keeps_counts_consistent(self):
+        self.api_key.retention_days = 10
+        self.api_key.save()
+        self.add_logs(self.api_key, days_old=20, count=5)
+        self.add_logs(self.api_key, days_old=1, count=2)
+        LlmLogMessage.objects.create(api_key=self.api_key, user_id='user123', source='gpt-4')
+
+        chunks = list(purge_all(chunk_size=2, now=self.now))
+        self.assertEqual([rows for _, _, rows in chunks], [2, 2, 1])
+        self.assertEqual(EventLogMessage.objects.count(), 2)
+        self.assertEqual(LlmLogMessage.objects.count(), 1)
+
+        stats = self.client.get(reverse('user-stats')).data
+        self.assertEqual(stats['total_event_logs'], 2)
+        minute_total = sum(LogRollup.objects.filter(
+            kind='event', granularity=LogRollup.MINUTE
+        ).values_list('count', flat=True))
+        self.assertEqual(minute_total, 2)
+
+    def test_dry_run_deletes_nothing(self):
+        RetentionPolicy.objects.create(user=self.user, retention_days=10)
+        self.add_logs(self.api_key, days_old=20, count=3)
+        out = io.StringIO()
+        call_command('purge_logs', '--dry-run', stdout=out)
+        self.assertIn('3 rows have expired', out.getvalue())
+        self.assertEqual(EventLogMessage.objects.count(), 3)
+
+        call_command('purge_logs', '--chunk-size', '2', '--pause', '0', stdout=out)
+        self.assertIn('Deleted 3 rows', out.getvalue())
+        self.assertEqual(EventLogMessage.objects.count(), 0)
+
+    def test_retention_is_editable_on_the_api_key(self):
+        response = self.client.patch(
+            reverse('api-key-detail', args=[self.api_key.pk]), {'retention_days': 14}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['retention_days'], 14)
+
+
+@override_settings(LOGGER_LLM_PAYLOAD_COMPRESSION=True, LOGGER_LLM_PAYLOAD_COMPRESSION_THRESHOLD=200)
+class PayloadCompressionTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.long_query = ' '.join(['Summarise the quarterly revenue report for the board.'] * 40)
+        self.client.force_authenticate(self.user)
+
+    def stored(self, pk, field):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {field} FROM logger_llmlogmessage WHERE id = %s', [pk])
+            return cursor.fetchone()[0]
+
+    def test_large_payloads_are_stored_compressed(self):
+        response = self.client.post(reverse('create_llm_log'), self.llm_payload(query=self.long_query), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        log = LlmLogMessage.objects.get()
+        self.assertTrue(self.stored(log.pk, 'query').startswith('\x1bzlib:'))
+        self.assertLess(len(self.stored(log.pk, 'query')), len(self.long_query))
+        self.assertEqual(self.stored(log.pk, 'response'), 'Paris.')
+        self.assertEqual(log.query, self.long_query)
+
+    def test_values_starting_with_the_marker_round_trip(self):
+        log = LlmLogMessage.objects.create(api_key=self.api_key, user_id='user123', source='gpt-4', query='\x1bzlib:x')
+        log.refresh_from_db()
+        self.assertEqual(log.query, '\x1bzlib:x')
+
+    def test_list_preview_and_export(self):
+        LlmLogMessage.objects.create(api_key=self.api_key, user_id='user123', source='gpt-4', query=self.long_query)
+        results = self.client.get(reverse('llm-log-list')).data['results']
+        self.assertEqual(results[0]['query'], self.long_query)
+        results = self.client.get(reverse('llm-log-list'), {'preview': 20}).data['results']
+        self.assertEqual(results[0]['query'], self.long_query[:20])
+        self.assertEqual(self.client.get(reverse('llm-log-list'), {'preview': 'x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('llm-log-export'))
+        row = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(row['query'], self.long_query)
+
+    def test_compressed_payloads_stay_searchable(self):
+        log = LlmLogMessage.objects.create(api_key=self.api_key, user_id='user123', source='gpt-4', query=self.long_query)
+        results = self.client.get(reverse('llm-log-list'), {'q': 'quarterly revenue'}).data['results']
+        self.assertEqual([row['id'] for row in results], [log.pk])
+        log.delete()
+        results = self.client.get(reverse('llm-log-list'), {'q': 'quarterly revenue'}).data['results']
+        self.assertEqual(results, [])
+
+    def test_plain_payloads_are_indexed_without_the_decode_function(self):
+        # As when writing from the sqlite3 shell, which lacks logger_decode_text()
+        connection.ensure_connection()
+        connection.connection.create_function('logger_decode_text', 1, None)
+        try:
+            log = LlmLogMessage.objects.create(api_key=self.api_key, user_id='user123', source='gpt-4',
+                                               query='Summarise the quarterly revenue')
+        finally:
+            register_sqlite_functions(None, connection)
+        results = self.client.get(reverse('llm-log-list'), {'q': 'quarterly revenue'}).data['results']
+        self.assertEqual([row['id'] for row in results], [log.pk])
+
+    def test_command_compresses_existing_rows(self):
+        with override_settings(LOGGER_LLM_PAYLOAD_COMPRESSION=False):
+            log = LlmLogMessage.objects.create(
+                api_key=self.api_key, user_id='user123', source='gpt-4', query=self.long_query, response='Paris.'
+            )
+        self.assertEqual(self.stored(log.pk, 'query'), self.long_query)
+
+        out = io.StringIO()
+        call_command('compress_llm_payloads', '--dry-run', stdout=out)
+        self.assertIn('Would compress 1 logs', out.getvalue())
+        self.assertEqual(self.stored(log.pk, 'query'), self.long_query)
+
+        call_command('compress_llm_payloads', '--batch-size', '1', stdout=out)
+        self.assertTrue(self.stored(log.pk, 'query').startswith('\x1bzlib:'))
+        log.refresh_from_db()
+        self.assertEqual((log.query, log.response), (self.long_query, 'Paris.'))
+        results = self.client.get(reverse('llm-log-list'), {'q': 'quarterly'}).data['results']
+        self.assertEqual(len(results), 1)
+
+
+class WireFormatTests(LoggerTestCase):
+    def post(self, name, body, content_type='application/json', **extra):
+        if not isinstance(body, bytes):
+            body = body.encode()
+        return self.client.post(reverse(name), body, content_type=content_type, **extra)
+
+    def test_gzip_json_record(self):
+        body = gzip.compress(json.dumps(self.event_payload(message='compressed')).encode())
+        response = self.post('create_event_log', body, HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(EventLogMessage.objects.get().message, 'compressed')
+
+    def test_gzip_ndjson_to_single_record_endpoint(self):
+        body = ''.join(json.dumps(self.llm_payload(query=f'q{i}')) + '\n' for i in range(3))
+        response = self.post(
+            'create_llm_log', gzip.compress(body.encode()), 'application/x-ndjson', HTTP_CONTENT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(sorted(LlmLogMessage.objects.values_list('query', flat=True)), ['q0', 'q1', 'q2'])
+
+    def test_json_array_is_decoded_across_read_chunks(self):
+        records = [self.event_payload(message=f'événement {i}', metadata={'n': 10 ** i}) for i in range(4)]
+        with mock.patch('logger.parsers.READ_CHUNK_SIZE', 7):
+            response = self.post('create_event_log_batch', json.dumps(records, ensure_ascii=False))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        logs = EventLogMessage.objects.order_by('id')
+        self.assertEqual([log.metadata['n'] for log in logs], [1, 10, 100, 1000])
+        self.assertEqual(logs[0].message, 'événement 0')
+
+    def test_malformed_bodies(self):
+        for body in ('[{"a": 1} {"b": 2}]', '[{"a": 1},', '{"a": 1} x'):
+            response = self.post('create_event_log_batch', body)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        response = self.post('create_event_log', b'not gzip', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post('create_event_log', '{}', HTTP_CONTENT_ENCODING='br')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    @override_settings(LOGGER_MAX_DECOMPRESSED_BODY_SIZE=10000)
+    def test_decompression_bomb_is_rejected(self):
+        body = gzip.compress(json.dumps(self.event_payload(message='x' * 1000000)).encode())
+        self.assertLess(len(body), 10000)
+        response = self.post('create_event_log', body, HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(EventLogMessage.objects.count(), 0)
+
+    def test_large_record_is_parsed_in_linear_time(self):
+        record = self.event_payload(metadata={'blob': 'x\\"y' * 1000000, 'items': [[i, {'n': i}] for i in range(50000)]})
+        body = json.dumps([record, record]).encode()
+        self.assertGreater(len(body), 8 * 1024 * 1024)
+        started = time.perf_counter()
+        records = list(StreamingJSONParser().parse(io.BytesIO(body)))
+        self.assertLess(time.perf_counter() - started, 2.0)
+        self.assertEqual(records, [record, record])
+
+    @override_settings(LOGGER_MAX_RECORD_SIZE=1000)
+    def test_oversized_record_is_rejected(self):
+        records = [self.event_payload(), self.event_payload(message='x' * 2000)]
+        response = self.post('create_event_log_batch', json.dumps(records))
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        body = ''.join(json.dumps(record) + '\n' for record in records)
+        response = self.post('create_event_log_batch', body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(EventLogMessage.objects.count(), 0)
+
+    @override_settings(LOGGER_MAX_DECOMPRESSED_BODY_SIZE=10000)
+    def test_oversized_plain_body_is_rejected(self):
+        response = self.post('create_event_log', json.dumps(self.event_payload(message='x' * 20000)))
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(EventLogMessage.objects.count(), 0)
+
+    @override_settings(LOGGER_BATCH_MAX_RECORDS=2)
+    def test_streamed_batch_over_the_limit(self):
+        body = ''.join(json.dumps(self.event_payload()) + '\n' for _ in range(3))
+        response = self.post('create_event_log_batch', body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(EventLogMessage.objects.count(), 0)
+
+
+class ValidationParityTests(LoggerTestCase):
+    def assertMatchesSerializer(self, serializer_class, payload):
+        serializer = serializer_class(data=payload)
+        serializer.is_valid()
+        data, errors = validate_record(RecordValidator(serializer_class), payload)
+        self.assertEqual(json.loads(json.dumps(errors)), json.loads(json.dumps(serializer.errors)), payload)
+        if not errors:
+            self.assertEqual(data, dict(serializer.validated_data), payload)
+
+    def test_event_records(self):
+        inactive = ApiKey.objects.create(user=self.user, name='Inactive', is_active=False)
+        for payload in (
+            self.event_payload(),
+            {'api_key': str(self.api_key.key), 'user_id': 'u', 'message': 'm'},
+            {},
+            self.event_payload(api_key=None, user_id=None, message=None, level=None, metadata=None),
+            self.event_payload(api_key='not-a-uuid'),
+            self.event_payload(api_key=self.api_key.key.int),
+            self.event_payload(api_key=str(uuid.uuid4())),
+            self.event_payload(api_key=str(inactive.key)),
+            self.event_payload(level='fatal'),
+            self.event_payload(level=''),
+            self.event_payload(level=['info']),
+            self.event_payload(level='INFO'),
+            self.event_payload(user_id='x' * 101),
+            self.event_payload(user_id='x' * 100),
+            self.event_payload(user_id=12345),
+            self.event_payload(user_id=1.5),
+            self.event_payload(user_id=True),
+            self.event_payload(user_id='   '),
+            self.event_payload(message='  padded  '),
+            self.event_payload(message='null \x00 byte'),
+            self.event_payload(message='lone \ud800 surrogate'),
+            self.event_payload(message={'text': 'hi'}),
+            self.event_payload(user_id='x\x00' * 60),
+            self.event_payload(metadata=[1, 2]),
+            self.event_payload(metadata='page=checkout'),
+            self.event_payload(metadata={}),
+            self.event_payload(metadata={'nested': {'list': [1, None, 'a']}}),
+            self.event_payload(extra='ignored'),
+        ):
+            self.assertMatchesSerializer(EventLogMessageCreateSerializer, payload)
+
+    def test_llm_records(self):
+        for payload in (
+            self.llm_payload(),
+            self.llm_payload(source=''),
+            self.llm_payload(source=None),
+            self.llm_payload(source='s' * 256),
+            self.llm_payload(query=None, response=None),
+            self.llm_payload(query='', response='  '),
+            self.llm_payload(query=42, response=['a']),
+            self.llm_payload(query='x' * 100000),
+            self.llm_payload(metadata=7),
+            {'api_key': str(self.api_key.key)},
+        ):
+            self.assertMatchesSerializer(LlmLogMessageCreateSerializer, payload)
+
+    def test_metadata_must_be_an_object(self):
+        response = self.client.post(reverse('create_event_log'), self.event_payload(metadata=['a']), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'metadata': ['Expected a dictionary of items but got type "list".']})
+
+    def test_form_posts_use_the_serializer(self):
+        payload = self.event_payload()
+        del payload['metadata']
+        response = self.client.post(reverse('create_event_log'), payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        log = EventLogMessage.objects.get()
+        self.assertEqual((log.user_id, log.metadata), ('user123', {}))
+        payload['level'] = 'fatal'
+        response = self.client.post(reverse('create_event_log'), payload)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('level', response.data)
+
+
+class AsyncIngestionTests(LoggerTestCase):
+    async def post(self, name, body, content_type='application/json', **extra):
+        if not isinstance(body, bytes):
+            body = json.dumps(body) if content_type == 'application/json' else body
+        return await self.async_client.post(reverse(name), body, content_type=content_type, **extra)
+
+    async def test_creates_a_record(self):
+        response = await self.post('create_event_log_async', self.event_payload(message='async'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(response.content), {'status': 'success'})
+        log = await EventLogMessage.objects.aget()
+        self.assertEqual((log.message, log.api_key_id), ('async', self.api_key.pk))
+        counter = await LogCounter.objects.aget(api_key=self.api_key, level='info')
+        self.assertEqual(counter.count, 1)
+
+    async def test_errors_match_the_sync_endpoint(self):
+        for name, payload in (
+            ('event_log', self.event_payload(level='fatal', user_id='x' * 101, message='  ')),
+            ('event_log', {'api_key': 'not-a-uuid', 'metadata': None}),
+            ('event_log', self.event_payload(api_key=str(uuid.uuid4()))),
+            ('llm_log', self.llm_payload(source=None, query=['a'])),
+        ):
+            sync_response = await sync_to_async(self.client.post)(
+                reverse(f'create_{name}'), payload, format='json'
+            )
+            async_response = await self.post(f'create_{name}_async', payload)
+            self.assertEqual(async_response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+
+    async def test_batch_with_non_object_elements_matches_the_sync_endpoint(self):
+        records = [self.event_payload(), 'oops', 3, None, [self.event_payload()]]
+        sync_response = await sync_to_async(self.client.post)(
+            reverse('create_event_log_batch'), records, format='json'
+        )
+        async_response = await self.post('create_event_log_async', records)
+        self.assertEqual(async_response.status_code, status.HTTP_207_MULTI_STATUS)
+        body = json.loads(async_response.content)
+        self.assertEqual(body, json.loads(sync_response.content))
+        self.assertEqual([error['index'] for error in body['errors']], [1, 2, 3, 4])
+        self.assertEqual(await EventLogMessage.objects.acount(), 2)
+
+    async def test_gzip_ndjson_batch(self):
+        body = ''.join(json.dumps(self.llm_payload(query=f'q{i}')) + '\n' for i in range(3))
+        body += json.dumps(self.llm_payload(source='')) + '\n'
+        response = await self.post(
+            'create_llm_log_async', gzip.compress(body.encode()), 'application/x-ndjson',
+            headers={'Content-Encoding': 'gzip'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        body = json.loads(response.content)
+        self.assertEqual(body['created'], 3)
+        self.assertEqual(body['errors'], [{'index': 3, 'errors': {'source': ['This field may not be blank.']}}])
+        self.assertEqual(await LlmLogMessage.objects.acount(), 3)
+
+    async def test_rejects_other_methods_and_bodies(self):
+        response = await self.async_client.get(reverse('create_event_log_async'))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        response = await self.post('create_event_log_async', b'[{"a": 1},')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('detail', json.loads(response.content))
+        response = await self.post('create_event_log_async', b'a=1', 'text/plain')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    @override_settings(LOGGER_INGESTION_MODE='buffered')
+    async def test_buffered_mode(self):
+        buffer = IngestionBuffer(autostart=False)
+        with mock.patch('logger.views.ingestion_buffer', buffer):
+            response = await self.post('create_event_log_async', self.event_payload())
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(await sync_to_async(buffer.flush)(), 1)
+
+    def test_resolver_serves_hits_without_queries(self):
+        aresolve = async_to_sync(ApiKeyResolver(version_check_interval=3600).aresolve)
+        self.assertEqual(aresolve(self.api_key.key), self.api_key)
+        self.assertIsNone(aresolve(uuid.uuid4()))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(aresolve(self.api_key.key), self.api_key)
+        self.assertEqual(len(queries), 0)
+
+
+@override_settings(LOGGER_STREAM_POLL_INTERVAL=0.01, LOGGER_STREAM_MAX_SECONDS=0.2)
+class LiveStreamTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def events(self, chunks):
+        return [
+            json.loads(line[len('data: '):])
+            for chunk in chunks for line in chunk.decode().splitlines() if line.startswith('data: ')
+        ]
+
+    def test_hub_wakes_matching_subscriptions_on_commit(self):
+        hub_patch = mock.patch('logger.models.log_hub', LogHub())
+        hub = hub_patch.start()
+        self.addCleanup(hub_patch.stop)
+        event_subscription = hub.subscribe('event', [self.api_key.pk])
+        llm_subscription = hub.subscribe('llm', [self.api_key.pk])
+        other_subscription = hub.subscribe('event', [self.api_key.pk + 1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            EventLogMessage.objects.bulk_create([EventLogMessage(api_key=self.api_key, user_id='u', message='m')])
+            self.assertFalse(event_subscription.event.is_set())
+        self.assertTrue(event_subscription.event.is_set())
+        self.assertFalse(llm_subscription.event.is_set())
+        self.assertFalse(other_subscription.event.is_set())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LlmLogMessage.objects.create(api_key=self.api_key, user_id='u', source='gpt-4')
+        self.assertTrue(llm_subscription.event.is_set())
+
+    def test_resumes_from_last_event_id_with_filters(self):
+        first = EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message='old error', level='error')
+        EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message='info', level='info')
+        EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message='new error', level='error')
+
+        response = self.client.get(
+            reverse('event-log-stream'), {'level': 'error'},
+            HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID=str(first.pk)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual([event['message'] for event in self.events(response.streaming_content)], ['new error'])
+
+    def test_tails_new_logs_only(self):
+        EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message='before')
+        response = self.client.get(reverse('event-log-stream'), HTTP_ACCEPT='text/event-stream')
+        chunks = iter(response.streaming_content)
+        self.assertTrue(next(chunks).startswith(b'retry: '))
+        EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message='after')
+        self.assertEqual([event['message'] for event in self.events(chunks)], ['after'])
+
+    def test_llm_stream_and_bad_resume_id(self):
+        LlmLogMessage.objects.create(api_key=self.api_key, user_id='u', source='claude')
+        response = self.client.get(reverse('llm-log-stream'), {'source': 'claude', 'last_event_id': '0'})
+        self.assertEqual([event['source'] for event in self.events(response.streaming_content)], ['claude'])
+        response = self.client.get(reverse('llm-log-stream'), HTTP_LAST_EVENT_ID='abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sends_rows_committed_after_higher_ids(self):
+        EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message='before')
+        queryset = EventLogMessage.objects.filter(api_key=self.api_key)
+        log_stream = LogStream(queryset, EventLogMessageSerializer, 'event', [self.api_key.pk], queryset.get().pk)
+        # Log 'late' got its id first but commits after 'early' was sent
+        late = EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message='late')
+        early = EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message='early')
+        with mock.patch.object(log_stream, 'queryset', queryset.exclude(pk=late.pk)):
+            self.assertIn(f'id: {early.pk}\n', log_stream.read()[0])
+        events, _ = log_stream.read()
+        self.assertIn(f'id: {late.pk}\n', events)
+        self.assertNotIn(f'id: {early.pk}\n', events)
+        self.assertEqual(log_stream.read(), ('', False))
+        # Rows older than the lookback are settled and no longer read again
+        log_stream.lookback = 0
+        self.assertEqual(log_stream.read(), ('', False))
+        self.assertEqual((log_stream.last_id, log_stream.recent_ids), (early.pk, set()))
+
+    @override_settings(LOGGER_STREAM_MAX_SYNC_STREAMS=1)
+    def test_wsgi_streams_per_worker_are_limited(self):
+        first = self.client.get(reverse('event-log-stream'), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('event-log-stream'), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '5')
+        first.close()
+        response = self.client.get(reverse('event-log-stream'), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response.close()
+
+    async def test_async_stream_under_asgi(self):
+        log = await LlmLogMessage.objects.acreate(api_key=self.api_key, user_id='u', source='gpt-4')
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        response = await self.async_client.get(
+            reverse('llm-log-stream'), headers={'Authorization': f'Bearer {token}', 'Last-Event-ID': '0'}
+        )
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([event['id'] for event in self.events(chunks)], [log.pk])
+
+
+class RequestMetricsTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        request_metrics.reset()
+
+    def sample(self, metrics_text, name, **labels):
+        label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        match = re.search(rf'^{re.escape(name)}{{{re.escape(label_text)}}} (\S+)$', metrics_text, re.M)
+        return float(match.group(1)) if match else None
+
+    def test_server_timing_header(self):
+        EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message='m')
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('event-log-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries", serialize;dur=[\d.]+$'
+        )
+
+    def test_metrics_per_view(self):
+        self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.client.post(reverse('create_event_log'), self.event_payload(level='fatal'), format='json')
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse('event-log-list'))
+        self.client.get(reverse('user-stats'))
+        self.client.force_authenticate(None)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        ingest = {'view': 'create_event_log', 'method': 'POST'}
+        self.assertEqual(self.sample(text, 'logger_http_requests_total', **ingest, status=201), 1)
+        self.assertEqual(self.sample(text, 'logger_http_requests_total', **ingest, status=400), 1)
+        self.assertEqual(self.sample(text, 'logger_http_request_duration_seconds_count', **ingest), 2)
+        self.assertEqual(self.sample(text, 'logger_http_request_db_queries_bucket', **ingest, le='+Inf'), 2)
+        self.assertGreater(self.sample(text, 'logger_http_request_db_queries_sum', **ingest), 0)
+        self.assertEqual(self.sample(
+            text, 'logger_http_requests_total', view='EventLogMessageViewSet.list', method='GET', status=200
+        ), 1)
+        self.assertEqual(self.sample(
+            text, 'logger_http_requests_total', view='get_user_stats', method='GET', status=200
+        ), 1)
+
+    async def test_async_views_are_timed(self):
+        response = await self.async_client.post(
+            reverse('create_event_log_async'), json.dumps(self.event_payload()), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('app;dur=', response['Server-Timing'])
+        text = request_metrics.render()
+        self.assertEqual(self.sample(
+            text, 'logger_http_requests_total', view='create_event_log_async', method='POST', status=201
+        ), 1)
+        self.assertGreater(self.sample(
+            text, 'logger_http_request_db_queries_sum', view='create_event_log_async', method='POST'
+        ), 0)
+
+    @override_settings(LOGGER_SLOW_REQUEST_THRESHOLD=0, LOGGER_SLOW_REQUEST_SAMPLE_RATE=1)
+    def test_slow_request_log_includes_sql(self):
+        with self.assertLogs('logger.middleware', 'WARNING') as logs:
+            self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.assertIn('create_event_log', logs.output[0])
+        self.assertIn('INSERT INTO "logger_eventlogmessage"', logs.output[0])
+
+    @override_settings(LOGGER_SLOW_REQUEST_THRESHOLD=0, LOGGER_SLOW_REQUEST_SAMPLE_RATE=0)
+    def test_sql_is_only_captured_for_sampled_requests(self):
+        with mock.patch('logger.middleware.RequestStats', wraps=RequestStats) as stats_class, \
+                self.assertNoLogs('logger.middleware', 'WARNING'):
+            self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        stats_class.assert_called_once_with(capture_sql=False)
+
+    def test_streaming_response_is_timed_until_closed(self):
+        for i in range(3):
+            EventLogMessage.objects.create(api_key=self.api_key, user_id='u', message=f'm{i}')
+        self.client.force_authenticate(self.user)
+        with override_settings(LOGGER_EXPORT_CHUNK_SIZE=1):
+            response = self.client.get(reverse('event-log-export'))
+            queries_before_streaming = int(re.search(r'"(\d+) queries"', response['Server-Timing']).group(1))
+            self.assertIsNone(self.sample(
+                request_metrics.render(), 'logger_http_requests_total',
+                view='EventLogMessageViewSet.export', method='GET', status=200,
+            ))
+            self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+        labels = {'view': 'EventLogMessageViewSet.export', 'method': 'GET'}
+        text = request_metrics.render()
+        self.assertEqual(self.sample(text, 'logger_http_requests_total', **labels, status=200), 1)
+        # The queries reading the exported rows run while the response streams
+        self.assertGreater(self.sample(text, 'logger_http_request_db_queries_sum', **labels), queries_before_streaming)
+
+    def test_metrics_require_a_token_or_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.logout()
+        with override_settings(LOGGER_METRICS_TOKEN='secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class RateLimitTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.limiter = RateLimiter(MemoryBackend())
+        patcher = mock.patch('logger.views.rate_limiter', self.limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def limit(self, **limits):
+        ApiKey.objects.filter(pk=self.api_key.pk).update(**limits)
+        resolver.evict()
+
+    def test_token_bucket(self):
+        self.limit(rate_limit=2)
+        statuses = [
+            self.client.post(reverse('create_event_log'), self.event_payload(), format='json').status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(statuses, [201, 201, 429])
+        self.assertEqual(EventLogMessage.objects.count(), 2)
+        with mock.patch('logger.ratelimit.time.time', return_value=time.time() + 1):
+            response = self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_checked_before_validation(self):
+        self.limit(rate_limit=1)
+        self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        with mock.patch('logger.views.validate_record') as validate:
+            response = self.client.post(reverse('create_event_log'), self.event_payload(level='fatal'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+        validate.assert_not_called()
+
+    def test_batch_is_charged_as_a_whole(self):
+        self.limit(rate_limit=1, rate_limit_burst=5)
+        records = [self.event_payload() for _ in range(3)]
+        response = self.client.post(reverse('create_event_log_batch'), records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse('create_event_log_batch'), records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(EventLogMessage.objects.count(), 3)
+        # A batch larger than the burst passes on a full bucket
+        with mock.patch('logger.ratelimit.time.time', return_value=time.time() + 60):
+            response = self.client.post(reverse('create_event_log_batch'), records * 3, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_daily_quota_and_stats(self):
+        self.limit(daily_quota=2)
+        for _ in range(2):
+            self.client.post(reverse('create_llm_log'), self.llm_payload(), format='json')
+        response = self.client.post(reverse('create_llm_log'), self.llm_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Daily quota exceeded', response.data['detail'])
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('user-stats'))
+        self.assertEqual(response.data['quotas'], [{
+            'api_key': self.api_key.id, 'name': 'Default', 'rate_limit': None,
+            'rate_limit_burst': None, 'daily_quota': 2, 'used_today': 2,
+        }])
+
+    @override_settings(LOGGER_RATE_LIMIT=1)
+    async def test_async_endpoint(self):
+        statuses = []
+        for _ in range(2):
+            response = await self.async_client.post(
+                reverse('create_event_log_async'), json.dumps(self.event_payload()), content_type='application/json'
+            )
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [201, 429])
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_sqlite_backend_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/ratelimit.sqlite3'
+            first, second = RateLimiter(SQLiteBackend(path)), RateLimiter(SQLiteBackend(path))
+            self.api_key.rate_limit = 3
+            first.check({self.api_key: 2})
+            with self.assertRaises(Throttled):
+                second.check({self.api_key: 2})
+            second.check({self.api_key: 1})
+            self.assertEqual(first.usage([self.api_key]), {self.api_key.id: 3})
+
+
+class IdempotencyTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        idempotency_cache.clear()
+        self.addCleanup(idempotency_cache.clear)
+
+    def test_header_deduplicates_a_retry(self):
+        for expected in (status.HTTP_201_CREATED, status.HTTP_200_OK):
+            response = self.client.post(
+                reverse('create_event_log'), self.event_payload(), format='json', headers={'Idempotency-Key': 'abc'}
+            )
+            self.assertEqual(response.status_code, expected)
+        self.assertEqual(response.data, {'status': 'duplicate'})
+        self.assertEqual(EventLogMessage.objects.count(), 1)
+        self.assertEqual(LogCounter.objects.get(api_key=self.api_key, level='info').count, 1)
+
+    def test_retry_from_another_worker_is_found_in_the_table(self):
+        payload = self.llm_payload(idempotency_key='request-1')
+        self.client.post(reverse('create_llm_log'), payload, format='json')
+        idempotency_cache.clear()
+        response = self.client.post(reverse('create_llm_log'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(LlmLogMessage.objects.count(), 1)
+        # Keys are scoped to the kind of log
+        payload = self.event_payload(idempotency_key='request-1')
+        response = self.client.post(reverse('create_event_log'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_batch_keys(self):
+        records = [self.event_payload(idempotency_key=f'r{i}') for i in (0, 1, 2, 0)]
+        response = self.client.post(reverse('create_event_log_batch'), records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['duplicates']), (3, 1))
+
+        records.append(self.event_payload(idempotency_key='r3'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('create_event_log_batch'), records, format='json')
+        self.assertEqual((response.data['created'], response.data['duplicates']), (1, 4))
+        self.assertEqual(EventLogMessage.objects.count(), 4)
+        # Keys already seen by this worker are not looked up again
+        lookups = [query['sql'] for query in queries.captured_queries if 'FROM "logger_idempotencykey"' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertNotIn("'r0'", lookups[0])
+
+    def test_header_keys_batch_records_by_index(self):
+        records = [self.event_payload(message=f'event {i}') for i in range(3)]
+        for _ in range(2):
+            response = self.client.post(
+                reverse('create_event_log_batch'), records, format='json', headers={'Idempotency-Key': 'batch-1'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['duplicates']), (0, 3))
+        keys = set(IdempotencyKey.objects.values_list('key', flat=True))
+        self.assertEqual(keys, {'batch-1:0', 'batch-1:1', 'batch-1:2'})
+
+    def test_key_may_be_reused_after_the_window(self):
+        payload = self.event_payload(idempotency_key='request-1')
+        self.client.post(reverse('create_event_log'), payload, format='json')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timezone.timedelta(hours=25))
+        idempotency_cache.clear()
+        for expected in (status.HTTP_201_CREATED, status.HTTP_200_OK):
+            response = self.client.post(reverse('create_event_log'), payload, format='json')
+            self.assertEqual(response.status_code, expected)
+        self.assertEqual(EventLogMessage.objects.count(), 2)
+        key = IdempotencyKey.objects.get()
+        self.assertGreater(key.created_at, timezone.now() - timezone.timedelta(minutes=1))
+
+    def test_rejects_overlong_header(self):
+        response = self.client.post(
+            reverse('create_event_log'), self.event_payload(), format='json', headers={'Idempotency-Key': 'x' * 201}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_async_endpoint(self):
+        statuses = []
+        for _ in range(2):
+            response = await self.async_client.post(
+                reverse('create_event_log_async'), json.dumps(self.event_payload()), content_type='application/json',
+                headers={'Idempotency-Key': 'abc'}
+            )
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [201, 200])
+        self.assertEqual(await EventLogMessage.objects.acount(), 1)
+
+    def test_expired_keys_are_purged(self):
+        self.client.post(reverse('create_event_log'), self.event_payload(idempotency_key='old'), format='json')
+        later = timezone.now() + timezone.timedelta(hours=25)
+        self.assertEqual([(model, rows) for model, _, rows in purge_all(now=later)], [(IdempotencyKey, 1)])
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class SamplingTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def set_rules(self, *rules, **fields):
+        response = self.client.patch(
+            reverse('api-key-detail', args=[self.api_key.pk]), {'sampling_rules': list(rules), **fields}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response
+
+    def counter(self, level):
+        counter = LogCounter.objects.filter(api_key=self.api_key, kind='event', level=level).first()
+        return counter.count if counter else 0
+
+    def test_rule_precedence(self):
+        rules = [
+            SamplingRule(sample_rate=0.5),
+            SamplingRule(level='debug', sample_rate=0.1),
+            SamplingRule(user_id='vip', sample_rate=1.0),
+            SamplingRule(level='debug', user_id='vip', sample_rate=0.2),
+        ]
+        sampler = Sampler(rules)
+        self.assertEqual(sampler.rate('info', 'someone'), 0.5)
+        self.assertEqual(sampler.rate('debug', 'someone'), 0.1)
+        self.assertEqual(sampler.rate('info', 'vip'), 1.0)
+        self.assertEqual(sampler.rate('debug', 'vip'), 0.2)
+        self.assertEqual(sampler.rate('error', 'someone'), 1.0)
+        self.assertEqual(Sampler(rules, keep_errors=False).rate('error', 'someone'), 0.5)
+
+    def test_kept_logs_count_for_the_dropped_ones(self):
+        self.set_rules({'level': 'debug', 'sample_rate': 0.25})
+        with mock.patch('logger.sampling.random.random', return_value=0.1):
+            response = self.client.post(reverse('create_event_log'), self.event_payload(level='debug'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with mock.patch('logger.sampling.random.random', return_value=0.5), \
+                mock.patch('logger.views.validate_record') as validate:
+            response = self.client.post(reverse('create_event_log'), self.event_payload(level='debug'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'status': 'sampled'})
+        validate.assert_not_called()
+        self.client.post(reverse('create_event_log'), self.event_payload(level='info'), format='json')
+
+        self.assertEqual(EventLogMessage.objects.count(), 2)
+        self.assertEqual((self.counter('debug'), self.counter('info')), (4, 1))
+        self.assertEqual(self.client.get(reverse('user-stats')).data['total_event_logs'], 5)
+        out = io.StringIO()
+        call_command('rebuild_log_counters', '--dry-run', stdout=out)
+        self.assertIn('All log counters are correct', out.getvalue())
+
+        EventLogMessage.objects.filter(level='debug').delete()
+        self.assertEqual(self.counter('debug'), 0)
+
+    def test_batch_keeps_errors(self):
+        self.set_rules({'sample_rate': 0.0})
+        records = [self.event_payload(level='info'), self.event_payload(level='error'), self.event_payload(level='fatal')]
+        response = self.client.post(reverse('create_event_log_batch'), records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['sampled']), (1, 2))
+        self.assertEqual(list(EventLogMessage.objects.values_list('level', flat=True)), ['error'])
+
+        self.set_rules({'sample_rate': 0.0}, keep_errors=False)
+        response = self.client.post(reverse('create_event_log_batch'), records, format='json')
+        self.assertEqual((response.data['created'], response.data['sampled']), (0, 3))
+
+    def test_rule_changes_apply_to_cached_keys(self):
+        self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        response = self.set_rules({'user_id': 'user123', 'sample_rate': 0.0})
+        self.assertEqual(response.data['sampling_rules'], [{'level': '', 'user_id': 'user123', 'sample_rate': 0.0}])
+        response = self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        SamplingRule.objects.filter(api_key=self.api_key).delete()
+        response = self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_rejects_conflicting_rules(self):
+        response = self.client.patch(reverse('api-key-detail', args=[self.api_key.pk]), {'sampling_rules': [
+            {'level': 'debug', 'sample_rate': 0.1}, {'level': 'debug', 'sample_rate': 0.2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(reverse('api-key-detail', args=[self.api_key.pk]), {'sampling_rules': [
+            {'level': 'debug', 'sample_rate': 2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_async_endpoint(self):
+        await sync_to_async(SamplingRule.objects.create)(api_key=self.api_key, level='info', sample_rate=0.0)
+        response = await self.async_client.post(
+            reverse('create_event_log_async'), json.dumps(self.event_payload()), content_type='application/json'
+        )
+        self.assertEqual(json.loads(response.content), {'status': 'sampled'})
+        self.assertEqual(await EventLogMessage.objects.acount(), 0)
+
+
+class LlmAnalyticsTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def ingest(self, source, latencies, **metadata):
+        records = [
+            self.llm_payload(source=source, metadata={'latency_ms': latency, **metadata}) for latency in latencies
+        ]
+        response = self.client.post(reverse('create_llm_log_batch'), records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def analytics(self, **params):
+        response = self.client.get(reverse('llm-log-analytics'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_sketch_percentiles_are_within_two_percent(self):
+        buckets = {}
+        for value in range(1, 1001):
+            buckets[sketch_bucket(value)] = buckets.get(sketch_bucket(value), 0) + 1
+        for name, estimate in percentiles(buckets).items():
+            exact = int(name[1:]) * 10
+            self.assertLessEqual(abs(estimate - exact) / exact, 0.02)
+        self.assertEqual(percentiles({sketch_bucket(0): 3})['p99'], 0)
+
+    def test_batch_applies_one_upsert_per_counter_table(self):
+        self.ingest('gpt-4', [100], prompt_tokens=10, completion_tokens=5, cost=0.01)
+        with CaptureQueriesContext(connection) as queries:
+            self.ingest('gpt-4', range(10, 510, 10), prompt_tokens=10, completion_tokens=5, cost=0.01)
+        for table in ('logger_logcounter', 'logger_logrollup', 'logger_llmusagerollup', 'logger_llmusagesketch'):
+            writes = [query['sql'] for query in queries.captured_queries
+                      if f'"{table}"' in query['sql'] and not query['sql'].startswith('SELECT')]
+            self.assertEqual(len(writes), 1, table)
+        source = self.analytics()['sources'][0]
+        self.assertEqual((source['requests'], source['prompt_tokens']['total']), (51, 510))
+        self.assertEqual(source['latency_ms']['count'], 51)
+
+    def test_totals_averages_and_percentiles_per_source(self):
+        self.ingest('gpt-4', range(10, 1010, 10), prompt_tokens=100, completion_tokens=20, cost=0.01)
+        self.ingest('claude', [200, 400], input_tokens=50, output_tokens=10)
+        payload = self.llm_payload(source='claude', metadata={'latency_ms': 'n/a'})
+        self.client.post(reverse('create_llm_log'), payload, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.analytics()
+        self.assertFalse([query for query in queries.captured_queries if 'logger_llmlogmessage' in query['sql']])
+
+        self.assertEqual([source['source'] for source in data['sources']], ['gpt-4', 'claude'])
+        gpt, claude = data['sources']
+        self.assertEqual(gpt['requests'], 100)
+        self.assertEqual(gpt['prompt_tokens']['total'], 10000)
+        self.assertAlmostEqual(gpt['cost']['total'], 1.0)
+        self.assertAlmostEqual(gpt['latency_ms']['avg'], 505)
+        self.assertAlmostEqual(gpt['latency_ms']['p50'], 500, delta=20)
+        self.assertAlmostEqual(gpt['latency_ms']['p99'], 990, delta=25)
+        self.assertEqual((claude['requests'], claude['latency_ms']['count']), (3, 2))
+        self.assertEqual((claude['completion_tokens']['avg'], claude['cost']['avg']), (10, None))
+        self.assertEqual(data['totals']['requests'], 103)
+        self.assertEqual(data['totals']['prompt_tokens']['total'], 10100)
+
+        self.assertEqual([source['source'] for source in self.analytics(source='claude')['sources']], ['claude'])
+        other = User.objects.create_user(username='bob', password='password')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.analytics()['totals']['requests'], 0)
+
+    def test_deleting_logs_and_backfill_keep_rollups_consistent(self):
+        self.ingest('gpt-4', [100, 200, 300], prompt_tokens=10)
+        LlmLogMessage.objects.filter(id=LlmLogMessage.objects.order_by('id').first().id).delete()
+        data = self.analytics()['totals']
+        self.assertEqual((data['requests'], data['latency_ms']['total'], data['prompt_tokens']['total']), (2, 500, 20))
+
+        rollups = set(LlmUsageRollup.objects.filter(count__gt=0).values_list('metric', 'count', 'total'))
+        sketches = set(LlmUsageSketch.objects.filter(count__gt=0).values_list('metric', 'bucket', 'count'))
+        call_command('backfill_log_rollups', stdout=io.StringIO())
+        self.assertEqual(set(LlmUsageRollup.objects.values_list('metric', 'count', 'total')), rollups)
+        self.assertEqual(set(LlmUsageSketch.objects.values_list('metric', 'bucket', 'count')), sketches)
+
+    def test_rejects_bad_ranges(self):
+        params = {'start': '2026-01-02T00:00:00Z', 'end': '2026-01-01T00:00:00Z'}
+        response = self.client.get(reverse('llm-log-analytics'), params)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ArchiveTests(LoggerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        settings_override = override_settings(LOGGER_ARCHIVE_DIR=self.archive_dir.name, LOGGER_ARCHIVE_BLOCK_RECORDS=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.second_key = ApiKey.objects.create(user=self.user, name='Second')
+        self.now = timezone.now()
+        self.client.force_authenticate(self.user)
+
+    def add_logs(self, api_key, days_old, count, level='info'):
+        for i in range(count):
+            EventLogMessage.objects.create(
+                api_key=api_key, user_id='user123', message=f'{api_key.name} {days_old}d {i}', level=level,
+                metadata={'n': i}, timestamp=self.now - timezone.timedelta(days=days_old, minutes=i),
+            )
+
+    def archive(self, days=30):
+        return list(archive_logs(EventLogMessage, self.now - timezone.timedelta(days=days), chunk_size=2))
+
+    def list_messages(self, **params):
+        messages = []
+        url = reverse('event-log-list')
+        while url:
+            data = self.client.get(url, params if url == reverse('event-log-list') else None).data
+            messages += [log['message'] for log in data['results']]
+            url = data['next']
+        return messages
+
+    def test_lists_and_exports_across_the_database_and_the_archive(self):
+        self.add_logs(self.api_key, 1, 2)
+        self.add_logs(self.api_key, 40, 3)
+        self.add_logs(self.second_key, 40, 2, level='error')
+        self.add_logs(self.second_key, 41, 1)
+        expected = self.list_messages(page_size=2)
+        stats = self.client.get(reverse('user-stats')).data
+
+        self.assertEqual(len(self.archive()), 3)
+        self.assertEqual(EventLogMessage.objects.count(), 2)
+        self.assertEqual(ArchiveSegment.objects.get(api_key=self.second_key, count=2).dimension_counts, {'error': 2})
+        self.assertEqual(self.list_messages(page_size=2), expected)
+        self.assertEqual(self.client.get(reverse('user-stats')).data, stats)
+
+        self.assertEqual(self.list_messages(level='error'), ['Second 40d 0', 'Second 40d 1'])
+        self.assertEqual(self.list_messages(api_key=self.second_key.pk), ['Second 40d 0', 'Second 40d 1', 'Second 41d 0'])
+        since = (self.now - timezone.timedelta(days=40, minutes=1)).isoformat()
+        until = (self.now - timezone.timedelta(days=40) + timezone.timedelta(hours=1)).isoformat()
+        self.assertEqual(
+            self.list_messages(since=since, until=until, **{'metadata.n': '1'}), ['Second 40d 1', 'Default 40d 1']
+        )
+
+        response = self.client.get(reverse('event-log-export'))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['message'] for row in rows], expected[::-1])
+        self.assertEqual(rows[0]['timestamp'][-1], 'Z')
+
+    def test_reads_only_the_blocks_it_needs(self):
+        self.add_logs(self.api_key, 40, 5)
+        self.archive()
+        segment = ArchiveSegment.objects.get()
+        self.assertEqual([block[2] for block in segment.blocks], [2, 2, 1])
+
+        records = list(iter_segment(segment))
+        self.assertEqual([record['message'] for record in records], [f'Default 40d {i}' for i in range(4, -1, -1)])
+        with mock.patch('logger.archive.read_block', wraps=archive.read_block) as read_block:
+            before = (records[2]['timestamp'], records[2]['id'])
+            newer = list(iter_segment(segment, before=before, reverse=True))
+        self.assertEqual(newer, records[:2][::-1])
+        self.assertEqual(read_block.call_count, 1)
+
+    def test_resumes_an_interrupted_run(self):
+        self.add_logs(self.api_key, 40, 3)
+        with mock.patch('logger.archive.delete_archived_logs', return_value=0):
+            self.archive()
+        self.assertEqual(EventLogMessage.objects.count(), 3)
+
+        self.assertEqual(self.archive(), [])
+        self.assertEqual(EventLogMessage.objects.count(), 0)
+        self.assertEqual(ArchiveSegment.objects.count(), 1)
+        self.assertEqual(len(self.list_messages()), 3)
+
+    def test_retention_purges_expired_segments(self):
+        self.add_logs(self.api_key, 40, 2)
+        self.add_logs(self.api_key, 90, 3)
+        self.archive()
+        path = ArchiveSegment.objects.get(count=3).path
+        self.api_key.retention_days = 60
+        self.api_key.save()
+
+        with mock.patch('logger.signals.remove_segment_file', wraps=archive.remove_segment_file) as remove, \
+                self.captureOnCommitCallbacks(execute=True):
+            chunks = list(purge_all(now=self.now))
+        self.assertEqual([rows for _, _, rows in chunks], [3])
+        remove.assert_called_once_with(path)
+        self.assertFalse((Path(self.archive_dir.name) / path).exists())
+        self.assertEqual(ArchiveSegment.objects.get().count, 2)
+        self.assertEqual(LogCounter.objects.get(api_key=self.api_key, level='info').count, 2)
+
+        out = io.StringIO()
+        call_command('rebuild_log_counters', '--dry-run', stdout=out)
+        self.assertIn('All log counters are correct', out.getvalue())
+
+    def test_command_dry_run(self):
+        self.add_logs(self.api_key, 40, 2)
+        out = io.StringIO()
+        call_command('archive_logs', '--dry-run', stdout=out)
+        self.assertIn('2 logs older than', out.getvalue())
+        self.assertEqual(ArchiveSegment.objects.count(), 0)
+        call_command('archive_logs', '--older-than', '30', '--pause', '0', stdout=out)
+        self.assertIn('archived 2 logs into 1 segments', out.getvalue())
+        self.assertEqual(EventLogMessage.objects.count(), 0)
+
+
+class LogWriterTests(LoggerTestCase):
+    def make_logs(self, count):
+        return [EventLogMessage(api_key=self.api_key, user_id='user123', message='event') for _ in range(count)]
+
+    def test_sqlite_pragmas_are_set_on_connect(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+
+    def test_begin_immediate_only_changes_the_calling_threads_connection(self):
+        # Fails, rather than silently keeping deferred transactions, if a
+        # Django upgrade removes the backend hook begin_immediate() overrides
+        self.assertTrue(callable(getattr(type(connections['default']), '_start_transaction_under_autocommit', None)))
+        wrappers = []
+
+        def run():
+            begin_immediate(connection)
+            wrappers.append(connections['default'])
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertIsNot(wrappers[0], connections['default'])
+        self.assertIn('_start_transaction_under_autocommit', vars(wrappers[0]))
+        self.assertNotIn('_start_transaction_under_autocommit', vars(connections['default']))
+        with self.assertRaises(ImproperlyConfigured), \
+                mock.patch.object(type(connections['default']), '_start_transaction_under_autocommit', None):
+            begin_immediate(connection)
+
+    def test_group_commit_isolates_failed_writes(self):
+        def failing_write():
+            _insert_logs(EventLogMessage, self.make_logs(5))
+            raise ValueError('rejected')
+
+        writer = LogWriter(autostart=False)
+        jobs = [
+            writer.submit(_insert_logs, EventLogMessage, self.make_logs(2)),
+            writer.submit(failing_write),
+            writer.submit(_insert_logs, EventLogMessage, self.make_logs(3)),
+        ]
+        self.assertEqual(writer.process(), 3)
+        self.assertEqual(len(jobs[0].result()[0]), 2)
+        with self.assertRaisesMessage(ValueError, 'rejected'):
+            jobs[1].result()
+        self.assertEqual(len(jobs[2].result()[0]), 3)
+        self.assertEqual(EventLogMessage.objects.count(), 5)
+        self.assertEqual(LogCounter.objects.get(api_key=self.api_key, level='info').count, 5)
+        self.assertEqual(writer.get_stats(), {'writes': 2, 'failed': 1, 'commits': 1, 'max_batch': 3, 'pending': 0})
+
+    def test_writer_mode_answers_like_sync_mode(self):
+        writer = LogWriter(autostart=False)
+        with override_settings(LOGGER_INGESTION_MODE='writer'), mock.patch('logger.views.log_writer', writer):
+            response = self.client.post(reverse('create_event_log'), self.event_payload(), format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            response = self.client.post(reverse('create_event_log_batch'), [self.event_payload()] * 2, format='json')
+            self.assertEqual(response.data['created'], 2)
+        self.assertEqual(EventLogMessage.objects.count(), 3)
+
+
+@override_settings(LOGGER_READ_REPLICA='replica', LOGGER_REPLICA_CHECK_INTERVAL=0)
+class ReadReplicaTests(LoggerTestCase):
+    """
+    The in-memory test database is the primary; a migrated SQLite file stands
+    in for the replica, and replicate() copies the primary's rows into it
+    """
+    REPLICATED = (User, ApiKey, LogCounter, EventLogMessage)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = dict(
+            connections['default'].settings_dict, NAME=str(Path(cls.replica_dir.name) / 'replica.sqlite3')
+        )
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        read_pins.clear()
+        replica_health.clear()
+        self.addCleanup(read_pins.clear)
+        self.addCleanup(replica_health.clear)
+        self.client.force_authenticate(self.user)
+        self.add_log('replicated')
+
+    def add_log(self, message, **fields):
+        return EventLogMessage.objects.create(api_key=self.api_key, user_id='user123', message=message, **fields)
+
+    def replicate(self):
+        # Plain querysets, so the copies are not counted again on the primary
+        with connections['replica'].cursor() as cursor:
+            for model in reversed(self.REPLICATED):
+                cursor.execute(f'DELETE FROM {model._meta.db_table}')
+        for model in self.REPLICATED:
+            db_models.QuerySet(model, using='replica').bulk_create(list(model.objects.all()))
+
+    def messages(self):
+        return [log['message'] for log in self.client.get(reverse('event-log-list')).data['results']]
+
+    def test_reads_from_the_replica_until_the_user_writes(self):
+        self.replicate()
+        self.add_log('not replicated yet')
+        self.assertEqual(self.messages(), ['replicated'])
+        self.assertEqual(self.client.get(reverse('user-stats')).data['total_event_logs'], 1)
+        response = self.client.get(reverse('event-log-export'))
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 1)
+
+        response = self.client.post(reverse('create_event_log'), self.event_payload(message='mine'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.messages(), ['mine', 'not replicated yet', 'replicated'])
+        self.assertEqual(self.client.get(reverse('user-stats')).data['total_event_logs'], 3)
+
+        cache.clear()
+        read_pins.clear()
+        with override_settings(LOGGER_READ_YOUR_WRITES_SECONDS=0):
+            self.client.patch(reverse('api-key-detail', args=[self.api_key.pk]), {'name': 'Renamed'}, format='json')
+        self.assertEqual(self.messages(), ['replicated'])
+        self.client.patch(reverse('api-key-detail', args=[self.api_key.pk]), {'name': 'Renamed'}, format='json')
+        self.assertEqual(len(self.messages()), 3)
+
+    def test_falls_back_to_the_primary_when_the_replica_lags(self):
+        self.replicate()
+        self.add_log('a minute later', timestamp=timezone.now() + timezone.timedelta(minutes=1))
+        with override_settings(LOGGER_REPLICA_MAX_LAG_SECONDS=120):
+            self.assertEqual(self.messages(), ['replicated'])
+        with override_settings(LOGGER_REPLICA_MAX_LAG_SECONDS=30):
+            self.assertEqual(self.messages(), ['a minute later', 'replicated'])
+
+    def test_falls_back_to_the_primary_when_the_replica_is_down(self):
+        self.add_log('only on the primary')
+        with mock.patch.object(ReplicaHealth, 'lag', side_effect=OperationalError('unable to open database file')):
+            self.assertEqual(self.messages(), ['only on the primary', 'replicated'])
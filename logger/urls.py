@@ -10,6 +10,12 @@ router.register(r'llm-logs', views.LlmLogMessageViewSet, basename='llm-log')
 urlpatterns = [
     path('', include(router.urls)),
     path('user/stats/', views.get_user_stats, name='user-stats'),
+    path('stats/timeseries/', views.get_timeseries, name='stats-timeseries'),
+    path('ingestion/stats/', views.get_ingestion_stats, name='ingestion-stats'),
     path('event-log/', views.create_event_log, name='create_event_log'),
+    path('event-log/batch/', views.create_event_log_batch, name='create_event_log_batch'),
+    path('event-log/async/', views.create_event_log_async, name='create_event_log_async'),
     path('llm-log/', views.create_llm_log, name='create_llm_log'),
+    path('llm-log/batch/', views.create_llm_log_batch, name='create_llm_log_batch'),
+    path('llm-log/async/', views.create_llm_log_async, name='create_llm_log_async'),
 ] 
\ No newline at end of file
@@ -0,0 +1,197 @@
+import uuid
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.validators import ProhibitNullCharactersValidator
+from rest_framework import serializers
+from rest_framework.fields import _UnvalidatedField
+from rest_framework.utils import html
+from rest_framework.validators import ProhibitSurrogateCharactersValidator
+
+from .apikeys import resolver
+
+INVALID_API_KEY = "Invalid or inactive API key"
+NOT_A_DICT = "Invalid data. Expected a dictionary, but got {datatype}."
+
+
+class _Skip(Exception):
+    """
+    An optional field that was not sent
+    """
+
+
+class RecordValidator:
+    """
+    Validates raw log records without instantiating a DRF serializer. The
+    field rules are compiled once from a create serializer's fields, so the
+    validated data and the error messages match what the serializer produces,
+    minus the API key lookup, which is left to the caller. Only the field
+    types used by the log create serializers are supported.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.fields = [
+            (name, self.compile_field(field))
+            for name, field in serializer_class().fields.items()
+            if not field.read_only
+        ]
+
+    def validate(self, record):
+        """
+        Return (validated_data, errors); errors is empty when the record is valid
+        """
+        if not isinstance(record, dict):
+            return {}, {'non_field_errors': [NOT_A_DICT.format(datatype=type(record).__name__)]}
+        validated = {}
+        errors = {}
+        for name, check in self.fields:
+            try:
+                value = check(record.get(name, _Skip))
+            except _Skip:
+                continue
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+                continue
+            validated[name] = value
+        return validated, errors
+
+    def compile_field(self, field):
+        messages = field.error_messages
+        required = field.required
+        allow_null = field.allow_null
+
+        def fail(key, **kwargs):
+            raise serializers.ValidationError([messages[key].format(**kwargs)])
+
+        def check_empty(value):
+            if value is _Skip:
+                if required:
+                    fail('required')
+                raise _Skip
+            if value is None and not allow_null:
+                fail('null')
+
+        if isinstance(field, serializers.UUIDField):
+            def check(value):
+                check_empty(value)
+                if value is None:
+                    return None
+                try:
+                    if isinstance(value, int) and not isinstance(value, bool):
+                        return uuid.UUID(int=value)
+                    if isinstance(value, str):
+                        return uuid.UUID(hex=value)
+                except ValueError:
+                    pass
+                fail('invalid')
+            return check
+
+        if isinstance(field, serializers.ChoiceField):
+            choices = field.choice_strings_to_values
+            allow_blank = field.allow_blank
+
+            def check(value):
+                check_empty(value)
+                if value is None:
+                    return None
+                if value == '' and allow_blank:
+                    return ''
+                try:
+                    return choices[str(value)]
+                except KeyError:
+                    fail('invalid_choice', input=value)
+            return check
+
+        if isinstance(field, serializers.CharField):
+            allow_blank = field.allow_blank
+            trim = field.trim_whitespace
+            max_length = field.max_length
+            min_length = field.min_length
+            null_message = str(ProhibitNullCharactersValidator.message)
+            surrogate_message = ProhibitSurrogateCharactersValidator.message
+
+            def check(value):
+                check_empty(value)
+                if value is None:
+                    return None
+                if value == '' or (trim and str(value).strip() == ''):
+                    if not allow_blank:
+                        fail('blank')
+                    return ''
+                if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                    fail('invalid')
+                value = str(value)
+                if trim:
+                    value = value.strip()
+                # Like the serializer field's validators, report every failure
+                errors = []
+                if max_length is not None and len(value) > max_length:
+                    errors.append(messages['max_length'].format(max_length=max_length))
+                if min_length is not None and len(value) < min_length:
+                    errors.append(messages['min_length'].format(min_length=min_length))
+                if '\x00' in value:
+                    errors.append(null_message)
+                if not value.isascii():
+                    for char in value:
+                        if 0xD800 <= ord(char) <= 0xDFFF:
+                            errors.append(surrogate_message.format(code_point=ord(char)))
+                            break
+                if errors:
+                    raise serializers.ValidationError(errors)
+                return value
+            return check
+
+        if isinstance(field, serializers.DictField) and isinstance(field.child, _UnvalidatedField):
+            allow_empty = field.allow_empty
+
+            def check(value):
+                check_empty(value)
+                if value is None:
+                    return None
+                if not isinstance(value, dict):
+                    fail('not_a_dict', input_type=type(value).__name__)
+                if not allow_empty and not value:
+                    fail('empty')
+                return {str(key): item for key, item in value.items()}
+            return check
+
+        if isinstance(field, serializers.JSONField) and not field.binary:
+            # Parsed request bodies only contain JSON-serializable values
+            def check(value):
+                check_empty(value)
+                return value
+            return check
+
+        raise ImproperlyConfigured(
+            f"RecordValidator does not support {type(field).__name__} ({self.serializer_class.__name__})"
+        )
+
+
+def validate_record(validator, record):
+    """
+    Validate a record and resolve its API key, returning (validated_data,
+    errors) as the create serializer would. Form-encoded input, whose parsing
+    rules differ, still goes through the serializer.
+    """
+    if html.is_html_input(record):
+        serializer = validator.serializer_class(data=record)
+        serializer.is_valid()
+        return serializer.validated_data, serializer.errors
+    data, errors = validator.validate(record)
+    if 'api_key' in data:
+        data['api_key'] = resolver.resolve(data['api_key'])
+        if data['api_key'] is None:
+            errors['api_key'] = [INVALID_API_KEY]
+    return data, errors
+
+
+async def avalidate_record(validator, record):
+    """
+    validate_record() for async views, resolving the API key asynchronously
+    """
+    data, errors = validator.validate(record)
+    if 'api_key' in data:
+        data['api_key'] = await resolver.aresolve(data['api_key'])
+        if data['api_key'] is None:
+            errors['api_key'] = [INVALID_API_KEY]
+    return data, errors
@@ -1,24 +1,52 @@
+from collections.abc import Iterator
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, parser_classes, action
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Count
-from .models import ApiKey, EventLogMessage, LlmLogMessage
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, UnsupportedMediaType, ValidationError
+from .models import ApiKey, EventLogMessage, LlmLogMessage, LlmUsageRollup, LlmUsageSketch, LogCounter, LogRollup
 from .serializers import (
     ApiKeySerializer, 
     EventLogMessageSerializer, EventLogMessageCreateSerializer,
     LlmLogMessageSerializer, LlmLogMessageCreateSerializer
 )
+from . import archive, exports
+from .analytics import UsageSummary
+from .buffer import BufferFull, ingestion_buffer
+from .filters import LogFilterBackend, parse_api_key_param, parse_time_param
+from .idempotency import idempotency_cache, record_key, request_key, write_logs
+from .live import LogStream, SyncStreamEvents, log_hub
+from .metrics import request_metrics
+from .pagination import KeysetPagination, SearchPagination
+from .parsers import NDJSONParser, StreamingJSONParser
+from .ratelimit import acount_records, count_records, rate_limiter
+from .renderers import EventStreamRenderer
+from .replicas import PinWritesMixin, ReplicaReadsMixin, pin_log_writers, replica_view
+from .sampling import asample_weight, sample_weight
+from .validation import RecordValidator, avalidate_record, validate_record
+from .writer import log_writer
 
 # Create your views here.
 
-class ApiKeyViewSet(viewsets.ModelViewSet):
+class ApiKeyViewSet(PinWritesMixin, viewsets.ModelViewSet):
     serializer_class = ApiKeySerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return ApiKey.objects.filter(user=self.request.user, is_active=True)
+        return ApiKey.objects.filter(user=self.request.user, is_active=True).prefetch_related('sampling_rules')
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -26,72 +54,570 @@ class ApiKeyViewSet(viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         """
         Handle updates to API keys (including is_active status changes)
-        Only allows updating the name and is_active fields
+        Only allows updating the name, is_active, retention_days, rate_limit,
+        rate_limit_burst, daily_quota, keep_errors and sampling_rules fields
         """
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
         
-        # Only allow updates to name and is_active fields
+        # Only allow updates to the name, is_active, retention, rate limit and sampling fields
         data = {}
-        if 'name' in request.data:
-            data['name'] = request.data['name']
-        if 'is_active' in request.data:
-            data['is_active'] = request.data['is_active']
+        for field in ('name', 'is_active', 'retention_days', 'rate_limit', 'rate_limit_burst', 'daily_quota',
+                      'keep_errors', 'sampling_rules'):
+            if field in request.data:
+                data[field] = request.data[field]
             
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+
+        if getattr(instance, '_prefetched_objects_cache', None):
+            # The sampling rules may have been replaced
+            instance._prefetched_objects_cache = {}
         
         return Response(serializer.data)
 
-class EventLogMessageViewSet(viewsets.ReadOnlyModelViewSet):
-    serializer_class = EventLogMessageSerializer
+class LogMessageViewSet(ReplicaReadsMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only access to the authenticated user's logs, paged newest first.
+    Supports the index-backed filters of LogFilterBackend, and ?q= switches
+    the list to full-text search results ranked by relevance. The list and
+    export continue into archived logs; search only covers the database.
+    Reads go to the read replica when one is configured, except for the live
+    tail, which has to see every new log.
+    """
+    model = None
+    indexed_filter_fields = ()
+    export_filename = None
     permission_classes = [permissions.IsAuthenticated]
-    
+    filter_backends = [LogFilterBackend]
+    pagination_class = KeysetPagination
+    keyset_partition_field = 'api_key'
+    replica_exempt_actions = ('stream',)
+
     def get_queryset(self):
         user = self.request.user
-        return EventLogMessage.objects.filter(api_key__user=user)
+        return self.model.objects.filter(api_key__user=user)
+
+    def get_keyset_partition_values(self):
+        api_keys = ApiKey.objects.filter(user=self.request.user)
+        api_key = parse_api_key_param(self.request.query_params)
+        if api_key is not None:
+            api_keys = api_keys.filter(id=api_key)
+        return list(api_keys.values_list('id', flat=True))
+
+    def get_archived_logs(self, before=None):
+        """
+        Archived logs matching the list's filters, newest first, as unsaved
+        instances. Used by KeysetPagination once the database has no older logs.
+        """
+        since, until, predicate = LogFilterBackend().archive_filters(self.request, self)
+        records = archive.archived_logs(
+            self.model, self.get_keyset_partition_values(), since, until, before, predicate, reverse=True
+        )
+        return (self.model(**record) for record in records)
+
+    def list(self, request, *args, **kwargs):
+        self.search_query = request.query_params.get('q', '').strip()
+        if self.search_query:
+            self.pagination_class = SearchPagination
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the user's logs as NDJSON or CSV (?output=csv), optionally gzipped
+        (?compress=gzip). Accepts the same filters as the list.
+        """
+        output = request.query_params.get('output', exports.NDJSON)
+        if output not in exports.CONTENT_TYPES:
+            raise ValidationError({'output': ["Expected 'ndjson' or 'csv'"]})
+        compress = request.query_params.get('compress')
+        if compress not in (None, '', 'gzip'):
+            raise ValidationError({'compress': ["Expected 'gzip'"]})
 
-class LlmLogMessageViewSet(viewsets.ReadOnlyModelViewSet):
+        queryset = self.filter_queryset(self.get_queryset())
+        # The rows are streamed after the view returns, outside replica_reads()
+        queryset = queryset.using(queryset.db)
+
+        # Reading each API key separately keeps every read on its (api_key, timestamp) index
+        api_key_ids = self.get_keyset_partition_values()
+        if len(api_key_ids) <= getattr(settings, 'LOGGER_KEYSET_MAX_PARTITIONS', 50):
+            partitions = [queryset.filter(api_key=api_key_id) for api_key_id in api_key_ids]
+        else:
+            partitions = [queryset]
+
+        since, until, predicate = LogFilterBackend().archive_filters(request, self)
+        archived = archive.archived_logs(self.model, api_key_ids, since, until, predicate=predicate)
+
+        fields = list(self.get_serializer_class().Meta.fields)
+        return exports.export_response(
+            partitions, fields, output, bool(compress), self.export_filename, archived
+        )
+
+    @action(detail=False, methods=['get'], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream(self, request):
+        """
+        Live tail of the user's new logs as Server-Sent Events, with the same
+        filters as the list. Starts after the newest log, or after the id in
+        the Last-Event-ID header (or ?last_event_id=) when resuming.
+        """
+        last_id = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('last_event_id')
+        if last_id:
+            try:
+                last_id = int(last_id)
+            except ValueError:
+                raise ValidationError({'last_event_id': ["Expected a log id"]})
+        else:
+            last_id = self.model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+        log_stream = LogStream(
+            self.filter_queryset(self.get_queryset()), self.get_serializer_class(),
+            self.model.counter_kind, self.get_keyset_partition_values(), last_id,
+        )
+        # Django buffers a streaming response whose iterator does not match the server
+        if isinstance(request._request, ASGIRequest):
+            events = log_stream.__aiter__()
+        elif log_hub.acquire_sync_stream(getattr(settings, 'LOGGER_STREAM_MAX_SYNC_STREAMS', 1)):
+            events = SyncStreamEvents(log_stream)
+        else:
+            # Under WSGI each stream holds a worker thread for up to LOGGER_STREAM_MAX_SECONDS
+            return Response(
+                {"detail": "Too many live streams on this worker, please retry later"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '5'},
+            )
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class EventLogMessageViewSet(LogMessageViewSet):
+    model = EventLogMessage
+    serializer_class = EventLogMessageSerializer
+    indexed_filter_fields = ('level', 'user_id')
+    export_filename = 'event-logs'
+
+class LlmLogMessageViewSet(LogMessageViewSet):
+    """
+    ?preview=<n> returns only the first n characters of each query and
+    response, which skips decompressing most of a compressed payload
+    """
+    model = LlmLogMessage
     serializer_class = LlmLogMessageSerializer
-    permission_classes = [permissions.IsAuthenticated]
-    
-    def get_queryset(self):
-        user = self.request.user
-        return LlmLogMessage.objects.filter(api_key__user=user)
+    indexed_filter_fields = ('source', 'user_id')
+    export_filename = 'llm-logs'
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        preview = self.request.query_params.get('preview')
+        if preview:
+            try:
+                context['preview'] = int(preview)
+            except ValueError:
+                raise ValidationError({'preview': ["Expected a number of characters"]})
+            if context['preview'] < 1:
+                raise ValidationError({'preview': ["Expected a number of characters"]})
+        return context
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Token, latency and cost totals, averages and percentiles per source,
+        read from the hourly usage rollups and sketches rather than the logs.
+        Query parameters: start and end (whole hours, the last 24 by default),
+        api_key (id) and source.
+        """
+        hour = LogRollup.BUCKET_SIZES[LogRollup.HOUR]
+        max_hours = getattr(settings, 'LOGGER_TIMESERIES_MAX_BUCKETS', 1500)
+        end = parse_time_param(request.query_params, 'end') or timezone.now()
+        start = parse_time_param(request.query_params, 'start') or end - hour * 24
+        start = LogRollup.truncate(start, LogRollup.HOUR)
+        if start >= end:
+            raise ValidationError({'start': ["Must be before end"]})
+        if (end - start) / hour > max_hours:
+            raise ValidationError({'start': [f"The time range spans more than {max_hours} hours"]})
+
+        filters = {
+            'api_key__in': ApiKey.objects.filter(user=request.user).values('id'),
+            'bucket_start__gte': start,
+            'bucket_start__lt': end,
+        }
+        api_key = parse_api_key_param(request.query_params)
+        if api_key is not None:
+            filters['api_key_id'] = api_key
+        source = request.query_params.get('source')
+        source = LogRollup.dimension_value(source) if source else None
+
+        requests = LogRollup.objects.filter(kind=LogCounter.LLM, granularity=LogRollup.HOUR, **filters)
+        rollups = LlmUsageRollup.objects.filter(**filters)
+        sketches = LlmUsageSketch.objects.filter(**filters)
+        if source is not None:
+            requests = requests.filter(dimension=source)
+            rollups = rollups.filter(source=source)
+            sketches = sketches.filter(source=source)
+
+        totals = UsageSummary()
+        sources = {}
+        for source_value, count in requests.values_list('dimension', 'count'):
+            for summary in (totals, sources.setdefault(source_value, UsageSummary())):
+                summary.requests += count
+        for source_value, metric, count, total in rollups.values_list('source', 'metric', 'count', 'total'):
+            for summary in (totals, sources.setdefault(source_value, UsageSummary())):
+                summary.add_rollup(metric, count, total)
+        for source_value, metric, bucket, count in sketches.values_list('source', 'metric', 'bucket', 'count'):
+            for summary in (totals, sources.setdefault(source_value, UsageSummary())):
+                summary.add_sketch(metric, bucket, count)
+
+        return Response({
+            'start': start,
+            'end': end,
+            'totals': totals.as_dict(),
+            'sources': [
+                {'source': source_value, **summary.as_dict()}
+                for source_value, summary in sorted(sources.items(), key=lambda item: (-item[1].requests, item[0]))
+                if summary.requests
+            ],
+        })
+
+_event_log_validator = RecordValidator(EventLogMessageCreateSerializer)
+_llm_log_validator = RecordValidator(LlmLogMessageCreateSerializer)
+
+DUPLICATE = {"status": "duplicate"}
+SAMPLED = {"status": "sampled"}
+
+def _new_log(model, data, weight):
+    log = model(**data)
+    if weight != 1:
+        setattr(log, model.weight_field, weight)
+    return log
+
+def _save_log(log, key=None):
+    """
+    Save a validated log record, either straight away or, in buffered ingestion
+    mode, by handing it to the write-behind buffer and answering 202 Accepted.
+    A log whose idempotency key was already ingested is answered with 200 and
+    not stored again; in buffered mode only this worker's recent keys are known.
+    """
+    if getattr(settings, 'LOGGER_INGESTION_MODE', 'sync') == 'buffered':
+        if key is not None and idempotency_cache.seen((log.api_key_id, log.counter_kind, key)):
+            return Response(DUPLICATE, status=status.HTTP_200_OK)
+        try:
+            ingestion_buffer.put(log)
+        except BufferFull:
+            return Response(
+                {"detail": "Ingestion buffer is full, please retry later"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '1'}
+            )
+        if key is not None:
+            idempotency_cache.add([(log.api_key_id, log.counter_kind, key)])
+        pin_log_writers([log])
+        return Response({"status": "accepted"}, status=status.HTTP_202_ACCEPTED)
+    if key is None and getattr(settings, 'LOGGER_INGESTION_MODE', 'sync') != 'writer':
+        # post_save updates the counters and rollups, which must commit along with the log
+        with transaction.atomic():
+            log.save()
+            pin_log_writers([log])
+    elif not _write_logs(type(log), [log], [key])[0]:
+        return Response(DUPLICATE, status=status.HTTP_200_OK)
+    return Response({"status": "success"}, status=status.HTTP_201_CREATED)
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@parser_classes([StreamingJSONParser, NDJSONParser, FormParser, MultiPartParser])
 def create_event_log(request):
-    serializer = EventLogMessageCreateSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response({"status": "success"}, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    """
+    Create an event log. A JSON array or NDJSON body is handled like a batch.
+    """
+    if not isinstance(request.data, dict):
+        return _create_logs_in_bulk(request, _event_log_validator, EventLogMessage)
+    header_key = request_key(request)
+    rate_limiter.check(count_records([request.data]))
+    weight = sample_weight(EventLogMessage, request.data)
+    if not weight:
+        return Response(SAMPLED, status=status.HTTP_200_OK)
+    data, errors = validate_record(_event_log_validator, request.data)
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+    key = data.pop('idempotency_key', None) or header_key
+    return _save_log(_new_log(EventLogMessage, data, weight), key)
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@parser_classes([StreamingJSONParser, NDJSONParser, FormParser, MultiPartParser])
 def create_llm_log(request):
-    serializer = LlmLogMessageCreateSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response({"status": "success"}, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    """
+    Create an LLM log. A JSON array or NDJSON body is handled like a batch.
+    """
+    if not isinstance(request.data, dict):
+        return _create_logs_in_bulk(request, _llm_log_validator, LlmLogMessage)
+    header_key = request_key(request)
+    rate_limiter.check(count_records([request.data]))
+    weight = sample_weight(LlmLogMessage, request.data)
+    if not weight:
+        return Response(SAMPLED, status=status.HTTP_200_OK)
+    data, errors = validate_record(_llm_log_validator, request.data)
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+    key = data.pop('idempotency_key', None) or header_key
+    return _save_log(_new_log(LlmLogMessage, data, weight), key)
+
+def _create_logs_in_bulk(request, validator, model):
+    """
+    Validate a list of log records and insert the valid ones with chunked
+    bulk_create inside a single transaction. API keys are resolved through the
+    shared resolver cache. Returns per-record errors keyed by index.
+
+    The streaming parsers hand over an iterator rather than a list, so an
+    oversized batch is rejected without reading the rest of the body. The
+    records are charged to their API keys' rate limits before any validation
+    work, and a batch over a limit is refused as a whole. Records dropped by
+    their API key's sampling rules are not validated either.
+    """
+    records = request.data
+    if not isinstance(records, (list, Iterator)):
+        return Response({"detail": "Expected a list of log records"}, status=status.HTTP_400_BAD_REQUEST)
+    header_key = request_key(request)
+
+    max_records = getattr(settings, 'LOGGER_BATCH_MAX_RECORDS', 1000)
+    too_large = Response(
+        {"detail": f"A batch may contain at most {max_records} records"},
+        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    )
+    if isinstance(records, list) and len(records) > max_records:
+        return too_large
+
+    received = []
+    for index, record in enumerate(records):
+        if index >= max_records:
+            return too_large
+        received.append(record)
+    rate_limiter.check(count_records(received))
+
+    objects = []
+    keys = []
+    errors = []
+    sampled = 0
+    for index, record in enumerate(received):
+        shape_errors = _record_shape_errors(record)
+        if shape_errors:
+            errors.append({"index": index, "errors": shape_errors})
+            continue
+        weight = sample_weight(model, record)
+        if not weight:
+            sampled += 1
+            continue
+        data, record_errors = validate_record(validator, record)
+        if record_errors:
+            errors.append({"index": index, "errors": record_errors})
+        else:
+            keys.append(record_key(header_key, data.pop('idempotency_key', None), index))
+            objects.append(_new_log(model, data, weight))
+
+    written, duplicates = _write_logs(model, objects, keys)
+    return Response(*_batch_result(written, errors, duplicates, sampled))
+
+def _record_shape_errors(record):
+    """
+    Errors of a batch element that is not a record at all, before sampling
+    and validation look at its fields; shared by the sync and async paths
+    """
+    if not isinstance(record, dict):
+        return {"non_field_errors": ["Expected a JSON object"]}
+    return None
+
+def _write_logs(model, objects, keys=None):
+    """
+    Insert logs with chunked bulk_create in one transaction. Logs whose
+    idempotency key (keys runs parallel to objects) was already ingested are
+    skipped. Returns the logs written and the number of duplicates.
+
+    In 'writer' ingestion mode the insert runs on the worker's single writer
+    thread, committed along with the other requests' writes.
+    """
+    if getattr(settings, 'LOGGER_INGESTION_MODE', 'sync') == 'writer':
+        written, duplicates = log_writer.run(_insert_logs, model, objects, keys)
+    else:
+        written, duplicates = _insert_logs(model, objects, keys)
+    pin_log_writers(written)
+    return written, duplicates
+
+def _insert_logs(model, objects, keys=None):
+    batch_size = getattr(settings, 'LOGGER_BULK_CREATE_BATCH_SIZE', 500)
+    if keys and any(key is not None for key in keys):
+        return write_logs(model, objects, keys, batch_size)
+    if objects:
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=batch_size)
+    return objects, 0
+
+def _batch_result(objects, errors, duplicates=0, sampled=0):
+    """
+    Response body and status of a batch ingestion. Duplicates of already
+    ingested logs and records dropped by sampling count as accepted.
+    """
+    accepted = len(objects) + duplicates + sampled
+    if not accepted and errors:
+        response_status = status.HTTP_400_BAD_REQUEST
+    elif errors:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_201_CREATED
+
+    return {
+        "status": "success" if not errors else ("partial" if accepted else "error"),
+        "created": len(objects),
+        "duplicates": duplicates,
+        "sampled": sampled,
+        "errors": errors,
+    }, response_status
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+@parser_classes([StreamingJSONParser, NDJSONParser])
+def create_event_log_batch(request):
+    """
+    Create many event logs from a JSON array or an NDJSON body
+    """
+    return _create_logs_in_bulk(request, _event_log_validator, EventLogMessage)
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+@parser_classes([StreamingJSONParser, NDJSONParser])
+def create_llm_log_batch(request):
+    """
+    Create many LLM logs from a JSON array or an NDJSON body
+    """
+    return _create_logs_in_bulk(request, _llm_log_validator, LlmLogMessage)
+
+def _parse_records(request):
+    """
+    Parse an ingestion body outside of DRF with the same streaming parsers:
+    a dict for a single record, otherwise an iterator of records
+    """
+    if not int(request.META.get('CONTENT_LENGTH') or 0):
+        return {}
+    parser_context = {'request': request, 'encoding': request.encoding or settings.DEFAULT_CHARSET}
+    if request.content_type == NDJSONParser.media_type:
+        return NDJSONParser().parse(request, request.content_type, parser_context)
+    if request.content_type == StreamingJSONParser.media_type:
+        return StreamingJSONParser().parse(request, request.content_type, parser_context)
+    raise UnsupportedMediaType(request.content_type)
+
+async def _ingest_async(request, validator, model):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        header_key = request_key(request)
+        records = _parse_records(request)
+        if isinstance(records, dict):
+            await rate_limiter.acheck(await acount_records([records]))
+            weight = await asample_weight(model, records)
+            if not weight:
+                return JsonResponse(SAMPLED, status=status.HTTP_200_OK)
+            data, errors = await avalidate_record(validator, records)
+            if errors:
+                return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+            key = data.pop('idempotency_key', None) or header_key
+            return await _save_log_async(_new_log(model, data, weight), key)
+
+        if not isinstance(records, (list, Iterator)):
+            return JsonResponse({"detail": "Expected a list of log records"}, status=status.HTTP_400_BAD_REQUEST)
+        max_records = getattr(settings, 'LOGGER_BATCH_MAX_RECORDS', 1000)
+        received = []
+        for index, record in enumerate(records):
+            if index >= max_records:
+                return JsonResponse(
+                    {"detail": f"A batch may contain at most {max_records} records"},
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                )
+            received.append(record)
+        await rate_limiter.acheck(await acount_records(received))
+
+        objects = []
+        keys = []
+        errors = []
+        sampled = 0
+        for index, record in enumerate(received):
+            shape_errors = _record_shape_errors(record)
+            if shape_errors:
+                errors.append({"index": index, "errors": shape_errors})
+                continue
+            weight = await asample_weight(model, record)
+            if not weight:
+                sampled += 1
+                continue
+            data, record_errors = await avalidate_record(validator, record)
+            if record_errors:
+                errors.append({"index": index, "errors": record_errors})
+            else:
+                keys.append(record_key(header_key, data.pop('idempotency_key', None), index))
+                objects.append(_new_log(model, data, weight))
+    except APIException as exc:
+        response = JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+    written, duplicates = await sync_to_async(_write_logs)(model, objects, keys)
+    body, response_status = _batch_result(written, errors, duplicates, sampled)
+    return JsonResponse(body, status=response_status)
+
+async def _save_log_async(log, key=None):
+    entry = (log.api_key_id, log.counter_kind, key)
+    if getattr(settings, 'LOGGER_INGESTION_MODE', 'sync') == 'buffered':
+        if key is not None and idempotency_cache.seen(entry):
+            return JsonResponse(DUPLICATE, status=status.HTTP_200_OK)
+        try:
+            # put() may wait for room in 'block' mode, so keep it off the event loop
+            await sync_to_async(ingestion_buffer.put, thread_sensitive=False)(log)
+        except BufferFull:
+            response = JsonResponse(
+                {"detail": "Ingestion buffer is full, please retry later"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = '1'
+            return response
+        if key is not None:
+            idempotency_cache.add([entry])
+        pin_log_writers([log])
+        return JsonResponse({"status": "accepted"}, status=status.HTTP_202_ACCEPTED)
+    written, _ = await sync_to_async(_write_logs)(type(log), [log], [key])
+    if not written:
+        return JsonResponse(DUPLICATE, status=status.HTTP_200_OK)
+    return JsonResponse({"status": "success"}, status=status.HTTP_201_CREATED)
+
+async def create_event_log_async(request):
+    """
+    Async create_event_log for ASGI deployments. The API key is resolved with
+    the async resolver and the database write runs on Django's async ORM
+    thread.
+    """
+    return await _ingest_async(request, _event_log_validator, EventLogMessage)
+
+async def create_llm_log_async(request):
+    """
+    Async create_llm_log for ASGI deployments, see create_event_log_async
+    """
+    return await _ingest_async(request, _llm_log_validator, LlmLogMessage)
+
+# Clients authenticate with their API key, not a session
+create_event_log_async.csrf_exempt = True
+create_llm_log_async.csrf_exempt = True
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@replica_view
 def get_user_stats(request):
     """
     Get usage statistics for the authenticated user
     """
     user = request.user
     
-    # Get total logs count
-    total_event_logs = EventLogMessage.objects.filter(api_key__user=user).count()
-    total_llm_logs = LlmLogMessage.objects.filter(api_key__user=user).count()
-    
-    # Get event logs by level
-    logs_by_level = EventLogMessage.objects.filter(api_key__user=user).values('level').annotate(count=Count('id'))
+    # Totals come from the per API key counters, so this is O(number of keys)
+    total_event_logs = 0
+    total_llm_logs = 0
     level_counts = {
         'info': 0,
         'warning': 0,
@@ -99,15 +625,122 @@ def get_user_stats(request):
         'debug': 0
     }
     
-    for item in logs_by_level:
-        level_counts[item['level']] = item['count']
+    for counter in LogCounter.objects.filter(api_key__user=user):
+        if counter.kind == LogCounter.EVENT:
+            total_event_logs += counter.count
+            level_counts[counter.level] = level_counts.get(counter.level, 0) + counter.count
+        else:
+            total_llm_logs += counter.count
     
-    # Get API keys count
-    api_keys_count = ApiKey.objects.filter(user=user, is_active=True).count()
+    api_keys = list(ApiKey.objects.filter(user=user, is_active=True).order_by('id'))
+
+    # Records charged today against each key's daily quota, as the rate limiter counts them
+    usage = rate_limiter.usage(api_keys)
+    quotas = []
+    for api_key in api_keys:
+        rate, burst, quota = rate_limiter.limits(api_key)
+        quotas.append({
+            'api_key': api_key.id,
+            'name': api_key.name,
+            'rate_limit': rate,
+            'rate_limit_burst': burst or rate,
+            'daily_quota': quota,
+            'used_today': usage.get(api_key.id, 0),
+        })
     
     return Response({
         'total_event_logs': total_event_logs,
         'total_llm_logs': total_llm_logs,
         'logs_by_level': level_counts,
-        'api_keys_count': api_keys_count
+        'api_keys_count': len(api_keys),
+        'quotas': quotas,
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def get_ingestion_stats(request):
+    """
+    Get the write-behind buffer counters for this worker process
+    """
+    return Response(ingestion_buffer.get_stats())
+
+@require_GET
+def metrics(request):
+    """
+    Request metrics of this worker process in the Prometheus text format, for
+    the bearer of LOGGER_METRICS_TOKEN or a logged in staff user
+    """
+    token = getattr(settings, 'LOGGER_METRICS_TOKEN', None)
+    has_token = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not has_token and not request.user.is_staff:
+        return HttpResponse(
+            'Metrics require the metrics token or a staff login\n',
+            status=status.HTTP_401_UNAUTHORIZED, content_type='text/plain', headers={'WWW-Authenticate': 'Bearer'},
+        )
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_timeseries(request):
+    """
+    Get log counts per time bucket from the pre-aggregated rollups.
+    Query parameters: kind (event or llm), bucket (minute, hour or day),
+    start, end, api_key (id), level (event logs) and source (LLM logs).
+    """
+    kind = request.query_params.get('kind', LogCounter.EVENT)
+    if kind not in (LogCounter.EVENT, LogCounter.LLM):
+        raise ValidationError({'kind': ["Expected 'event' or 'llm'"]})
+    bucket = request.query_params.get('bucket', LogRollup.HOUR)
+    if bucket not in LogRollup.GRANULARITIES:
+        raise ValidationError({'bucket': ["Expected 'minute', 'hour' or 'day'"]})
+
+    bucket_size = LogRollup.BUCKET_SIZES[bucket]
+    max_buckets = getattr(settings, 'LOGGER_TIMESERIES_MAX_BUCKETS', 1500)
+    end = parse_time_param(request.query_params, 'end') or timezone.now()
+    start = parse_time_param(request.query_params, 'start') or end - bucket_size * 24
+    start = LogRollup.truncate(start, bucket)
+    if start >= end:
+        raise ValidationError({'start': ["Must be before end"]})
+    if (end - start) / bucket_size > max_buckets:
+        raise ValidationError({'bucket': [f"The time range spans more than {max_buckets} buckets"]})
+
+    rollups = LogRollup.objects.filter(
+        api_key__in=ApiKey.objects.filter(user=request.user).values('id'),
+        kind=kind,
+        granularity=bucket,
+        bucket_start__gte=start,
+        bucket_start__lt=end,
+    )
+    api_key = parse_api_key_param(request.query_params)
+    if api_key is not None:
+        rollups = rollups.filter(api_key_id=api_key)
+    dimension = request.query_params.get('level' if kind == LogCounter.EVENT else 'source')
+    if dimension:
+        rollups = rollups.filter(dimension=LogRollup.dimension_value(dimension))
+
+    # Summed here rather than with GROUP BY so the read stays a single index range scan
+    buckets = {}
+    for bucket_start, dimension_value, count in rollups.values_list('bucket_start', 'dimension', 'count'):
+        if not count:
+            continue
+        counts = buckets.setdefault(bucket_start, {})
+        counts[dimension_value] = counts.get(dimension_value, 0) + count
+
+    series = []
+    bucket_start = start
+    while bucket_start < end:
+        counts = buckets.get(bucket_start, {})
+        series.append({
+            'bucket_start': bucket_start,
+            'total': sum(counts.values()),
+            'counts': counts,
+        })
+        bucket_start += bucket_size
+
+    return Response({
+        'kind': kind,
+        'bucket': bucket,
+        'start': start,
+        'end': end,
+        'series': series,
     })
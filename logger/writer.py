@@ -0,0 +1,173 @@
+import logging
+import os
+import threading
+from collections import deque
+
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+
+log = logging.getLogger(__name__)
+
+LOCK_RETRIES = 5  # Times a group commit waits busy_timeout again for the write lock
+
+
+def begin_immediate(connection):
+    """
+    Make the calling thread's connection take SQLite's write lock as its
+    transactions begin. A deferred transaction that has read before its first
+    write cannot wait for the lock (SQLite reports "database is locked"
+    straight away to avoid a deadlock); one that starts with the lock waits up
+    to busy_timeout. Only the background writer threads call this, so request
+    threads keep deferred transactions.
+
+    This overrides a private hook of Django's SQLite backend on that one
+    DatabaseWrapper; Django 5.1 offers the same for every connection as
+    OPTIONS['transaction_mode']. Raises ImproperlyConfigured rather than
+    silently keeping deferred transactions should the hook go away.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    # The thread's own wrapper rather than the django.db.connection proxy
+    wrapper = connections[connection.alias]
+    if not callable(getattr(type(wrapper), '_start_transaction_under_autocommit', None)):
+        raise ImproperlyConfigured(
+            f"Django {django.get_version()}'s SQLite backend cannot start transactions with BEGIN IMMEDIATE; "
+            "use OPTIONS['transaction_mode'] = 'IMMEDIATE' instead"
+        )
+    wrapper._start_transaction_under_autocommit = lambda: wrapper.cursor().execute('BEGIN IMMEDIATE')
+
+
+class WriteJob:
+    __slots__ = ('func', 'args', 'value', 'error', 'done')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.value = None
+        self.error = None
+        self.done = threading.Event()
+
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class LogWriter:
+    """
+    Per-process single writer for ingestion. Request threads hand their
+    writes to one background thread and wait until they are committed, so the
+    threads of a worker never contend for SQLite's write lock. The thread
+    commits every write waiting at that moment, up to max_batch, in a single
+    transaction (group commit); each write runs in its own savepoint, so one
+    that fails only fails its own request. As the transaction only starts once
+    it holds the write lock, a start that times out is simply retried.
+    """
+
+    def __init__(self, max_batch=None, autostart=True):
+        self.max_batch = max_batch or getattr(settings, 'LOGGER_WRITER_MAX_BATCH', 100)
+        self.autostart = autostart
+        self._jobs = deque()
+        self._condition = threading.Condition()
+        self._process_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {'writes': 0, 'failed': 0, 'commits': 0, 'max_batch': 0}
+
+    def run(self, func, *args):
+        """
+        Call func(*args) on the writer thread and return its result, or raise
+        its exception. Inside a transaction func is called right away instead,
+        as it has to be part of that transaction.
+        """
+        if connection.in_atomic_block or threading.current_thread() is self._thread:
+            return func(*args)
+        return self.submit(func, *args).result()
+
+    def submit(self, func, *args):
+        job = WriteJob(func, args)
+        with self._condition:
+            self._jobs.append(job)
+            self._condition.notify_all()
+        if self.autostart:
+            self._ensure_started()
+        return job
+
+    def process(self):
+        """
+        Run and commit the waiting writes. Returns the number of writes run.
+        """
+        with self._process_lock:
+            with self._condition:
+                jobs = [self._jobs.popleft() for _ in range(min(len(self._jobs), self.max_batch))]
+            if not jobs:
+                return 0
+            for attempt in range(LOCK_RETRIES + 1):
+                started = False
+                try:
+                    with transaction.atomic():
+                        started = True
+                        for job in jobs:
+                            try:
+                                with transaction.atomic():
+                                    job.value = job.func(*job.args)
+                            except Exception as error:
+                                job.error = error
+                    break
+                except OperationalError as error:
+                    # Other processes' writers held the lock for all of busy_timeout
+                    if not started and attempt < LOCK_RETRIES:
+                        log.warning("Waiting again for the write lock for %d log writes", len(jobs))
+                        continue
+                    self._fail(jobs, error)
+                    break
+                except Exception as error:
+                    self._fail(jobs, error)
+                    break
+            with self._condition:
+                failed = sum(job.error is not None for job in jobs)
+                self._stats['writes'] += len(jobs) - failed
+                self._stats['failed'] += failed
+                self._stats['commits'] += 1
+                self._stats['max_batch'] = max(self._stats['max_batch'], len(jobs))
+            for job in jobs:
+                job.done.set()
+            return len(jobs)
+
+    def _fail(self, jobs, error):
+        log.exception("Failed to commit %d log writes", len(jobs))
+        for job in jobs:
+            if job.error is None:
+                job.error = error
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._jobs)
+        return stats
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        begin_immediate(connection)
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._jobs)
+            close_old_connections()
+            self.process()
+
+
+log_writer = LogWriter()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'logger.middleware.RequestMetricsMiddleware',  # First, so that it times the other middleware too
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
@@ -84,6 +86,29 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,  # Seconds a worker thread keeps its connection open
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# A read replica for the dashboard, e.g. a second SQLite file kept up to date
+# by Litestream or copied from the primary: LOGGER_REPLICA_DB=replica.sqlite3
+if os.environ.get('LOGGER_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / os.environ['LOGGER_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['logger.replicas.ReadReplicaRouter']
+
+# Cache shared by every worker process, so that API key changes, read-your-writes
+# pins and the like reach all of them. Create its table with
+# `python manage.py createcachetable`; Redis works as well.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'logger_cache',
     }
 }
 
@@ -146,3 +171,131 @@ SIMPLE_JWT = {
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # For development only, restrict in production
 CORS_ALLOW_CREDENTIALS = True
+
+# Logger ingestion settings
+LOGGER_BATCH_MAX_RECORDS = 1000  # Maximum records accepted by a batch ingestion request
+LOGGER_BULK_CREATE_BATCH_SIZE = 500  # Rows per INSERT statement when bulk creating logs
+LOGGER_MAX_DECOMPRESSED_BODY_SIZE = 50 * 1024 * 1024  # Bytes a request body may have, once gzip is decompressed
+LOGGER_MAX_RECORD_SIZE = 10 * 1024 * 1024  # Characters one record of a JSON array or NDJSON body may have
+
+# API key resolver cache. Keys are cached per process; deactivations are
+# propagated to other workers through a version counter in the shared default
+# cache, which each worker checks every VERSION_CHECK_INTERVAL seconds.
+LOGGER_API_KEY_CACHE_MAX_SIZE = 10000
+LOGGER_API_KEY_CACHE_TTL = 60  # Seconds a resolved key is trusted
+LOGGER_API_KEY_CACHE_NEGATIVE_TTL = 10  # Seconds an invalid key is remembered as invalid
+LOGGER_API_KEY_CACHE_VERSION_CHECK_INTERVAL = 1  # Seconds between checks of the shared version counter
+
+# Ingestion mode: 'sync' writes each log before responding with 201, 'buffered'
+# queues validated logs in a per-process write-behind buffer and responds with 202,
+# 'writer' responds like 'sync' but funnels a worker's writes through one thread
+# that commits them in groups, so they never contend for SQLite's write lock
+LOGGER_INGESTION_MODE = 'sync'
+LOGGER_BUFFER_MAX_SIZE = 10000  # Pending records held per worker before backpressure applies
+LOGGER_BUFFER_FLUSH_SIZE = 500  # Flush as soon as this many records are pending
+LOGGER_BUFFER_FLUSH_INTERVAL = 1.0  # ...or after this many seconds
+LOGGER_BUFFER_BACKPRESSURE = 'block'  # 'block', 'drop_oldest' or 'reject' (503)
+LOGGER_BUFFER_BLOCK_TIMEOUT = 1.0  # Seconds to wait for room before answering 503 in 'block' mode
+LOGGER_WRITER_MAX_BATCH = 100  # Most requests' writes committed together in 'writer' mode
+
+# Log list pagination (keyset over timestamp and id)
+LOGGER_PAGE_SIZE = 100  # Default page size, clients may ask for another with ?page_size=
+LOGGER_MAX_PAGE_SIZE = 1000  # Hard cap on ?page_size=
+LOGGER_KEYSET_MAX_PARTITIONS = 50  # Above this many API keys a user's logs are paged with one sorted query
+LOGGER_METADATA_FILTER_MAX_WINDOW_HOURS = 24  # Longest since/until window allowed with metadata.<key>= filters
+LOGGER_SEARCH_MAX_RESULTS = 1000  # Deepest a client can page into full-text search results (?q=)
+LOGGER_EXPORT_CHUNK_SIZE = 2000  # Rows fetched per database round trip when exporting logs
+
+# Live tail (/api/event-logs/stream/, /api/llm-logs/stream/). Streams are woken
+# by ingestion in the same worker and poll the database for other workers' rows.
+# Serve them from an ASGI server: under WSGI each stream holds a worker thread,
+# so a WSGI worker serves at most LOGGER_STREAM_MAX_SYNC_STREAMS at a time and
+# answers 503 beyond that.
+LOGGER_STREAM_POLL_INTERVAL = 2  # Seconds between database polls
+LOGGER_STREAM_HEARTBEAT = 15  # Seconds of silence before a keepalive comment is sent
+LOGGER_STREAM_MAX_SECONDS = 300  # Streams end after this long; clients reconnect with Last-Event-ID
+LOGGER_STREAM_BATCH_SIZE = 500  # Most rows read per poll
+LOGGER_STREAM_LOOKBACK_SECONDS = 5  # Rows committed this long after rows with higher ids are still sent
+LOGGER_STREAM_MAX_SYNC_STREAMS = 1  # Concurrent streams per WSGI worker process
+
+# Time series statistics
+LOGGER_TIMESERIES_MAX_BUCKETS = 1500  # Largest number of buckets a single time series request may span
+
+# Log retention. API keys and users may set their own period; logs are kept
+# forever when none applies. Expired logs are deleted by `manage.py purge_logs`.
+LOGGER_RETENTION_DAYS = None
+LOGGER_PURGE_CHUNK_SIZE = 5000  # Most rows deleted per transaction
+LOGGER_PURGE_PAUSE = 0.1  # Seconds between chunks
+LOGGER_PURGE_INTERVAL = 300  # Seconds between runs of `purge_logs --loop`
+
+# Compression of large LLM queries and responses. Payloads of at least the
+# threshold are stored zlib-compressed; existing rows are compressed with
+# `manage.py compress_llm_payloads`. On PostgreSQL, whose TOAST storage already
+# compresses large values, compressed payloads are not full-text searchable.
+# On SQLite, only Django can write compressed payloads: the full-text index
+# decodes them with a function that other clients do not have.
+LOGGER_LLM_PAYLOAD_COMPRESSION = False
+LOGGER_LLM_PAYLOAD_COMPRESSION_THRESHOLD = 4096  # Bytes
+LOGGER_LLM_PAYLOAD_COMPRESSION_LEVEL = 6  # zlib level, 1 (fastest) to 9 (smallest)
+
+# Request metrics. Every request is timed per view, with its database queries
+# and response serialization; the numbers of each worker process are served at
+# /metrics in the Prometheus text format.
+LOGGER_METRICS_SERVER_TIMING = True  # Add a Server-Timing header to responses
+# /metrics answers staff users, and scrapers sending "Authorization: Bearer <token>"
+LOGGER_METRICS_TOKEN = os.environ.get('LOGGER_METRICS_TOKEN')
+LOGGER_SLOW_REQUEST_THRESHOLD = 1.0  # Seconds; slower requests may be logged with their SQL
+LOGGER_SLOW_REQUEST_SAMPLE_RATE = 0.1  # Fraction of requests whose SQL is captured for the slow request log
+
+# Per API key rate limits and daily quotas on ingested records, checked before
+# the records are validated. An ApiKey's rate_limit, rate_limit_burst and
+# daily_quota override these defaults; None means unlimited. The memory backend
+# limits each worker process separately, logger.ratelimit.SQLiteBackend shares
+# the limits between the workers of a host through a SQLite file.
+LOGGER_RATE_LIMIT = None  # Records per second
+LOGGER_RATE_LIMIT_BURST = None  # Records accepted at once above the rate, defaults to the rate
+LOGGER_DAILY_QUOTA = None  # Records per UTC day
+LOGGER_RATE_LIMIT_BACKEND = 'logger.ratelimit.MemoryBackend'
+LOGGER_RATE_LIMIT_SQLITE_PATH = BASE_DIR / 'ratelimit.sqlite3'
+
+# Idempotent ingestion: a log sent with an Idempotency-Key header or an
+# idempotency_key field is stored once per API key within the window. Recent
+# keys are also remembered per worker so most retries are refused without a
+# query; purge_logs deletes the keys that left the window.
+LOGGER_IDEMPOTENCY_WINDOW_HOURS = 24
+LOGGER_IDEMPOTENCY_CACHE_MAX_SIZE = 100000  # Keys remembered per worker
+
+# Cold storage. `manage.py archive_logs` moves logs older than
+# LOGGER_ARCHIVE_AFTER_DAYS into gzipped NDJSON segment files, one per API key
+# and UTC day, indexed in the ArchiveSegment table. The list and export
+# endpoints read them transparently; full-text search does not cover them.
+LOGGER_ARCHIVE_DIR = BASE_DIR / 'archive'
+LOGGER_ARCHIVE_AFTER_DAYS = 30
+LOGGER_ARCHIVE_BLOCK_RECORDS = 1000  # Logs per gzip block, the unit readers decompress
+LOGGER_ARCHIVE_BLOCK_BYTES = 1024 * 1024  # ...or fewer once the block holds this many bytes
+
+# SQLite pragmas set on every new connection. busy_timeout makes a writer
+# wait for the write lock instead of failing with "database is locked", and
+# mmap_size reads the database through memory mapping. Set LOGGER_SQLITE_WAL=1
+# in the environment to also use the WAL journal, which lets readers run
+# alongside a writer, with synchronous=NORMAL only syncing at checkpoints. WAL
+# is a property of the database file, so it is opt-in: switching to it
+# rewrites the file and leaves -wal and -shm files next to it. For several
+# worker processes, also use LOGGER_INGESTION_MODE = 'writer'.
+LOGGER_SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,  # Milliseconds
+    'mmap_size': 256 * 1024 * 1024,  # Bytes
+}
+if os.environ.get('LOGGER_SQLITE_WAL'):
+    LOGGER_SQLITE_PRAGMAS = {'journal_mode': 'wal', 'synchronous': 'normal', **LOGGER_SQLITE_PRAGMAS}
+
+# Read replica. When LOGGER_READ_REPLICA names a DATABASES alias, the log
+# list, export and analytics endpoints and the user stats read from it. Users
+# who wrote within LOGGER_READ_YOUR_WRITES_SECONDS read from the primary, as
+# do all users while the replica is unreachable or its newest log is more than
+# LOGGER_REPLICA_MAX_LAG_SECONDS behind. Writes are remembered in the default
+# cache, which has to be shared between worker processes (e.g. Redis).
+LOGGER_READ_REPLICA = 'replica' if 'replica' in DATABASES else None
+LOGGER_READ_YOUR_WRITES_SECONDS = 5
+LOGGER_REPLICA_MAX_LAG_SECONDS = 10
+LOGGER_REPLICA_CHECK_INTERVAL = 5  # Seconds between replica health checks per worker